@@ -18,21 +18,32 @@ def create_app():
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     
+    # Optional shared cache (e.g. redis://localhost:6379/0); defaults to an in-process cache
+    app.config['CACHE_REDIS_URL'] = os.environ.get('CACHE_REDIS_URL')
+    
+    # List page pagination: 'offset' (numbered pages) or 'keyset' (cursor-based prev/next)
+    app.config['LIST_PAGINATION'] = os.environ.get('LIST_PAGINATION', 'offset')
+    
     # Connection pooling and timeout settings for better MySQL reliability
     app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
         'pool_size': 10,
         'pool_recycle': 3600,  # Recycle connections every hour
         'pool_pre_ping': True,  # Test connections before using them
-        'connect_args': {
+    }
+    if database_url.startswith('mysql'):
+        # PyMySQL-specific connection arguments
+        app.config['SQLALCHEMY_ENGINE_OPTIONS']['connect_args'] = {
             'charset': 'utf8mb4',
             'read_timeout': 30,
             'write_timeout': 30,
         }
-    }
     
     # Initialize database
     db.init_app(app)
     
+    from app.utils.cache import configure_cache
+    configure_cache(app)
+    
     # Import all models to ensure they're registered with SQLAlchemy before creating tables
     # This must be done before db.create_all() is called
     with app.app_context():
@@ -41,10 +52,26 @@ def create_app():
         # Now create all tables
         db.create_all()
     
+    from app.utils.dashboard import register_cache_invalidation
+    from app.utils.pagination import register_count_invalidation
+    from app.utils.catalog import register_catalog_invalidation
+    from app.utils.http_cache import register_touch_parents
+    from app.utils.company import register_company_invalidation
+    register_cache_invalidation()
+    register_count_invalidation()
+    register_catalog_invalidation()
+    register_touch_parents()
+    register_company_invalidation()
+    
+    # Per-request statement counts, Server-Timing headers and slow-request logging
+    from app.utils.instrumentation import init_query_instrumentation
+    init_query_instrumentation(app)
+    
     # Register blueprints
-    from app.routes import clients, invoices, payments, products, quotations, settings
+    from app.routes import clients, invoices, jobs, payments, products, quotations, settings
     app.register_blueprint(clients.bp)
     app.register_blueprint(invoices.bp)
+    app.register_blueprint(jobs.bp)
     app.register_blueprint(payments.bp)
     app.register_blueprint(products.bp)
     app.register_blueprint(quotations.bp)
@@ -53,36 +80,23 @@ def create_app():
     # Root route
     @app.route('/')
     def index():
-        from app.models import Invoice, Client
-        from sqlalchemy import func
+        from app.utils.dashboard import get_dashboard_stats, get_recent_invoices
         
-        # Get statistics
-        total_invoices = db.session.query(func.count(Invoice.id)).scalar() or 0
-        total_clients = db.session.query(func.count(Client.id)).scalar() or 0
-        
-        # Get pending invoices
-        pending_invoices = db.session.query(func.count(Invoice.id)).filter(
-            Invoice.status.in_(['draft', 'sent'])
-        ).scalar() or 0
-        
-        # Get total revenue from paid invoices
-        try:
-            paid_invoices = Invoice.query.filter_by(status='paid').all()
-            total_revenue = sum(inv.get_total() for inv in paid_invoices) if paid_invoices else 0
-        except:
-            total_revenue = 0
-        
-        # Get recent invoices
-        recent_invoices = Invoice.query.order_by(Invoice.created_at.desc()).limit(5).all()
-        
-        stats = {
-            'total_invoices': total_invoices,
-            'total_clients': total_clients,
-            'total_revenue': f"${total_revenue:,.2f}" if total_revenue > 0 else "$0.00",
-            'pending_invoices': pending_invoices,
-            'recent_invoices': recent_invoices
-        }
+        stats = get_dashboard_stats()
+        total_revenue = stats['total_revenue']
+        stats['total_revenue'] = f"${total_revenue:,.2f}" if total_revenue > 0 else "$0.00"
+        stats['outstanding_balance'] = f"${stats['outstanding_balance']:,.2f}"
+        stats['recent_invoices'] = get_recent_invoices()
         
         return render_template('index.html', stats=stats)
     
+    @app.route('/api/cache/stats')
+    def api_cache_stats():
+        from flask import jsonify
+        from app.utils.cache import cache_stats
+        from app.utils.pdf_cache import pdf_cache
+        stats = cache_stats()
+        stats['pdf'] = pdf_cache.stats()
+        return jsonify(stats)
+    
     return app
@@ -4,5 +4,7 @@ from app.models.payment import Payment
 from app.models.product import Product, ProductOption, ProductOptionValue, ProductVariant
 from app.models.quotation import Quotation, QuotationItem
 from app.models.company import CompanySettings
+from app.models.sequence import NumberSequence
+from app.models import totals  # registers the listeners that keep document totals in sync
 
-__all__ = ['Client', 'Invoice', 'InvoiceItem', 'Payment', 'Product', 'ProductOption', 'ProductOptionValue', 'ProductVariant', 'CompanySettings', 'Quotation', 'QuotationItem']
+__all__ = ['Client', 'Invoice', 'InvoiceItem', 'Payment', 'Product', 'ProductOption', 'ProductOptionValue', 'ProductVariant', 'CompanySettings', 'NumberSequence', 'Quotation', 'QuotationItem']
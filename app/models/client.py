@@ -3,6 +3,9 @@ from datetime import datetime
 
 class Client(db.Model):
     __tablename__ = 'clients'
+    __table_args__ = (
+        db.Index('ix_clients_name_id', 'name', 'id'),  # List order and keyset pagination
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
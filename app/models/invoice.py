@@ -3,31 +3,54 @@ from datetime import datetime
 
 class Invoice(db.Model):
     __tablename__ = 'invoices'
+    __table_args__ = (
+        db.Index('ix_invoices_created_at_id', 'created_at', 'id'),  # List order and keyset pagination
+        db.Index('ix_invoices_status_created_at', 'status', 'created_at'),  # Status filter + list order
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     invoice_number = db.Column(db.String(50), unique=True, nullable=False)
-    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False)
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False, index=True)
     issue_date = db.Column(db.DateTime, default=datetime.utcnow)
     due_date = db.Column(db.DateTime)
     status = db.Column(db.String(20), default='draft')  # draft, sent, paid, overdue
     notes = db.Column(db.Text)
     terms = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Sort key: keyset pages skip NULLs
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Materialized totals, maintained by app.models.totals on every item/payment write
+    subtotal = db.Column(db.Float, nullable=False, default=0)
+    tax_total = db.Column(db.Float, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0)
+    paid_amount = db.Column(db.Float, nullable=False, default=0)
+    balance = db.Column(db.Float, nullable=False, default=0)
+    
     items = db.relationship('InvoiceItem', backref='invoice', lazy=True, cascade='all, delete-orphan')
     payments = db.relationship('Payment', backref='invoice', lazy=True, cascade='all, delete-orphan')
     
     def get_total(self):
-        return sum(item.total for item in self.items)
+        return self.total or 0
     
     def get_paid_amount(self):
-        return sum(payment.amount for payment in self.payments)
+        return self.paid_amount or 0
     
     def get_balance(self):
-        """Calculate balance owed. Returns 0 if overpaid (paid amount exceeds total)."""
-        balance = self.get_total() - self.get_paid_amount()
-        return max(0, balance)  # Don't show negative balance if overpaid
+        """Balance owed. Stored as 0 if overpaid (paid amount exceeds total)."""
+        return self.balance or 0
+    
+    def calculate_totals(self):
+        """Recalculate totals from the loaded items and payments (used to verify the stored columns)"""
+        subtotal = sum(item.subtotal for item in self.items)
+        tax_total = sum(item.tax for item in self.items)
+        paid = sum(payment.amount for payment in self.payments)
+        return {
+            'subtotal': subtotal,
+            'tax_total': tax_total,
+            'total': subtotal + tax_total,
+            'paid_amount': paid,
+            'balance': max(0, subtotal + tax_total - paid)  # Don't show negative balance if overpaid
+        }
     
     def to_dict(self):
         return {
@@ -38,6 +61,8 @@ class Invoice(db.Model):
             'issue_date': self.issue_date.isoformat(),
             'due_date': self.due_date.isoformat() if self.due_date else None,
             'status': self.status,
+            'subtotal': self.subtotal,
+            'tax_total': self.tax_total,
             'total': self.get_total(),
             'paid': self.get_paid_amount(),
             'balance': self.get_balance(),
@@ -51,7 +76,7 @@ class InvoiceItem(db.Model):
     __tablename__ = 'invoice_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    invoice_id = db.Column(db.Integer, db.ForeignKey('invoices.id'), nullable=False)
+    invoice_id = db.Column(db.Integer, db.ForeignKey('invoices.id'), nullable=False, index=True)
     description = db.Column(db.String(255), nullable=False)
     quantity = db.Column(db.Float, default=1)
     unit_price = db.Column(db.Float, nullable=False)
@@ -3,6 +3,11 @@ from datetime import datetime
 
 class Product(db.Model):
     __tablename__ = 'products'
+    __table_args__ = (
+        db.Index('ix_products_name_id', 'name', 'id'),  # List order and keyset pagination
+        db.Index('ix_products_category_name', 'category', 'name'),  # Category filter + list order
+        db.Index('ix_products_is_active_name', 'is_active', 'name'),  # Status filter + list order
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
@@ -13,6 +18,7 @@ class Product(db.Model):
     category = db.Column(db.String(100))
     is_active = db.Column(db.Boolean, default=True)
     has_variants = db.Column(db.Boolean, default=False)  # Whether this product has variations
+    variants_job_id = db.Column(db.String(32))  # Background job generating the variants, if any
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -20,17 +26,24 @@ class Product(db.Model):
     options = db.relationship('ProductOption', backref='product', lazy=True, cascade='all, delete-orphan')
     variants = db.relationship('ProductVariant', backref='product', lazy=True, cascade='all, delete-orphan')
     
+    @property
+    def active_variants(self):
+        """Variants still offered; removed combinations are kept deactivated (app/utils/variants.py)"""
+        return [variant for variant in self.variants if variant.is_active]
+    
     def get_default_price(self):
         """Get the default price (from variants if exists, else base price)"""
-        if self.has_variants and self.variants:
+        variants = self.active_variants if self.has_variants else []
+        if variants:
             # Return first variant price as default
-            return self.variants[0].price if self.variants else self.price
+            return variants[0].price
         return self.price
     
     def get_default_sku(self):
         """Get the default SKU (from variants if exists, else base SKU)"""
-        if self.has_variants and self.variants:
-            return self.variants[0].sku if self.variants and self.variants[0].sku else self.sku
+        variants = self.active_variants if self.has_variants else []
+        if variants:
+            return variants[0].sku or self.sku
         return self.sku
     
     def to_dict(self):
@@ -44,7 +57,7 @@ class Product(db.Model):
             'category': self.category,
             'is_active': self.is_active,
             'has_variants': self.has_variants,
-            'variants_count': len(self.variants) if self.variants else 0,
+            'variants_count': len(self.active_variants),
             'created_at': self.created_at.isoformat()
         }
 
@@ -54,7 +67,7 @@ class ProductOption(db.Model):
     __tablename__ = 'product_options'
     
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
     name = db.Column(db.String(100), nullable=False)  # e.g., "Version", "Model", "Configuration"
     display_order = db.Column(db.Integer, default=0)  # Order of display
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -76,7 +89,7 @@ class ProductOptionValue(db.Model):
     __tablename__ = 'product_option_values'
     
     id = db.Column(db.Integer, primary_key=True)
-    option_id = db.Column(db.Integer, db.ForeignKey('product_options.id'), nullable=False)
+    option_id = db.Column(db.Integer, db.ForeignKey('product_options.id'), nullable=False, index=True)
     value = db.Column(db.String(100), nullable=False)  # e.g., "Basic", "Pro", "Advanced"
     display_order = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -94,7 +107,7 @@ class ProductVariant(db.Model):
     __tablename__ = 'product_variants'
     
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False, index=True)
     sku = db.Column(db.String(100), unique=True, nullable=True)
     price = db.Column(db.Float, nullable=False)
     tax_rate = db.Column(db.Float, nullable=True)  # Can override product tax rate
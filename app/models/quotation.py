@@ -3,23 +3,38 @@ from datetime import datetime
 
 class Quotation(db.Model):
     __tablename__ = 'quotations'
+    __table_args__ = (
+        db.Index('ix_quotations_created_at_id', 'created_at', 'id'),  # List order and keyset pagination
+        db.Index('ix_quotations_status_created_at', 'status', 'created_at'),  # Status filter + list order
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     quotation_number = db.Column(db.String(50), unique=True, nullable=False)
-    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False)
+    client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False, index=True)
     issue_date = db.Column(db.DateTime, default=datetime.utcnow)
     valid_until = db.Column(db.DateTime)
     status = db.Column(db.String(20), default='pending')  # pending, accepted, rejected, expired
     notes = db.Column(db.Text)
     terms = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Sort key: keyset pages skip NULLs
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Materialized totals, maintained by app.models.totals on every item write
+    subtotal = db.Column(db.Float, nullable=False, default=0)
+    tax_total = db.Column(db.Float, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0)
+    
     items = db.relationship('QuotationItem', backref='quotation', lazy=True, cascade='all, delete-orphan')
     client = db.relationship('Client', backref='quotations', lazy=True)
     
     def get_total(self):
-        return sum(item.total for item in self.items)
+        return self.total or 0
+    
+    def calculate_totals(self):
+        """Recalculate totals from the loaded items (used to verify the stored columns)"""
+        subtotal = sum(item.subtotal for item in self.items)
+        tax_total = sum(item.tax for item in self.items)
+        return {'subtotal': subtotal, 'tax_total': tax_total, 'total': subtotal + tax_total}
     
     def to_dict(self):
         return {
@@ -30,6 +45,8 @@ class Quotation(db.Model):
             'issue_date': self.issue_date.isoformat(),
             'valid_until': self.valid_until.isoformat() if self.valid_until else None,
             'status': self.status,
+            'subtotal': self.subtotal,
+            'tax_total': self.tax_total,
             'total': self.get_total(),
             'notes': self.notes,
             'terms': self.terms,
@@ -41,7 +58,7 @@ class QuotationItem(db.Model):
     __tablename__ = 'quotation_items'
     
     id = db.Column(db.Integer, primary_key=True)
-    quotation_id = db.Column(db.Integer, db.ForeignKey('quotations.id'), nullable=False)
+    quotation_id = db.Column(db.Integer, db.ForeignKey('quotations.id'), nullable=False, index=True)
     description = db.Column(db.String(255), nullable=False)
     quantity = db.Column(db.Float, default=1)
     unit_price = db.Column(db.Float, nullable=False)
@@ -0,0 +1,8 @@
+from app import db
+
+class NumberSequence(db.Model):
+    """Counter behind invoice and quotation numbers (see app/utils/numbering.py)"""
+    __tablename__ = 'number_sequences'
+    
+    name = db.Column(db.String(50), primary_key=True)  # 'invoice', 'quotation'
+    next_value = db.Column(db.Integer, nullable=False)  # next number not yet handed out
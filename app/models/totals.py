@@ -0,0 +1,179 @@
+"""Keep the materialized totals on invoices and quotations in sync.
+
+Invoices and quotations store their subtotal/tax/total (and, for invoices,
+paid amount and balance) as real columns so list pages and APIs can read
+them straight from the row. Whenever a flush touches a document, one of its
+line items or one of its payments, the affected rows are recalculated with a
+single UPDATE inside the same transaction. Bulk DELETEs and UPDATEs of items
+and payments (query.delete(), session.execute(delete(...))) never reach a
+flush, so they recalculate the documents they touched themselves.
+"""
+from sqlalchemy import event, select, update, func, case, literal
+from sqlalchemy.orm import Session
+from app.models.invoice import Invoice, InvoiceItem
+from app.models.payment import Payment
+from app.models.quotation import Quotation, QuotationItem
+
+INVOICE_TOTAL_FIELDS = ['subtotal', 'tax_total', 'total', 'paid_amount', 'balance']
+QUOTATION_TOTAL_FIELDS = ['subtotal', 'tax_total', 'total']
+
+
+def _item_sums(item_model, parent_fk, parent_id):
+    """Correlated subqueries for the subtotal and tax of a document's items"""
+    line = func.coalesce(item_model.quantity, 1) * item_model.unit_price
+    subtotal = select(func.coalesce(func.sum(line), 0)).where(parent_fk == parent_id).scalar_subquery()
+    tax = select(
+        func.coalesce(func.sum(line * func.coalesce(item_model.tax_rate, 0) / 100), 0)
+    ).where(parent_fk == parent_id).scalar_subquery()
+    return subtotal, tax
+
+
+def invoice_totals_update(invoice_ids=None):
+    """UPDATE statement recalculating invoice totals (all invoices if no ids given).
+
+    Each value is derived from the subqueries rather than from the other
+    columns, because MySQL evaluates SET clauses left to right. updated_at is
+    set to itself so the column's onupdate default doesn't fire: totals are
+    derived data, and flushes that change items already touch the invoice.
+    """
+    subtotal, tax = _item_sums(InvoiceItem, InvoiceItem.invoice_id, Invoice.id)
+    paid = select(func.coalesce(func.sum(Payment.amount), 0)).where(
+        Payment.invoice_id == Invoice.id
+    ).scalar_subquery()
+    owed = subtotal + tax - paid
+    stmt = update(Invoice).values(
+        subtotal=subtotal,
+        tax_total=tax,
+        total=subtotal + tax,
+        paid_amount=paid,
+        balance=case((owed > 0, owed), else_=literal(0)),
+        updated_at=Invoice.updated_at,
+    )
+    if invoice_ids is not None:
+        stmt = stmt.where(Invoice.id.in_(invoice_ids))
+    return stmt.execution_options(synchronize_session=False)
+
+
+def quotation_totals_update(quotation_ids=None):
+    """UPDATE statement recalculating quotation totals (all quotations if no ids given),
+    leaving updated_at alone as invoice_totals_update() does"""
+    subtotal, tax = _item_sums(QuotationItem, QuotationItem.quotation_id, Quotation.id)
+    stmt = update(Quotation).values(subtotal=subtotal, tax_total=tax, total=subtotal + tax,
+                                    updated_at=Quotation.updated_at)
+    if quotation_ids is not None:
+        stmt = stmt.where(Quotation.id.in_(quotation_ids))
+    return stmt.execution_options(synchronize_session=False)
+
+
+def _touched_documents(session):
+    """Collect ids of invoices and quotations affected by the current flush"""
+    invoice_ids, quotation_ids = set(), set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (InvoiceItem, Payment)):
+            invoice_ids.add(obj.invoice_id)
+        elif isinstance(obj, Invoice) and obj not in session.deleted:
+            invoice_ids.add(obj.id)
+        elif isinstance(obj, QuotationItem):
+            quotation_ids.add(obj.quotation_id)
+        elif isinstance(obj, Quotation) and obj not in session.deleted:
+            quotation_ids.add(obj.id)
+    invoice_ids.discard(None)
+    quotation_ids.discard(None)
+    return invoice_ids, quotation_ids
+
+
+@event.listens_for(Session, 'after_flush')
+def _recalculate_totals(session, flush_context):
+    invoice_ids, quotation_ids = _touched_documents(session)
+    if not invoice_ids and not quotation_ids:
+        return
+    connection = session.connection()
+    if invoice_ids:
+        connection.execute(invoice_totals_update(invoice_ids))
+    if quotation_ids:
+        connection.execute(quotation_totals_update(quotation_ids))
+    session.info.setdefault('stale_totals', set()).update(
+        [(Invoice, i) for i in invoice_ids] + [(Quotation, q) for q in quotation_ids]
+    )
+
+
+# Child model -> (document model, the child's foreign key to it)
+_PARENTS = {
+    InvoiceItem: (Invoice, InvoiceItem.invoice_id),
+    Payment: (Invoice, Payment.invoice_id),
+    QuotationItem: (Quotation, QuotationItem.quotation_id),
+}
+
+
+def _parent_ids(session, statement, fk):
+    query = select(fk).distinct()
+    if statement.whereclause is not None:
+        query = query.where(statement.whereclause)
+    return {parent_id for parent_id, in session.execute(query) if parent_id is not None}
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _recalculate_after_bulk(orm_execute_state):
+    """Recalculate the documents whose items or payments a bulk DELETE or UPDATE changed"""
+    if not (orm_execute_state.is_delete or orm_execute_state.is_update):
+        return None
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ not in _PARENTS:
+        return None
+    model, fk = _PARENTS[mapper.class_]
+    session = orm_execute_state.session
+    statement = orm_execute_state.statement
+    ids = _parent_ids(session, statement, fk)
+    result = orm_execute_state.invoke_statement()
+    if orm_execute_state.is_update:
+        ids |= _parent_ids(session, statement, fk)  # rows moved to another document
+    if ids:
+        totals_update = invoice_totals_update if model is Invoice else quotation_totals_update
+        session.connection().execute(totals_update(ids))
+        fields = INVOICE_TOTAL_FIELDS if model is Invoice else QUOTATION_TOTAL_FIELDS
+        for pk in ids:
+            obj = session.identity_map.get(session.identity_key(model, pk))
+            if obj is not None:
+                session.expire(obj, fields)
+    return result
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _expire_recalculated(session, flush_context):
+    """Expire the in-memory totals so the next read picks up the new values"""
+    stale = session.info.pop('stale_totals', None)
+    if not stale:
+        return
+    for model, pk in stale:
+        obj = session.identity_map.get(session.identity_key(model, pk))
+        if obj is not None:
+            fields = INVOICE_TOTAL_FIELDS if model is Invoice else QUOTATION_TOTAL_FIELDS
+            session.expire(obj, fields)
+
+
+def backfill_totals(session):
+    """Recalculate the stored totals for every invoice and quotation"""
+    session.execute(invoice_totals_update())
+    session.execute(quotation_totals_update())
+
+
+def verify_totals(session, tolerance=0.005):
+    """Compare stored totals with a fresh calculation from items and payments.
+
+    Returns a list of (document number, field, stored, expected) tuples for
+    every value that has drifted.
+    """
+    mismatches = []
+    for invoice in session.query(Invoice).yield_per(500):
+        expected = invoice.calculate_totals()
+        for field in INVOICE_TOTAL_FIELDS:
+            stored = getattr(invoice, field) or 0
+            if abs(stored - expected[field]) > tolerance:
+                mismatches.append((invoice.invoice_number, field, stored, expected[field]))
+    for quotation in session.query(Quotation).yield_per(500):
+        expected = quotation.calculate_totals()
+        for field in QUOTATION_TOTAL_FIELDS:
+            stored = getattr(quotation, field) or 0
+            if abs(stored - expected[field]) > tolerance:
+                mismatches.append((quotation.quotation_number, field, stored, expected[field]))
+    return mismatches
@@ -1,6 +1,8 @@
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, current_app
 from app import db
 from app.models import Client
+from app.utils.pagination import paginate_list, cached_count
+from app.utils.search import search as search_rows, search_filter
 
 bp = Blueprint('clients', __name__, url_prefix='/clients')
 
@@ -8,7 +10,7 @@ bp = Blueprint('clients', __name__, url_prefix='/clients')
 def list_clients():
     search = request.args.get('search', '').strip()
     search_by = request.args.get('search_by', 'name')
-    page = request.args.get('page', 1, type=int)
+    paging = request.args.get('paging', current_app.config['LIST_PAGINATION'])
     per_page = request.args.get('per_page', 10, type=int)
     
     # Validate per_page to prevent abuse
@@ -19,17 +21,19 @@ def list_clients():
     
     if search:
         if search_by == 'name':
-            query = query.filter(Client.name.ilike(f'%{search}%'))
+            query = query.filter(search_filter('clients', search, 'name'))
         elif search_by == 'client_id':
             try:
                 query = query.filter(Client.id == int(search))
             except:
                 pass
         elif search_by == 'email':
-            query = query.filter(Client.email.ilike(f'%{search}%'))
+            query = query.filter(search_filter('clients', search, 'email'))
     
-    clients = query.order_by(Client.name).paginate(page=page, per_page=per_page, error_out=False)
-    return render_template('clients/list.html', clients=clients, search=search, search_by=search_by, per_page=per_page)
+    total = cached_count('clients', query, search, search_by)
+    clients = paginate_list(query, [Client.name, Client.id], request.args, per_page,
+                            keyset=paging == 'keyset', total=total)
+    return render_template('clients/list.html', clients=clients, search=search, search_by=search_by, per_page=per_page, paging=paging)
 
 @bp.route('/new', methods=['GET', 'POST'])
 def create_client():
@@ -93,13 +97,7 @@ def api_search_clients():
     if not query:
         return jsonify([])
     
-    clients = Client.query.filter(
-        db.or_(
-            Client.name.ilike(f'%{query}%'),
-            Client.email.ilike(f'%{query}%'),
-            Client.phone.ilike(f'%{query}%')
-        )
-    ).limit(10).all()
+    clients = search_rows('clients', query, 'all', Client.query, limit=10)
     
     return jsonify([client.to_dict() for client in clients])
 
@@ -1,42 +1,46 @@
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for, send_file
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, Response, stream_with_context, current_app
 from app import db
 from app.models import Invoice, InvoiceItem, Client
-from app.utils.pdf import generate_invoice_pdf
+from app.utils.pdf_cache import cached_invoice_pdf
+from app.utils.pdf_jobs import enqueue_pdf, job_response, pdf_job_status, pdf_response
+from app.utils.http_cache import conditional, document_validators, pdf_validators
+from app.utils.loading import load_profile
+from app.utils.numbering import next_number
+from app.utils.pagination import encode_cursor, decode_cursor, keyset_filter, paginate_list, cached_count
+from app.utils.export import invoice_filters, filter_invoices, iter_invoice_pdfs, stream_zip
 from datetime import datetime, timedelta
-import os
 
 bp = Blueprint('invoices', __name__, url_prefix='/invoices')
 
 @bp.route('/')
 def list_invoices():
-    status_filter = request.args.get('status', 'all')
-    search = request.args.get('search', '').strip()
-    search_by = request.args.get('search_by', 'invoice_number')
-    page = request.args.get('page', 1, type=int)
+    filters = invoice_filters(request.args)
+    status_filter, search, search_by = filters['status'], filters['search'], filters['search_by']
+    paging = request.args.get('paging', current_app.config['LIST_PAGINATION'])
     per_page = request.args.get('per_page', 10, type=int)
     
     # Validate per_page to prevent abuse
     if per_page not in [5, 10, 25, 50, 100]:
         per_page = 10
     
-    query = Invoice.query
+    query = filter_invoices(load_profile(Invoice.query, 'invoice_list'), **filters)
     
-    if status_filter != 'all':
-        query = query.filter_by(status=status_filter)
-    
-    if search:
-        if search_by == 'client_name':
-            query = query.join(Client).filter(Client.name.ilike(f'%{search}%'))
-        elif search_by == 'invoice_number':
-            query = query.filter(Invoice.invoice_number.ilike(f'%{search}%'))
-        elif search_by == 'invoice_id':
-            try:
-                query = query.filter(Invoice.id == int(search))
-            except:
-                pass
-    
-    invoices = query.order_by(Invoice.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
-    return render_template('invoices/list.html', invoices=invoices, status_filter=status_filter, search=search, search_by=search_by, per_page=per_page)
+    total = cached_count('invoices', query, status_filter, search, search_by,
+                         filters['client_id'], str(filters['date_from']), str(filters['date_to']))
+    invoices = paginate_list(query, [Invoice.created_at, Invoice.id], request.args, per_page,
+                             descending=True, keyset=paging == 'keyset', total=total)
+    return render_template('invoices/list.html', invoices=invoices, status_filter=status_filter, search=search, search_by=search_by, per_page=per_page, paging=paging)
+
+@bp.route('/export.zip')
+def export_pdfs():
+    """All invoices matching the list filters (plus client_id, date_from, date_to) as a ZIP of PDFs"""
+    query = filter_invoices(Invoice.query, **invoice_filters(request.args))
+    filename = f"invoices-{datetime.now().strftime('%Y%m%d-%H%M%S')}.zip"
+    return Response(
+        stream_with_context(stream_zip(iter_invoice_pdfs(query))),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
 
 @bp.route('/new', methods=['GET', 'POST'])
 def create_invoice():
@@ -44,8 +48,7 @@ def create_invoice():
     
     if request.method == 'POST':
         # Generate invoice number
-        last_invoice = Invoice.query.order_by(Invoice.id.desc()).first()
-        invoice_number = f"INV-{(last_invoice.id if last_invoice else 0) + 1:05d}"
+        invoice_number = next_number('invoice')
         
         invoice = Invoice(
             invoice_number=invoice_number,
@@ -79,10 +82,11 @@ def create_invoice():
 
 @bp.route('/<int:invoice_id>')
 def view_invoice(invoice_id):
-    invoice = Invoice.query.get_or_404(invoice_id)
-    subtotal = sum(item.subtotal for item in invoice.items)
-    tax_total = sum(item.tax for item in invoice.items)
-    return render_template('invoices/view.html', invoice=invoice, subtotal=subtotal, tax_total=tax_total)
+    def render():
+        invoice = load_profile(Invoice.query, 'invoice_detail').get_or_404(invoice_id)
+        return render_template('invoices/view.html', invoice=invoice, subtotal=invoice.subtotal, tax_total=invoice.tax_total)
+    
+    return conditional(document_validators('invoice', invoice_id), render)
 
 @bp.route('/<int:invoice_id>/edit', methods=['GET', 'POST'])
 def edit_invoice(invoice_id):
@@ -128,15 +132,83 @@ def delete_invoice(invoice_id):
 
 @bp.route('/<int:invoice_id>/pdf')
 def download_pdf(invoice_id):
-    invoice = Invoice.query.get_or_404(invoice_id)
-    pdf_file = generate_invoice_pdf(invoice)
-    
-    if os.path.exists(pdf_file):
-        return send_file(pdf_file, as_attachment=True, download_name=f"{invoice.invoice_number}.pdf")
+    def send():
+        invoice = load_profile(Invoice.query, 'invoice_detail').get_or_404(invoice_id)
+        _, data = cached_invoice_pdf(invoice)
+        return pdf_response(data, f"{invoice.invoice_number}.pdf")
     
-    return "PDF generation failed", 500
+    # Unchanged PDFs get a 304 before anything is loaded or rendered
+    return conditional(pdf_validators('invoice', invoice_id), send)
+
+@bp.route('/<int:invoice_id>/pdf/jobs', methods=['POST'])
+def enqueue_pdf_job(invoice_id):
+    """Render the PDF in the background; poll status_url, then fetch result_url"""
+    invoice = load_profile(Invoice.query, 'invoice_detail').get_or_404(invoice_id)
+    job_id = enqueue_pdf('invoice', invoice)
+    return job_response(pdf_job_status(job_id), f"{invoice.invoice_number}.pdf")
+
+API_PAGE_MAX = 1000
+API_STREAM_BATCH = 500
 
 @bp.route('/api/list')
 def api_list_invoices():
-    invoices = Invoice.query.all()
-    return jsonify([invoice.to_dict() for invoice in invoices])
+    """List invoices, newest first.
+
+    Without a limit the whole ledger is streamed in batches (as a JSON array,
+    or one object per line with format=ndjson). With ?limit=N a single page is
+    returned and the cursor for the next page is sent in the X-Next-Cursor
+    header; pass it back as ?cursor=... to continue.
+    """
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    ndjson = request.args.get('format') == 'ndjson'
+    
+    sort_columns = [Invoice.created_at, Invoice.id]
+    query = load_profile(Invoice.query, 'invoice_list').order_by(Invoice.created_at.desc(), Invoice.id.desc())
+    
+    if cursor:
+        try:
+            query = query.filter(keyset_filter(sort_columns, decode_cursor(cursor, size=2), descending=True))
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    
+    if limit:
+        limit = max(1, min(limit, API_PAGE_MAX))
+        invoices = query.limit(limit + 1).all()
+        has_more = len(invoices) > limit
+        invoices = invoices[:limit]
+        
+        if ndjson:
+            body = ''.join(current_app.json.dumps(invoice.to_dict()) + '\n' for invoice in invoices)
+            response = Response(body, mimetype='application/x-ndjson')
+        else:
+            response = jsonify([invoice.to_dict() for invoice in invoices])
+        
+        if has_more:
+            next_cursor = encode_cursor([invoices[-1].created_at, invoices[-1].id])
+            response.headers['X-Next-Cursor'] = next_cursor
+            response.headers['Link'] = '<{}>; rel="next"'.format(
+                url_for('invoices.api_list_invoices', limit=limit, cursor=next_cursor, format=request.args.get('format'))
+            )
+        return response
+    
+    def generate():
+        dumps = current_app.json.dumps
+        first = True
+        batch = [] if ndjson else ['[']
+        for invoice in query.yield_per(API_STREAM_BATCH):
+            if ndjson:
+                batch.append(dumps(invoice.to_dict()) + '\n')
+            else:
+                batch.append(('' if first else ',') + dumps(invoice.to_dict()))
+            first = False
+            if len(batch) >= API_STREAM_BATCH:
+                yield ''.join(batch)
+                batch = []
+        if not ndjson:
+            batch.append(']')
+        if batch:
+            yield ''.join(batch)
+    
+    mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
@@ -0,0 +1,27 @@
+from flask import Blueprint, request, jsonify
+from werkzeug.utils import secure_filename
+from app.utils.jobs import jobs
+from app.utils.pdf_jobs import job_response, pdf_job_status, pdf_response, pdf_result
+
+bp = Blueprint('jobs', __name__, url_prefix='/jobs')
+
+
+@bp.route('/<job_id>')
+def job_status(job_id):
+    job = jobs.get(job_id)
+    status = job.to_dict() if job is not None else pdf_job_status(job_id)
+    if status is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return job_response(status, request.args.get('name'))
+
+
+@bp.route('/<job_id>/pdf')
+def job_pdf(job_id):
+    data = pdf_result(job_id)
+    if data is None:
+        status = pdf_job_status(job_id)
+        if status is None:
+            return jsonify({'error': 'Unknown job'}), 404
+        return job_response(status, request.args.get('name'))
+    name = secure_filename(request.args.get('name', '')) or f'{job_id}.pdf'
+    return pdf_response(data, name, etag=job_id)
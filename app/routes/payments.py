@@ -37,6 +37,7 @@ def delete_payment(payment_id):
     invoice = payment.invoice
     
     db.session.delete(payment)
+    db.session.flush()  # Recalculates the stored invoice balance
     
     # Reset invoice status
     if invoice.get_balance() > 0:
@@ -1,9 +1,17 @@
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, current_app, flash, Response, stream_with_context, abort
 from app import db
-from app.models import Product, ProductOption, ProductOptionValue, ProductVariant
+from app.models import Product
 from datetime import datetime
 import json
-from itertools import product as itertools_product
+from app.utils.loading import load_profile
+from app.utils.pagination import paginate_list, cached_count
+from app.utils.search import search_filter
+from app.utils.catalog import search_catalog
+from app.utils.http_cache import conditional, product_list_validators
+from app.utils.product_io import FORMATS, format_for, import_products, export_products, import_template
+from app.utils.sku import SkuAllocator, sku_base
+from app.utils.variants import (MAX_VARIANTS, option_renames, parse_options, running_variant_job,
+                                save_variants, variant_count, variant_prefill)
 
 bp = Blueprint('products', __name__, url_prefix='/products')
 
@@ -13,14 +21,14 @@ def list_products():
     status_filter = request.args.get('status', 'all')
     search = request.args.get('search', '').strip()
     search_by = request.args.get('search_by', 'name')
-    page = request.args.get('page', 1, type=int)
+    paging = request.args.get('paging', current_app.config['LIST_PAGINATION'])
     per_page = request.args.get('per_page', 10, type=int)
     
     # Validate per_page to prevent abuse
     if per_page not in [5, 10, 25, 50, 100]:
         per_page = 10
     
-    query = Product.query
+    query = load_profile(Product.query, 'product_list')
     if category_filter != 'all':
         query = query.filter_by(category=category_filter)
     if status_filter == 'active':
@@ -30,23 +38,73 @@ def list_products():
     
     if search:
         if search_by == 'name':
-            query = query.filter(Product.name.ilike(f'%{search}%'))
+            query = query.filter(search_filter('products', search, 'name'))
         elif search_by == 'product_id':
             try:
                 query = query.filter(Product.id == int(search))
             except:
                 pass
         elif search_by == 'sku':
-            query = query.filter(Product.sku.ilike(f'%{search}%'))
+            query = query.filter(search_filter('products', search, 'sku'))
     
-    products = query.order_by(Product.name).paginate(page=page, per_page=per_page, error_out=False)
+    total = cached_count('products', query, category_filter, status_filter, search, search_by)
+    products = paginate_list(query, [Product.name, Product.id], request.args, per_page,
+                             keyset=paging == 'keyset', total=total)
     categories = db.session.query(Product.category).distinct().all()
-    return render_template('products/list.html', products=products, categories=[c[0] for c in categories if c[0]], category_filter=category_filter, status_filter=status_filter, search=search, search_by=search_by, per_page=per_page)
+    return render_template('products/list.html', products=products, categories=[c[0] for c in categories if c[0]], category_filter=category_filter, status_filter=status_filter, search=search, search_by=search_by, per_page=per_page, paging=paging)
+
+def variant_job_message(job):
+    return (f"Generating {job.meta['total']} variants in the background; "
+            f"progress at {url_for('jobs.job_status', job_id=job.id)}")
+
+@bp.route('/import', methods=['POST'])
+def bulk_import():
+    """Import products, options and variants from an uploaded CSV, JSON or NDJSON file"""
+    wants_json = request.accept_mimetypes.best_match(['application/json', 'text/html']) == 'application/json'
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        result = {'errors': ['No file uploaded']}
+    else:
+        fmt = request.form.get('format') or format_for(upload.filename)
+        on_existing = 'skip' if request.form.get('on_existing') == 'skip' else 'error'
+        result = import_products(upload.stream, fmt, on_existing)
+    
+    if wants_json:
+        return jsonify(result), 400 if result['errors'] else 200
+    if result['errors']:
+        flash('Nothing was imported: ' + '; '.join(result['errors'][:5]) +
+              (f" (and {len(result['errors']) - 5} more)" if len(result['errors']) > 5 else ''))
+    else:
+        flash(f"Imported {result['products']} products with {result['variants']} variants" +
+              (f", skipped {result['skipped']} already in the catalogue" if result['skipped'] else ''))
+    return redirect(url_for('products.list_products'))
+
+@bp.route('/export.<fmt>')
+def bulk_export(fmt):
+    """Every product with its options and variants, streamed as CSV, JSON or NDJSON"""
+    if fmt not in FORMATS:
+        abort(404)
+    mimetype = {'csv': 'text/csv', 'json': 'application/json', 'ndjson': 'application/x-ndjson'}[fmt]
+    filename = f"products-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{fmt}"
+    return Response(
+        stream_with_context(export_products(fmt)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@bp.route('/import-template.csv')
+def download_import_template():
+    return Response(import_template(), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=products-import-template.csv'})
 
 @bp.route('/new', methods=['GET', 'POST'])
 def create_product():
     if request.method == 'POST':
         has_variants = request.form.get('has_variants') == 'on'
+        options = parse_options(request.form.getlist('option_name[]'), request.form.getlist('option_values[]')) if has_variants else []
+        if variant_count(options) > MAX_VARIANTS:
+            flash(f'{variant_count(options)} variants is more than the limit of {MAX_VARIANTS}; use fewer variation values')
+            return redirect(url_for('products.create_product'))
         
         # Auto-generate SKU if not provided
         sku = request.form.get('sku') or None
@@ -54,14 +112,8 @@ def create_product():
             # Generate SKU from product name
             name = request.form.get('name', '').strip()
             if name:
-                # Create SKU from name: uppercase, remove special chars, limit to 20 chars
-                sku_base = ''.join(c.upper() if c.isalnum() else '' for c in name)[:15]
-                # Add number suffix if needed to make unique
-                counter = 1
-                sku = f"{sku_base}{counter:03d}"
-                while Product.query.filter_by(sku=sku).first():
-                    counter += 1
-                    sku = f"{sku_base}{counter:03d}"
+                # Create SKU from name: uppercase, remove special chars, numbered to make it unique
+                sku = SkuAllocator(Product).numbered(sku_base(name))
         
         product = Product(
             name=request.form.get('name'),
@@ -78,83 +130,16 @@ def create_product():
         
         # Handle variations if enabled
         if has_variants:
-            # Get option names and values from form
-            option_names = request.form.getlist('option_name[]')
-            option_values_list = request.form.getlist('option_values[]')
-            
-            # Create options and values
-            options = []
-            for idx, option_name in enumerate(option_names):
-                if option_name.strip():
-                    option = ProductOption(
-                        product_id=product.id,
-                        name=option_name.strip(),
-                        display_order=idx
-                    )
-                    db.session.add(option)
-                    db.session.flush()
-                    
-                    # Parse values (comma-separated)
-                    values_str = option_values_list[idx] if idx < len(option_values_list) else ''
-                    values = [v.strip() for v in values_str.split(',') if v.strip()]
-                    
-                    for val_idx, value in enumerate(values):
-                        option_value = ProductOptionValue(
-                            option_id=option.id,
-                            value=value,
-                            display_order=val_idx
-                        )
-                        db.session.add(option_value)
-                    
-                    options.append(option)
-            
-            # Generate all variant combinations
-            if options:
-                # Get all value combinations
-                all_value_combos = []
-                for option in options:
-                    values = [v.value for v in option.values]
-                    all_value_combos.append(values)
-                
-                # Generate cartesian product of all combinations
-                variant_combinations = list(itertools_product(*all_value_combos))
-                
-                # Create variants
-                base_price = float(request.form.get('price'))
-                variant_prices = request.form.getlist('variant_price[]')
-                variant_skus = request.form.getlist('variant_sku[]')
-                
-                for idx, combo in enumerate(variant_combinations):
-                    # Create variant data dict
-                    variant_data = {}
-                    for opt_idx, option in enumerate(options):
-                        variant_data[option.name] = combo[opt_idx]
-                    
-                    # Get price for this variant (or use base price)
-                    variant_price = float(variant_prices[idx]) if idx < len(variant_prices) and variant_prices[idx] else base_price
-                    variant_sku = variant_skus[idx] if idx < len(variant_skus) and variant_skus[idx] else None
-                    
-                    # Auto-generate variant SKU if not provided
-                    if not variant_sku:
-                        base_sku = product.sku or f"PROD{product.id:05d}"
-                        variant_suffix = "-".join([str(v).upper()[:3] for v in combo])
-                        variant_sku = f"{base_sku}-{variant_suffix}"
-                        # Ensure uniqueness
-                        counter = 1
-                        original_sku = variant_sku
-                        while ProductVariant.query.filter_by(sku=variant_sku).first():
-                            variant_sku = f"{original_sku}-{counter}"
-                            counter += 1
-                    
-                    variant = ProductVariant(
-                        product_id=product.id,
-                        sku=variant_sku,
-                        price=variant_price,
-                        tax_rate=float(request.form.get('tax_rate') or 0),
-                        variant_data=json.dumps(variant_data),
-                        is_active=True
-                    )
-                    db.session.add(variant)
+            try:
+                job = save_variants(product, options,
+                                    prices=request.form.getlist('variant_price[]'),
+                                    skus=request.form.getlist('variant_sku[]'))
+            except ValueError as e:
+                db.session.rollback()
+                flash(str(e))
+                return redirect(url_for('products.create_product'))
+            if job is not None:
+                flash(variant_job_message(job))
         
         db.session.commit()
         return redirect(url_for('products.list_products'))
@@ -167,13 +152,23 @@ def create_product():
     for default_cat in default_categories:
         if default_cat not in category_list:
             category_list.append(default_cat)
-    return render_template('products/form.html', product=None, categories=category_list)
+    return render_template('products/form.html', product=None, categories=category_list, max_variants=MAX_VARIANTS)
 
 @bp.route('/<int:product_id>/edit', methods=['GET', 'POST'])
 def edit_product(product_id):
     product = Product.query.get_or_404(product_id)
     
     if request.method == 'POST':
+        if running_variant_job(product) is not None:
+            flash('Variants of this product are still being generated; save again once that has finished')
+            return redirect(url_for('products.edit_product', product_id=product.id))
+        has_variants = request.form.get('has_variants') == 'on'
+        options = parse_options(request.form.getlist('option_name[]'), request.form.getlist('option_values[]')) if has_variants else []
+        if variant_count(options) > MAX_VARIANTS:
+            flash(f'{variant_count(options)} variants is more than the limit of {MAX_VARIANTS}; use fewer variation values')
+            return redirect(url_for('products.edit_product', product_id=product.id))
+        renames = option_renames(product, request.form.getlist('option_name[]'), request.form.getlist('option_id[]'))
+        
         product.name = request.form.get('name')
         product.description = request.form.get('description')
         
@@ -182,104 +177,27 @@ def edit_product(product_id):
         if not sku and not product.sku:
             name = request.form.get('name', '').strip()
             if name:
-                sku_base = ''.join(c.upper() if c.isalnum() else '' for c in name)[:15]
-                counter = 1
-                sku = f"{sku_base}{counter:03d}"
-                while Product.query.filter(Product.sku == sku, Product.id != product.id).first():
-                    counter += 1
-                    sku = f"{sku_base}{counter:03d}"
+                sku = SkuAllocator(Product, exclude_id=product.id).numbered(sku_base(name))
         
         product.sku = sku
         product.price = float(request.form.get('price'))
         product.tax_rate = float(request.form.get('tax_rate') or 0)
         product.category = request.form.get('category')
         product.is_active = request.form.get('is_active') == 'on'
-        has_variants = request.form.get('has_variants') == 'on'
         product.has_variants = has_variants
         
-        # Delete existing options and variants if disabling variations
-        if not has_variants:
-            # Delete in correct order: values first, then options, then variants
-            options_to_delete = ProductOption.query.filter_by(product_id=product.id).all()
-            for option in options_to_delete:
-                ProductOptionValue.query.filter_by(option_id=option.id).delete()
-            ProductOption.query.filter_by(product_id=product.id).delete()
-            ProductVariant.query.filter_by(product_id=product.id).delete()
-        else:
-            # Handle variant updates (similar to create)
-            # For simplicity, delete and recreate - delete in correct order
-            options_to_delete = ProductOption.query.filter_by(product_id=product.id).all()
-            for option in options_to_delete:
-                ProductOptionValue.query.filter_by(option_id=option.id).delete()
-            ProductOption.query.filter_by(product_id=product.id).delete()
-            ProductVariant.query.filter_by(product_id=product.id).delete()
-            
-            option_names = request.form.getlist('option_name[]')
-            option_values_list = request.form.getlist('option_values[]')
-            
-            options = []
-            for idx, option_name in enumerate(option_names):
-                if option_name.strip():
-                    option = ProductOption(
-                        product_id=product.id,
-                        name=option_name.strip(),
-                        display_order=idx
-                    )
-                    db.session.add(option)
-                    db.session.flush()
-                    
-                    values_str = option_values_list[idx] if idx < len(option_values_list) else ''
-                    values = [v.strip() for v in values_str.split(',') if v.strip()]
-                    
-                    for val_idx, value in enumerate(values):
-                        option_value = ProductOptionValue(
-                            option_id=option.id,
-                            value=value,
-                            display_order=val_idx
-                        )
-                        db.session.add(option_value)
-                    
-                    options.append(option)
-            
-            if options:
-                all_value_combos = []
-                for option in options:
-                    values = [v.value for v in option.values]
-                    all_value_combos.append(values)
-                
-                variant_combinations = list(itertools_product(*all_value_combos))
-                base_price = float(request.form.get('price'))
-                variant_prices = request.form.getlist('variant_price[]')
-                variant_skus = request.form.getlist('variant_sku[]')
-                
-                for idx, combo in enumerate(variant_combinations):
-                    variant_data = {}
-                    for opt_idx, option in enumerate(options):
-                        variant_data[option.name] = combo[opt_idx]
-                    
-                    variant_price = float(variant_prices[idx]) if idx < len(variant_prices) and variant_prices[idx] else base_price
-                    variant_sku = variant_skus[idx] if idx < len(variant_skus) and variant_skus[idx] else None
-                    
-                    # Auto-generate variant SKU if not provided
-                    if not variant_sku:
-                        base_sku = product.sku or f"PROD{product.id:05d}"
-                        variant_suffix = "-".join([str(v).upper()[:3] for v in combo])
-                        variant_sku = f"{base_sku}-{variant_suffix}"
-                        counter = 1
-                        original_sku = variant_sku
-                        while ProductVariant.query.filter(ProductVariant.sku == variant_sku).first():
-                            variant_sku = f"{original_sku}-{counter}"
-                            counter += 1
-                    
-                    variant = ProductVariant(
-                        product_id=product.id,
-                        sku=variant_sku,
-                        price=variant_price,
-                        tax_rate=float(request.form.get('tax_rate') or 0),
-                        variant_data=json.dumps(variant_data),
-                        is_active=True
-                    )
-                    db.session.add(variant)
+        # Only the options, values and variants that changed are written; variants whose
+        # combination is gone (or all of them, when disabling variations) are deactivated
+        try:
+            job = save_variants(product, options,
+                                prices=request.form.getlist('variant_price[]'),
+                                skus=request.form.getlist('variant_sku[]'), renames=renames)
+        except ValueError as e:
+            db.session.rollback()
+            flash(str(e))
+            return redirect(url_for('products.edit_product', product_id=product.id))
+        if job is not None:
+            flash(variant_job_message(job))
         
         db.session.commit()
         return redirect(url_for('products.list_products'))
@@ -292,7 +210,8 @@ def edit_product(product_id):
     for default_cat in default_categories:
         if default_cat not in category_list:
             category_list.append(default_cat)
-    return render_template('products/form.html', product=product, categories=category_list)
+    return render_template('products/form.html', product=product, categories=category_list,
+                           variant_prefill=variant_prefill(product), max_variants=MAX_VARIANTS)
 
 @bp.route('/<int:product_id>/delete', methods=['POST'])
 def delete_product(product_id):
@@ -303,13 +222,17 @@ def delete_product(product_id):
 
 @bp.route('/api/list')
 def api_list_products():
-    products = Product.query.filter_by(is_active=True).all()
-    return jsonify([product.to_dict() for product in products])
+    def build():
+        products = load_profile(Product.query, 'product_api').filter_by(is_active=True).all()
+        return jsonify([product.to_dict() for product in products])
+    
+    # Polling clients get a 304 until a product or variant changes
+    return conditional(product_list_validators(), build)
 
 @bp.route('/<int:product_id>/details')
 def get_product_details(product_id):
     """Get product details for slider panel"""
-    product = Product.query.get_or_404(product_id)
+    product = load_profile(Product.query, 'product_detail').get_or_404(product_id)
     
     # Build product data
     product_data = {
@@ -327,8 +250,8 @@ def get_product_details(product_id):
     }
     
     # Add variants if exists
-    if product.has_variants and product.variants:
-        for variant in product.variants:
+    if product.has_variants:
+        for variant in product.active_variants:
             variant_data = {}
             if variant.variant_data:
                 try:
@@ -363,48 +286,16 @@ def api_search_products():
     if not query or len(query) < 2:  # Minimum 2 characters
         return jsonify([])
     
-    # Limit to 8 products to keep results manageable
-    products = Product.query.filter(
-        db.and_(
-            Product.is_active == True,
-            db.or_(
-                Product.name.ilike(f'%{query}%'),
-                Product.description.ilike(f'%{query}%'),
-                Product.sku.ilike(f'%{query}%')
-            )
-        )
-    ).limit(8).all()
-    
-    results = []
-    max_results = 25  # Maximum total results to return
-    
-    for product in products:
-        if len(results) >= max_results:
-            break
-            
-        if product.has_variants and product.variants:
-            # Return variants as separate results, but limit variants per product
-            variant_count = 0
-            max_variants_per_product = 5  # Limit variants per product
-            for variant in product.variants:
-                if variant.is_active and variant_count < max_variants_per_product and len(results) < max_results:
-                    variant_dict = variant.to_dict()
-                    variant_dict['name'] = f"{product.name} - {variant.get_variant_label()}"
-                    variant_dict['product_name'] = product.name
-                    results.append(variant_dict)
-                    variant_count += 1
-        else:
-            results.append(product.to_dict())
-    
-    return jsonify(results)
+    # Answered from the in-memory catalog: up to 8 products, variants expanded
+    return jsonify(search_catalog(query))
 
 @bp.route('/api/variants/<int:product_id>')
 def api_get_variants(product_id):
     """Get all variants for a product"""
-    product = Product.query.get_or_404(product_id)
+    product = load_profile(Product.query, 'product_api').get_or_404(product_id)
     if not product.has_variants:
         return jsonify([])
     
-    variants = [v.to_dict() for v in product.variants if v.is_active]
+    variants = [v.to_dict() for v in product.active_variants]
     return jsonify(variants)
 
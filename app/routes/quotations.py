@@ -1,9 +1,14 @@
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for, send_file
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, current_app
 from app import db
 from app.models import Quotation, QuotationItem, Client, Invoice, InvoiceItem
-from app.utils.pdf import generate_quotation_pdf
+from app.utils.pdf_cache import cached_quotation_pdf
+from app.utils.pdf_jobs import enqueue_pdf, job_response, pdf_job_status, pdf_response
+from app.utils.http_cache import conditional, pdf_validators
+from app.utils.loading import load_profile
+from app.utils.numbering import next_number
+from app.utils.pagination import paginate_list, cached_count
+from app.utils.search import search_filter
 from datetime import datetime, timedelta
-import os
 
 bp = Blueprint('quotations', __name__, url_prefix='/quotations')
 
@@ -12,30 +17,32 @@ def list_quotations():
     status_filter = request.args.get('status', 'all')
     search = request.args.get('search', '').strip()
     search_by = request.args.get('search_by', 'quotation_number')
-    page = request.args.get('page', 1, type=int)
+    paging = request.args.get('paging', current_app.config['LIST_PAGINATION'])
     per_page = request.args.get('per_page', 10, type=int)
     
     # Validate per_page to prevent abuse
     if per_page not in [5, 10, 25, 50, 100]:
         per_page = 10
     
-    query = Quotation.query
+    query = load_profile(Quotation.query, 'quotation_list')
     if status_filter != 'all':
         query = query.filter_by(status=status_filter)
     
     if search:
         if search_by == 'client_name':
-            query = query.join(Client).filter(Client.name.ilike(f'%{search}%'))
+            query = query.join(Client).filter(search_filter('clients', search, 'name'))
         elif search_by == 'quotation_number':
-            query = query.filter(Quotation.quotation_number.ilike(f'%{search}%'))
+            query = query.filter(search_filter('quotations', search, 'number'))
         elif search_by == 'quotation_id':
             try:
                 query = query.filter(Quotation.id == int(search))
             except:
                 pass
     
-    quotations = query.order_by(Quotation.created_at.desc()).paginate(page=page, per_page=per_page, error_out=False)
-    return render_template('quotations/list.html', quotations=quotations, status_filter=status_filter, search=search, search_by=search_by, per_page=per_page)
+    total = cached_count('quotations', query, status_filter, search, search_by)
+    quotations = paginate_list(query, [Quotation.created_at, Quotation.id], request.args, per_page,
+                               descending=True, keyset=paging == 'keyset', total=total)
+    return render_template('quotations/list.html', quotations=quotations, status_filter=status_filter, search=search, search_by=search_by, per_page=per_page, paging=paging)
 
 @bp.route('/new', methods=['GET', 'POST'])
 def create_quotation():
@@ -43,8 +50,7 @@ def create_quotation():
     
     if request.method == 'POST':
         # Generate quotation number
-        last_quotation = Quotation.query.order_by(Quotation.id.desc()).first()
-        quotation_number = f"QT-{(last_quotation.id if last_quotation else 0) + 1:05d}"
+        quotation_number = next_number('quotation')
         
         quotation = Quotation(
             quotation_number=quotation_number,
@@ -78,10 +84,8 @@ def create_quotation():
 
 @bp.route('/<int:quotation_id>')
 def view_quotation(quotation_id):
-    quotation = Quotation.query.get_or_404(quotation_id)
-    subtotal = sum(item.subtotal for item in quotation.items)
-    tax_total = sum(item.tax for item in quotation.items)
-    return render_template('quotations/view.html', quotation=quotation, subtotal=subtotal, tax_total=tax_total)
+    quotation = load_profile(Quotation.query, 'quotation_detail').get_or_404(quotation_id)
+    return render_template('quotations/view.html', quotation=quotation, subtotal=quotation.subtotal, tax_total=quotation.tax_total)
 
 @bp.route('/<int:quotation_id>/edit', methods=['GET', 'POST'])
 def edit_quotation(quotation_id):
@@ -123,8 +127,7 @@ def convert_to_invoice(quotation_id):
     quotation = Quotation.query.get_or_404(quotation_id)
     
     # Generate invoice number
-    last_invoice = Invoice.query.order_by(Invoice.id.desc()).first()
-    invoice_number = f"INV-{(last_invoice.id if last_invoice else 0) + 1:05d}"
+    invoice_number = next_number('invoice')
     
     # Create invoice from quotation
     invoice = Invoice(
@@ -166,15 +169,22 @@ def delete_quotation(quotation_id):
 
 @bp.route('/<int:quotation_id>/pdf')
 def download_pdf(quotation_id):
-    quotation = Quotation.query.get_or_404(quotation_id)
-    pdf_file = generate_quotation_pdf(quotation)
+    def send():
+        quotation = load_profile(Quotation.query, 'quotation_detail').get_or_404(quotation_id)
+        _, data = cached_quotation_pdf(quotation)
+        return pdf_response(data, f"{quotation.quotation_number}.pdf")
     
-    if os.path.exists(pdf_file):
-        return send_file(pdf_file, as_attachment=True, download_name=f"{quotation.quotation_number}.pdf")
-    
-    return "PDF generation failed", 500
+    # Unchanged PDFs get a 304 before anything is loaded or rendered
+    return conditional(pdf_validators('quotation', quotation_id), send)
+
+@bp.route('/<int:quotation_id>/pdf/jobs', methods=['POST'])
+def enqueue_pdf_job(quotation_id):
+    """Render the PDF in the background; poll status_url, then fetch result_url"""
+    quotation = load_profile(Quotation.query, 'quotation_detail').get_or_404(quotation_id)
+    job_id = enqueue_pdf('quotation', quotation)
+    return job_response(pdf_job_status(job_id), f"{quotation.quotation_number}.pdf")
 
 @bp.route('/api/list')
 def api_list_quotations():
-    quotations = Quotation.query.all()
+    quotations = load_profile(Quotation.query, 'quotation_list').all()
     return jsonify([quotation.to_dict() for quotation in quotations])
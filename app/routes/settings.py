@@ -2,6 +2,9 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from app import db
 from app.models import CompanySettings
 from werkzeug.utils import secure_filename
+from app.utils.logo import invalidate_logo
+from app.utils.http_cache import IMMUTABLE_MAX_AGE
+from app.utils.company import get_company
 import os
 from datetime import datetime
 
@@ -15,9 +18,9 @@ def allowed_file(filename):
 
 @bp.route('/company', methods=['GET', 'POST'])
 def company_settings():
-    settings = CompanySettings.get_settings()
-    
     if request.method == 'POST':
+        settings = CompanySettings.get_settings()
+        
         # Update company information
         settings.company_name = request.form.get('company_name', '')
         settings.company_address = request.form.get('company_address', '')
@@ -46,6 +49,7 @@ def company_settings():
                 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
                 
                 # Delete old logo if exists
+                invalidate_logo(settings.logo_path)
                 if settings.logo_path and os.path.exists(settings.logo_path):
                     try:
                         os.remove(settings.logo_path)
@@ -66,10 +70,11 @@ def company_settings():
         flash('Company settings updated successfully!', 'success')
         return redirect(url_for('settings.company_settings'))
     
-    return render_template('settings/company.html', settings=settings)
+    return render_template('settings/company.html', settings=get_company())
 
 @bp.route('/logo/<filename>')
 def serve_logo(filename):
     """Serve uploaded logo files"""
-    return send_from_directory(UPLOAD_FOLDER, filename)
+    # Uploads get a new timestamped name, so a URL's content never changes
+    return send_from_directory(UPLOAD_FOLDER, filename, max_age=IMMUTABLE_MAX_AGE)
 
@@ -0,0 +1,236 @@
+"""Small caching layer with write-triggered invalidation.
+
+Values live in a backend: an in-process TTL store by default, or Redis when
+CACHE_REDIS_URL is set (so all gunicorn workers share entries and
+invalidations). Caches declare which models they depend on; when a session
+commits changes to one of those models the dependent keys are dropped.
+
+Invalidations only reach the worker that made the write unless the backend
+is shared, so per-worker snapshots (company settings, product catalog) also
+compare a DatabaseStamp, re-read at most every SNAPSHOT_RECHECK_SECONDS.
+"""
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import json
+import os
+import threading
+import time
+
+_MISSING = object()
+
+
+class LocalBackend:
+    """In-process key/value store with per-key expiry"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self, prefix=''):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+
+class RedisBackend:
+    """Shared backend storing JSON-encoded values in Redis"""
+
+    def __init__(self, url, key_prefix='invoice-system:'):
+        import redis  # Optional dependency, only needed when CACHE_REDIS_URL is set
+        self._client = redis.Redis.from_url(url)
+        self._prefix = key_prefix
+
+    def get(self, key):
+        raw = self._client.get(self._prefix + key)
+        return _MISSING if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self._client.set(self._prefix + key, json.dumps(value), ex=int(ttl) if ttl else None)
+
+    def delete(self, key):
+        self._client.delete(self._prefix + key)
+
+    def clear(self, prefix=''):
+        keys = list(self._client.scan_iter(match=f"{self._prefix}{prefix}*"))
+        if keys:
+            self._client.delete(*keys)
+
+
+_backend = LocalBackend()
+_caches = {}
+
+
+def configure_cache(app):
+    """Select the cache backend from the app config"""
+    global _backend
+    redis_url = app.config.get('CACHE_REDIS_URL')
+    if redis_url:
+        try:
+            _backend = RedisBackend(redis_url)
+        except ImportError:
+            app.logger.warning("CACHE_REDIS_URL is set but the redis package is not installed; using the in-process cache")
+            _backend = LocalBackend()
+    else:
+        _backend = LocalBackend()
+
+
+def is_shared():
+    """Whether cache entries and invalidations are seen by every worker"""
+    return not isinstance(_backend, LocalBackend)
+
+
+# How stale a worker's snapshot may get after a write in another worker (in-process backend)
+SNAPSHOT_RECHECK_SECONDS = float(os.environ.get('SNAPSHOT_RECHECK_SECONDS', 2))
+
+
+class DatabaseStamp:
+    """Result of a cheap query that changes whenever some data changes, e.g. a row
+    count and the newest updated_at, re-read at most every SNAPSHOT_RECHECK_SECONDS.
+
+    With the in-process backend it is what tells a worker that another worker
+    wrote. With a shared backend the invalidations already do, and get()
+    returns None without querying, unless local is set: data kept in this
+    process that no cache invalidation reaches (the search index). Outside an
+    application context the last value read is returned.
+    """
+
+    def __init__(self, query, local=False):
+        self.query = query
+        self.local = local
+        self._value = None
+        self._read_at = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        from flask import has_app_context
+
+        if is_shared() and not self.local:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            fresh = self._read_at is not None and now - self._read_at < SNAPSHOT_RECHECK_SECONDS
+            if fresh or not has_app_context():
+                return self._value
+            self._value = self.query()
+            self._read_at = now
+            return self._value
+
+    def reset(self):
+        """Re-read on the next get(), e.g. after this worker wrote"""
+        with self._lock:
+            self._read_at = None
+
+
+class Cache:
+    """A named group of cache keys with hit/miss counters"""
+
+    def __init__(self, name, ttl=60):
+        self.name = name
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        _caches[name] = self
+
+    def _key(self, key):
+        return f"{self.name}:{key}"
+
+    def get_or_set(self, key, factory, ttl=None):
+        value = _backend.get(self._key(key))
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = factory()
+        _backend.set(self._key(key), value, ttl or self.ttl)
+        return value
+
+    def invalidate(self, key=None):
+        """Drop one key, or every key of this cache"""
+        self.invalidations += 1
+        if key is None:
+            _backend.clear(self._key(''))
+        else:
+            _backend.delete(self._key(key))
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'ttl': self.ttl,
+        }
+
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+# model class -> list of callbacks run after a commit that changed it
+_dependents = {}
+
+
+def invalidate_on_change(models, callback):
+    """Run callback after any commit that inserts, updates or deletes one of models"""
+    for model in models:
+        callbacks = _dependents.setdefault(model, [])
+        if callback not in callbacks:
+            callbacks.append(callback)
+
+
+def _record_changes(session, classes):
+    changed = session.info.setdefault('changed_models', set())
+    changed.update(cls for cls in classes if cls in _dependents)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed(session, flush_context):
+    _record_changes(session, {type(obj) for obj in list(session.new) + list(session.dirty) + list(session.deleted)})
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk(orm_execute_state):
+    # Query.update()/delete() and bulk insert(Model) bypass the flush, so catch them here
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        _record_changes(orm_execute_state.session, {m.class_ for m in orm_execute_state.all_mappers})
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    changed = session.info.pop('changed_models', None)
+    if not changed:
+        return
+    callbacks = []
+    for model in changed:
+        for callback in _dependents.get(model, []):
+            if callback not in callbacks:
+                callbacks.append(callback)
+    for callback in callbacks:
+        callback()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop('changed_models', None)
@@ -0,0 +1,107 @@
+"""In-memory product catalog for search-as-you-type.
+
+The autocomplete endpoint is answered from a snapshot of the active
+products and their variants, with the API dicts (parsed variant attributes,
+display labels) built once when the snapshot is loaded. Any committed write
+to a product, variant or option drops the version key in the cache backend;
+with the in-process backend, product and variant counts and newest
+updated_at (re-read at most every SNAPSHOT_RECHECK_SECONDS) are part of the
+version too, so writes in other workers are seen. The next search in each
+worker sees the new version and reloads the snapshot.
+"""
+from app.utils.cache import Cache, DatabaseStamp, invalidate_on_change
+from app.utils.http_cache import product_stamp
+from app.utils.search import NgramIndex, SEARCH_SCOPES
+import threading
+import time
+import uuid
+
+# Autocomplete limits
+MAX_PRODUCTS = 8
+MAX_VARIANTS_PER_PRODUCT = 5
+MAX_RESULTS = 25
+
+# Version token shared through the cache backend, so with Redis a write in one
+# worker invalidates every worker's snapshot. Never expires on its own.
+catalog_version = Cache('catalog_version', ttl=0)
+catalog_stamp = DatabaseStamp(product_stamp)
+
+
+class CatalogSnapshot:
+    """Active products with their autocomplete results precomputed"""
+
+    def __init__(self, version, products):
+        self.version = version
+        self.built_at = time.time()
+        self.fields = SEARCH_SCOPES['products']['all']
+        self.index = NgramIndex(self.fields)
+        # product id -> list of result dicts (the product itself, or its active variants)
+        self.results = {}
+        for product in products:
+            self.index.add(product.id, {field: getattr(product, field) for field in self.fields})
+            self.results[product.id] = _results_for(product)
+
+    def __len__(self):
+        return len(self.results)
+
+    def search(self, term):
+        results = []
+        for product_id in self.index.search(term, limit=MAX_PRODUCTS):
+            for result in self.results[product_id]:
+                if len(results) >= MAX_RESULTS:
+                    return results
+                results.append(result)
+        return results
+
+
+def _results_for(product):
+    variants = product.active_variants if product.has_variants else []
+    if variants:
+        results = []
+        for variant in variants[:MAX_VARIANTS_PER_PRODUCT]:
+            variant_dict = variant.to_dict()
+            variant_dict['name'] = f"{product.name} - {variant_dict['display_name']}"
+            variant_dict['product_name'] = product.name
+            results.append(variant_dict)
+        return results
+    return [product.to_dict()]
+
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+def _current_version():
+    return catalog_version.get_or_set('version', lambda: uuid.uuid4().hex), catalog_stamp.get()
+
+
+def get_catalog():
+    """The current snapshot, reloaded if a product write has bumped the version"""
+    global _snapshot
+    version = _current_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            from sqlalchemy.orm import selectinload
+            from app.models import Product
+            products = (Product.query.options(selectinload(Product.variants))
+                        .filter(Product.is_active == True).all())
+            _snapshot = CatalogSnapshot(version, products)
+        return _snapshot
+
+
+def search_catalog(term):
+    """Autocomplete results for term: up to MAX_PRODUCTS products, variants expanded"""
+    return get_catalog().search(term)
+
+
+def _invalidate_catalog():
+    catalog_version.invalidate()
+    catalog_stamp.reset()
+
+
+def register_catalog_invalidation():
+    from app.models import Product, ProductOption, ProductOptionValue, ProductVariant
+    invalidate_on_change([Product, ProductVariant, ProductOption, ProductOptionValue], _invalidate_catalog)
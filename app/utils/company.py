@@ -0,0 +1,81 @@
+"""Process-wide snapshot of the company settings.
+
+CompanySettings.get_settings() is one query (and maybe an insert) per call,
+and every PDF, bulk export entry and settings page used to make it. Readers
+now get a CompanySnapshot: a plain, detached copy of the row that works
+after the session is gone, outside a request and in render worker processes.
+It carries a version that changes whenever a commit touches the settings:
+a token in the cache backend, so with CACHE_REDIS_URL every worker drops its
+snapshot when any of them saves, and with the in-process backend also the
+settings row itself, re-read at most every SNAPSHOT_RECHECK_SECONDS, so
+other workers pick up a save within that time.
+
+Writers (the settings form) keep using CompanySettings.get_settings().
+"""
+from app.utils.cache import Cache, DatabaseStamp, invalidate_on_change
+from types import SimpleNamespace
+import threading
+import uuid
+
+settings_version = Cache('company_settings_version', ttl=0)
+
+
+def _settings_row():
+    from app import db
+    from app.models import CompanySettings
+
+    row = db.session.execute(
+        CompanySettings.__table__.select().order_by(CompanySettings.id).limit(1)).first()
+    return tuple(row) if row is not None else None
+
+
+settings_row = DatabaseStamp(_settings_row)
+
+_snapshot = None
+_lock = threading.Lock()
+
+
+class CompanySnapshot(SimpleNamespace):
+    """Read-only company settings: every CompanySettings column plus version"""
+
+    def columns(self, exclude=()):
+        """Column values as a dict"""
+        return {key: value for key, value in vars(self).items() if key != 'version' and key not in exclude}
+
+    def to_dict(self):
+        return self.columns(exclude=('created_at', 'updated_at'))
+
+
+def _current_version():
+    return settings_version.get_or_set('version', lambda: uuid.uuid4().hex), settings_row.get()
+
+
+def get_company():
+    """The current settings snapshot, reloaded after the settings change.
+
+    Reloading needs an application context; a current snapshot is returned
+    from anywhere.
+    """
+    global _snapshot
+    version = _current_version()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    with _lock:
+        if _snapshot is None or _snapshot.version != version:
+            from app.models import CompanySettings
+            # version was read before loading, so a save racing with this load forces another one
+            settings = CompanySettings.get_settings()
+            _snapshot = CompanySnapshot(
+                version=version, **{c.key: getattr(settings, c.key) for c in CompanySettings.__table__.columns})
+        return _snapshot
+
+
+def _invalidate_settings():
+    settings_version.invalidate()
+    settings_row.reset()
+
+
+def register_company_invalidation():
+    from app.models import CompanySettings
+    invalidate_on_change([CompanySettings], _invalidate_settings)
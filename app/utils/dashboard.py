@@ -0,0 +1,107 @@
+from app import db
+from app.utils.cache import Cache, invalidate_on_change
+from sqlalchemy import func, case, literal, literal_column
+from sqlalchemy.orm import joinedload
+from datetime import datetime, timedelta
+import os
+
+dashboard_cache = Cache('dashboard', ttl=int(os.environ.get('DASHBOARD_CACHE_TTL', 60)))
+
+# Aging buckets for outstanding balances: (label, minimum days past due)
+AGING_BUCKETS = [
+    ('90+ days', 90),
+    ('61-90 days', 60),
+    ('31-60 days', 30),
+    ('1-30 days', 0),
+]
+CURRENT_BUCKET = 'Current'
+
+
+def _aging_bucket(due_date, today):
+    """SQL CASE expression assigning each invoice to an aging bucket by due date"""
+    whens = [(due_date < today - timedelta(days=days), literal(label)) for label, days in AGING_BUCKETS]
+    return case(*whens, else_=literal(CURRENT_BUCKET))
+
+
+def get_dashboard_stats():
+    """Dashboard statistics, served from the cache while the underlying rows are unchanged"""
+    stats = dict(dashboard_cache.get_or_set('invoices', compute_invoice_stats))
+    stats['total_clients'] = dashboard_cache.get_or_set('clients', compute_client_count)
+    return stats
+
+
+def compute_invoice_stats(today=None):
+    """Compute the invoice statistics with grouped SQL aggregates.
+
+    All invoice figures come from a single query grouped by status and aging
+    bucket over the stored invoice totals, so the cost does not grow with the
+    number of line items or payments.
+    """
+    from app.models import Invoice
+
+    today = today or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    bucket = _aging_bucket(Invoice.due_date, today).label('bucket')
+
+    rows = db.session.query(
+        Invoice.status,
+        bucket,
+        func.count(Invoice.id),
+        func.coalesce(func.sum(Invoice.total), 0),
+        func.coalesce(func.sum(Invoice.balance), 0),
+    ).group_by(Invoice.status, literal_column('bucket')).all()
+
+    total_invoices = 0
+    pending_invoices = 0
+    total_revenue = 0
+    outstanding_balance = 0
+    aging = {CURRENT_BUCKET: 0}
+    aging.update((label, 0) for label, _ in reversed(AGING_BUCKETS))
+
+    for status, bucket_label, count, total, balance in rows:
+        total_invoices += count
+        if status in ('draft', 'sent'):
+            pending_invoices += count
+        if status == 'paid':
+            total_revenue += total
+        elif status != 'draft':
+            # Drafts haven't been sent yet, so nothing is owed on them
+            outstanding_balance += balance
+            aging[bucket_label] += balance
+
+    return {
+        'total_invoices': total_invoices,
+        'pending_invoices': pending_invoices,
+        'total_revenue': float(total_revenue),
+        'outstanding_balance': float(outstanding_balance),
+        'aging': {label: float(amount) for label, amount in aging.items()},
+    }
+
+
+def compute_client_count():
+    from app.models import Client
+    return db.session.query(func.count(Client.id)).scalar() or 0
+
+
+def _invalidate_invoice_stats():
+    dashboard_cache.invalidate('invoices')
+
+
+def _invalidate_client_count():
+    dashboard_cache.invalidate('clients')
+
+
+def register_cache_invalidation():
+    """Drop the cached figures when the rows they are computed from change"""
+    from app.models import Client, Invoice, InvoiceItem, Payment
+
+    invalidate_on_change([Invoice, InvoiceItem, Payment], _invalidate_invoice_stats)
+    invalidate_on_change([Client], _invalidate_client_count)
+
+
+def get_recent_invoices(limit=5):
+    """Most recent invoices with their client loaded in the same query"""
+    from app.models import Invoice
+
+    return Invoice.query.options(joinedload(Invoice.client)).order_by(
+        Invoice.created_at.desc()
+    ).limit(limit).all()
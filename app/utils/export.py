@@ -0,0 +1,156 @@
+"""Bulk invoice export: many PDFs streamed as one ZIP archive.
+
+Invoices are selected with the same filters as the invoice list, rendered
+in parallel in the PDF process pool (reusing anything already in the PDF
+cache) and written to the archive one entry at a time, so only the PDFs in
+flight are held in memory. The response is under way before the first PDF
+is rendered, so a failed render can't turn into an error status: the
+invoice gets a .error.txt entry instead, and an export that breaks off ends
+with an EXPORT-INCOMPLETE.txt entry in a still readable archive.
+"""
+from app.utils.jobs import jobs
+from app.utils.pdf_cache import pdf_cache, prepare, render_bytes
+from app.utils.search import search_filter
+from collections import deque
+from datetime import datetime, timedelta
+import io
+import logging
+import os
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', os.cpu_count() or 2))
+# 'process' (default) or 'thread'
+EXPORT_POOL = os.environ.get('PDF_POOL', 'process')
+
+
+def invoice_filters(args):
+    """Invoice filter keyword arguments from request args (or any dict of strings)"""
+    def parse_date(value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d') if value else None
+        except ValueError:
+            return None
+
+    client_id = args.get('client_id') or None
+    return {
+        'status': args.get('status', 'all') or 'all',
+        'search': (args.get('search') or '').strip(),
+        'search_by': args.get('search_by', 'invoice_number') or 'invoice_number',
+        'client_id': int(client_id) if client_id and str(client_id).isdigit() else None,
+        'date_from': parse_date(args.get('date_from')),
+        'date_to': parse_date(args.get('date_to')),
+    }
+
+
+def filter_invoices(query, status='all', search='', search_by='invoice_number', client_id=None,
+                    date_from=None, date_to=None):
+    """Apply the invoice list filters to an Invoice query. Dates bound issue_date, inclusive."""
+    from app.models import Invoice, Client
+
+    if status != 'all':
+        query = query.filter_by(status=status)
+
+    if client_id is not None:
+        query = query.filter(Invoice.client_id == client_id)
+    if date_from is not None:
+        query = query.filter(Invoice.issue_date >= date_from)
+    if date_to is not None:
+        query = query.filter(Invoice.issue_date < date_to + timedelta(days=1))
+
+    if search:
+        if search_by == 'client_name':
+            query = query.join(Client).filter(search_filter('clients', search, 'name'))
+        elif search_by == 'invoice_number':
+            query = query.filter(search_filter('invoices', search, 'number'))
+        elif search_by == 'invoice_id':
+            try:
+                query = query.filter(Invoice.id == int(search))
+            except:
+                pass
+    return query
+
+
+def iter_invoice_pdfs(query, workers=None, batch_size=100):
+    """Yield (filename, pdf bytes) for each invoice of query, in query order.
+
+    At most twice the worker count are rendered ahead of the archive writer.
+    An invoice whose render fails yields (<number>.error.txt, the error).
+    """
+    from app.models import Invoice
+    from app.utils.company import get_company
+    from app.utils.loading import load_profile
+
+    executor = jobs.executor(f'export-{workers or EXPORT_WORKERS}', kind=EXPORT_POOL,
+                             max_workers=workers or EXPORT_WORKERS)
+    window = 2 * (workers or EXPORT_WORKERS)
+    pending = deque()
+
+    def ready(entry):
+        return entry[2] is not None or entry[3].done()
+
+    def result(entry):
+        filename, key, cached, future = entry
+        if cached is not None:
+            return filename, cached
+        try:
+            data = future.result()
+        except Exception as e:
+            logger.exception('Exporting %s failed', filename)
+            return f"{filename[:-len('.pdf')]}.error.txt", f'{filename} could not be rendered: {e!r}\n'.encode()
+        pdf_cache.put(key, data)
+        return filename, data
+
+    company = get_company()
+    query = load_profile(query, 'invoice_detail').order_by(Invoice.issue_date, Invoice.id)
+    for invoice in query.yield_per(batch_size):
+        key, inputs = prepare('invoice', invoice, company)
+        filename = f"{invoice.invoice_number}.pdf"
+        data = pdf_cache.get(key)
+        if data is not None:
+            pending.append((filename, key, data, None))
+        else:
+            pending.append((filename, key, None, executor.submit(render_bytes, 'invoice', inputs)))
+        while pending and (len(pending) > window or ready(pending[0])):
+            yield result(pending.popleft())
+    while pending:
+        yield result(pending.popleft())
+
+
+class _StreamSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after each ZIP entry"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries):
+    """Yield a ZIP archive of (filename, bytes) entries chunk by chunk.
+
+    If entries raises, the archive is still finished, with a final
+    EXPORT-INCOMPLETE.txt entry saying why.
+    """
+    sink = _StreamSink()
+    # ReportLab leaves page streams uncompressed, so deflate is worth it
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        try:
+            for filename, data in entries:
+                archive.writestr(filename, data)
+                yield sink.drain()
+        except Exception as e:
+            logger.exception('Export stopped early')
+            archive.writestr('EXPORT-INCOMPLETE.txt', f'The export stopped after the entries above: {e!r}\n')
+    yield sink.drain()
@@ -0,0 +1,203 @@
+"""Conditional GET support: ETag and Last-Modified validators and 304 responses.
+
+Routes work out a validator from a cheap query (timestamps and counts, no
+relationship loading), answer If-None-Match / If-Modified-Since with a 304
+before doing any real work, and otherwise attach the validator to the full
+response. Entities carry updated_at; child rows (invoice items, payments,
+quotation items, product options and variants) don't, so flushing one
+touches its parent's updated_at instead. Query.update()/delete() on child
+rows bypass that, but the routes using them also rewrite the parent.
+"""
+from datetime import date, datetime, timezone
+from flask import Response, abort, make_response, request, session
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from werkzeug.http import is_resource_modified
+import hashlib
+import os
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Long-lived responses whose URL changes with their content (uploaded logos)
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def _templates_version():
+    # Pages must not be served from browser caches across a deploy that changed them
+    newest = 0
+    for root, _, files in os.walk(os.path.join(APP_DIR, 'templates')):
+        for name in files:
+            newest = max(newest, os.stat(os.path.join(root, name)).st_mtime_ns)
+    return str(newest)
+
+
+TEMPLATES_VERSION = os.environ.get('HTTP_CACHE_VERSION') or _templates_version()
+
+
+def make_etag(*parts):
+    """Opaque ETag for a tuple of validator parts"""
+    return hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+
+
+def _utc(value):
+    return value.replace(tzinfo=timezone.utc) if value is not None and value.tzinfo is None else value
+
+
+def not_modified(etag=None, last_modified=None):
+    """A 304 response if the request's validators match, else None.
+
+    Pages about to show flashed messages are always sent in full.
+    """
+    if '_flashes' in session:
+        return None
+    last_modified = _utc(last_modified)
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    return cache_headers(Response(status=304), etag, last_modified)
+
+
+def cache_headers(response, etag=None, last_modified=None, max_age=None):
+    """Attach validators to response. Without max_age browsers revalidate on every use."""
+    if etag is not None:
+        response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = _utc(last_modified)
+    if max_age:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+    else:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    return response
+
+
+def conditional(validators, build, max_age=None):
+    """Response of build() with validators (etag, last_modified) attached, or a 304
+    without calling build at all. validators of None means the entity is gone: 404.
+    """
+    if validators is None:
+        abort(404)
+    etag, last_modified = validators
+    response = not_modified(etag, last_modified)
+    if response is None:
+        response = cache_headers(make_response(build()), etag, last_modified, max_age)
+    return response
+
+
+def _newest(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
+
+
+def _children(model, foreign_key, document_id):
+    # Count and newest id: items are replaced on edit, so they change even within one second
+    return (select(func.count(model.id)).where(foreign_key == document_id).scalar_subquery(),
+            select(func.max(model.id)).where(foreign_key == document_id).scalar_subquery())
+
+
+def document_validators(kind, document_id):
+    """(etag, last_modified) for an invoice or quotation page, or None if it doesn't exist.
+
+    updated_at alone has whole-second precision on MySQL DATETIME columns, so
+    the ETag also covers the document row itself (status, stored totals, ...)
+    and the count and newest id of its items and payments.
+    """
+    from app import db
+    from app.models import Client, Invoice, InvoiceItem, Payment, Quotation, QuotationItem
+
+    if kind == 'invoice':
+        model = Invoice
+        children = (*_children(InvoiceItem, InvoiceItem.invoice_id, document_id),
+                    *_children(Payment, Payment.invoice_id, document_id))
+    else:
+        model = Quotation
+        children = _children(QuotationItem, QuotationItem.quotation_id, document_id)
+    row = db.session.execute(
+        select(model.updated_at, Client.updated_at, *model.__table__.columns, *children)
+        .join(Client, Client.id == model.client_id).where(model.id == document_id)).first()
+    if row is None:
+        return None
+    return make_etag(kind, document_id, TEMPLATES_VERSION, *row), _newest(row[0], row[1])
+
+
+def pdf_validators(kind, document_id):
+    """(etag, last_modified) for a document's PDF, or None if it doesn't exist.
+
+    Also covers the company settings (all of them, not just updated_at) and
+    the generation date in the footer.
+    """
+    from app.utils.company import get_company
+    from app.utils.pdf_cache import RENDER_VERSION
+
+    validators = document_validators(kind, document_id)
+    if validators is None:
+        return None
+    etag, last_modified = validators
+    company = get_company()
+    return (make_etag('pdf', etag, RENDER_VERSION, sorted(company.columns().items()), date.today()),
+            _newest(last_modified, company.updated_at))
+
+
+def product_stamp():
+    """Newest product change and product count, newest variant change and variant count"""
+    from app import db
+    from app.models import Product, ProductVariant
+
+    return tuple(db.session.execute(select(
+        select(func.max(Product.updated_at)).scalar_subquery(),
+        select(func.count(Product.id)).scalar_subquery(),
+        select(func.max(ProductVariant.updated_at)).scalar_subquery(),
+        select(func.count(ProductVariant.id)).scalar_subquery(),
+    )).one())
+
+
+def product_list_validators():
+    """(etag, last_modified) for the product list API: newest change and row counts"""
+    row = product_stamp()
+    return make_etag('products', *row), _newest(row[0], row[2])
+
+
+def _parents():
+    # child model -> (parent model, foreign key attribute, relationship attribute)
+    from app.models import Invoice, InvoiceItem, Payment, Product, Quotation, QuotationItem
+    from app.models.product import ProductOption, ProductOptionValue, ProductVariant
+
+    return {
+        InvoiceItem: (Invoice, 'invoice_id', 'invoice'),
+        Payment: (Invoice, 'invoice_id', 'invoice'),
+        QuotationItem: (Quotation, 'quotation_id', 'quotation'),
+        ProductOption: (Product, 'product_id', 'product'),
+        ProductOptionValue: (ProductOption, 'option_id', 'option'),
+        ProductVariant: (Product, 'product_id', 'product'),
+    }
+
+
+def _touch_parents(session, flush_context, instances):
+    parents = _parents()
+    now = datetime.utcnow()
+    touched = set()
+    with session.no_autoflush:
+        pending = [obj for obj in list(session.new) + list(session.dirty) + list(session.deleted)
+                   if type(obj) in parents]
+        while pending:
+            obj = pending.pop()
+            parent_model, foreign_key, relationship = parents[type(obj)]
+            parent_id = getattr(obj, foreign_key)
+            if parent_id is not None:
+                parent = session.get(parent_model, parent_id)
+            else:
+                # Attached through the relationship, foreign key not set until this flush
+                parent = obj.__dict__.get(relationship)
+            if parent is None or id(parent) in touched or parent in session.deleted:
+                continue
+            touched.add(id(parent))
+            if type(parent) in parents:
+                pending.append(parent)  # e.g. option value -> option -> product
+            else:
+                parent.updated_at = now
+
+
+def register_touch_parents():
+    """Bump the parent's updated_at whenever child rows are flushed"""
+    if not event.contains(Session, 'before_flush', _touch_parents):
+        event.listen(Session, 'before_flush', _touch_parents)
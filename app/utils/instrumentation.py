@@ -0,0 +1,111 @@
+"""Per-request SQL statistics.
+
+Hooks the SQLAlchemy engine to count statements and time spent in the
+database for each request. Every response carries a Server-Timing header
+and a structured log line is written; requests over the configured
+thresholds are logged as warnings so N+1 regressions show up in production.
+"""
+from flask import g, has_request_context, request
+from sqlalchemy import event
+import heapq
+import json
+import os
+import time
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info['query_start'].pop()) * 1000
+    if not has_request_context():
+        return
+    stats = g.get('sql_stats')
+    if stats is None:
+        return
+    stats['count'] += 1
+    stats['db_ms'] += elapsed_ms
+    # Keep the N slowest statements in a min-heap
+    entry = (elapsed_ms, stats['count'], statement)
+    if len(stats['slowest']) < stats['keep']:
+        heapq.heappush(stats['slowest'], entry)
+    elif elapsed_ms > stats['slowest'][0][0]:
+        heapq.heapreplace(stats['slowest'], entry)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute; drop its start time
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('query_start'):
+        conn.info['query_start'].pop()
+
+
+def init_query_instrumentation(app):
+    """Attach the statement counters to the app's engine and request cycle"""
+    from app import db
+
+    app.config.setdefault('SQL_STATS_ENABLED', os.environ.get('SQL_STATS_ENABLED', '1') == '1')
+    app.config.setdefault('SQL_MAX_QUERIES', int(os.environ.get('SQL_MAX_QUERIES', 30)))
+    app.config.setdefault('SQL_MAX_DB_MS', float(os.environ.get('SQL_MAX_DB_MS', 500)))
+    app.config.setdefault('SQL_SLOW_QUERY_MS', float(os.environ.get('SQL_SLOW_QUERY_MS', 100)))
+    app.config.setdefault('SQL_SLOWEST_KEPT', 3)
+
+    if not app.config['SQL_STATS_ENABLED']:
+        return
+
+    with app.app_context():
+        engine = db.engine
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(engine, 'handle_error', _handle_error)
+
+    @app.before_request
+    def _start_sql_stats():
+        g.sql_stats = {
+            'count': 0,
+            'db_ms': 0.0,
+            'slowest': [],
+            'keep': app.config['SQL_SLOWEST_KEPT'],
+            'started': time.perf_counter(),
+        }
+
+    @app.after_request
+    def _report_sql_stats(response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+
+        total_ms = (time.perf_counter() - stats['started']) * 1000
+        slowest = sorted(stats['slowest'], reverse=True)
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={stats["db_ms"]:.1f};desc="{stats["count"]} queries", app;dur={total_ms:.1f}'
+        )
+
+        flagged = (
+            stats['count'] > app.config['SQL_MAX_QUERIES']
+            or stats['db_ms'] > app.config['SQL_MAX_DB_MS']
+            or (slowest and slowest[0][0] > app.config['SQL_SLOW_QUERY_MS'])
+        )
+        record = {
+            'event': 'request_sql',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'queries': stats['count'],
+            'db_ms': round(stats['db_ms'], 2),
+            'total_ms': round(total_ms, 2),
+            'flagged': bool(flagged),
+            'slowest': [
+                {'ms': round(ms, 2), 'statement': ' '.join(statement.split())[:500]}
+                for ms, _, statement in slowest
+            ],
+        }
+        if flagged:
+            app.logger.warning(json.dumps(record))
+        else:
+            app.logger.info(json.dumps(record))
+        return response
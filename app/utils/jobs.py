@@ -0,0 +1,186 @@
+"""Registry of background jobs.
+
+Work is handed to a concurrent.futures executor (a process pool for
+CPU-bound rendering, threads for work that needs the database) and tracked
+here by id so an endpoint can report its status and hand back the result.
+The worker process that runs a job also writes its status to a JSON file in
+JOB_STATE_DIR, on submit, on progress updates and when it finishes, so a
+status request that reaches another gunicorn worker on the same machine
+still finds it. Finished jobs are kept for JOB_RETENTION seconds.
+"""
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+JOB_RETENTION = int(os.environ.get('JOB_RETENTION', 3600))
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+JOB_STATE_DIR = os.environ.get('JOB_STATE_DIR', os.path.join(BASE_DIR, 'data', 'jobs'))
+
+
+class Job:
+    """One unit of background work"""
+
+    def __init__(self, job_id, kind, meta=None):
+        self.id = job_id
+        self.kind = kind
+        self.meta = meta or {}
+        self.status = 'queued'
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.future = None
+
+    @classmethod
+    def from_dict(cls, data):
+        """A job as another worker recorded it: status and meta only, no result"""
+        data = dict(data)
+        job = cls(data.pop('id'), data.pop('kind'))
+        job.status = data.pop('status')
+        job.error = data.pop('error', None)
+        job.created_at = data.pop('created_at', None)
+        job.finished_at = data.pop('finished_at', None)
+        job.meta = data
+        return job
+
+    @property
+    def done(self):
+        return self.status in ('done', 'failed')
+
+    def to_dict(self):
+        status = self.status
+        if status == 'queued' and self.future is not None and self.future.running():
+            status = 'running'
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': status,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            **self.meta,
+        }
+
+
+class JobRegistry:
+    """Jobs by id, with the executors they run on"""
+
+    def __init__(self, state_dir=JOB_STATE_DIR):
+        self.state_dir = state_dir
+        self._jobs = {}
+        self._executors = {}
+        self._lock = threading.Lock()
+
+    def _state_path(self, job_id):
+        return os.path.join(self.state_dir, f'{job_id}.json')
+
+    def _save(self, job):
+        """Write job's status where every worker can read it"""
+        os.makedirs(self.state_dir, exist_ok=True)
+        # Written to a temporary file and moved into place, so readers never see half of it
+        fd, tmp_path = tempfile.mkstemp(dir=self.state_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(job.to_dict(), f)
+            os.replace(tmp_path, self._state_path(job.id))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _load(self, job_id):
+        if not all(c.isalnum() or c in '-_' for c in job_id):
+            return None
+        try:
+            with open(self._state_path(job_id)) as f:
+                return Job.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def executor(self, name, kind='thread', max_workers=None):
+        """Shared executor by name, created on first use (after any gunicorn fork)"""
+        with self._lock:
+            executor = self._executors.get(name)
+            if executor is None:
+                cls = ProcessPoolExecutor if kind == 'process' else ThreadPoolExecutor
+                executor = self._executors[name] = cls(max_workers=max_workers)
+            return executor
+
+    def get(self, job_id):
+        """The job with this id: this worker's own, else as its worker last recorded it, or None"""
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(job_id)
+        return job if job is not None else self._load(job_id)
+
+    def update(self, job_id, **meta):
+        """Record progress (e.g. done=n) on one of this worker's jobs"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            job.meta.update(meta)
+            job.status = 'running'
+            self._save(job)
+
+    def submit(self, executor, kind, fn, *args, job_id=None, meta=None, on_done=None):
+        """Run fn(*args) on executor and track it as a job.
+
+        Submitting an id that is already queued or running returns that job.
+        on_done(job), if given, runs in the parent process once fn returns and
+        may post-process job.result.
+        """
+        job_id = job_id or uuid.uuid4().hex
+        with self._lock:
+            self._expire()
+            existing = self._jobs.get(job_id)
+            if existing is not None and existing.status != 'failed':
+                return existing
+            job = self._jobs[job_id] = Job(job_id, kind, meta)
+        self._save(job)
+
+        def finished(future):
+            try:
+                job.result = future.result()
+                if on_done is not None:
+                    on_done(job)
+                job.status = 'done'
+            except Exception as e:
+                job.error = str(e) or e.__class__.__name__
+                job.status = 'failed'
+            job.finished_at = time.time()
+            self._save(job)
+
+        self._sweep()
+        job.future = executor.submit(fn, *args)
+        job.future.add_done_callback(finished)
+        return job
+
+    def _sweep(self):
+        # Status files left by workers that exited before expiring their jobs
+        cutoff = time.time() - JOB_RETENTION
+        try:
+            names = os.listdir(self.state_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.state_dir, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _expire(self):
+        cutoff = time.time() - JOB_RETENTION
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+            try:
+                os.remove(self._state_path(job_id))
+            except OSError:
+                pass
+
+
+jobs = JobRegistry()
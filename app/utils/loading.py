@@ -0,0 +1,40 @@
+"""Relationship loading profiles for the list, detail and API routes.
+
+Relationships are declared lazy on the models; each route applies the
+profile matching what its template or serializer touches, so rendering a
+page never triggers one query per row.
+"""
+from sqlalchemy.orm import joinedload, selectinload
+
+
+def _profiles():
+    from app.models import Invoice, Quotation, Product, ProductOption
+
+    return {
+        # Totals are stored on the row, so lists only need the client
+        'invoice_list': [joinedload(Invoice.client)],
+        'invoice_detail': [
+            joinedload(Invoice.client),
+            selectinload(Invoice.items),
+            selectinload(Invoice.payments),
+        ],
+        'quotation_list': [joinedload(Quotation.client)],
+        'quotation_detail': [
+            joinedload(Quotation.client),
+            selectinload(Quotation.items),
+        ],
+        # The product list template only reads product columns
+        'product_list': [],
+        # Product.to_dict() reads the variants for the default price/SKU and count
+        'product_api': [selectinload(Product.variants)],
+        'product_detail': [
+            selectinload(Product.variants),
+            selectinload(Product.options).selectinload(ProductOption.values),
+        ],
+    }
+
+
+def load_profile(query, name):
+    """Apply the named loading profile to a query"""
+    options = _profiles()[name]
+    return query.options(*options) if options else query
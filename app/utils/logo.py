@@ -0,0 +1,83 @@
+"""Company logo prepared once for PDF rendering.
+
+The logo is decoded, scaled down to the size it is printed at (at
+LOGO_DPI) and re-encoded a single time per file version (path, mtime and
+size). Opaque logos are stored as JPEG, which ReportLab embeds as-is instead
+of re-compressing the pixels into every PDF; logos with transparency stay PNG.
+"""
+from reportlab.lib.units import inch
+from reportlab.platypus import Image
+from PIL import Image as PILImage
+import io
+import os
+import threading
+
+LOGO_MAX_WIDTH = 1.8 * inch
+LOGO_MAX_HEIGHT = 0.8 * inch
+LOGO_DPI = 300
+
+
+class LogoAsset:
+    """Encoded logo bytes and the size to draw them at, in points"""
+
+    def __init__(self, data, width, height):
+        self.data = data
+        self.width = width
+        self.height = height
+
+    def flowable(self):
+        return Image(io.BytesIO(self.data), width=self.width, height=self.height)
+
+
+_logos = {}  # path -> ((mtime_ns, size), LogoAsset or None)
+_lock = threading.Lock()
+
+
+def _prepare(path):
+    img = PILImage.open(path)
+    ratio = LOGO_MAX_HEIGHT / img.height
+    width = min(img.width * ratio, LOGO_MAX_WIDTH)
+    height = min(LOGO_MAX_HEIGHT, img.height * (width / img.width))
+
+    pixels = (max(1, round(width / inch * LOGO_DPI)), max(1, round(height / inch * LOGO_DPI)))
+    if img.width > pixels[0] or img.height > pixels[1]:
+        img = img.resize(pixels, PILImage.LANCZOS)
+
+    buffer = io.BytesIO()
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        img.save(buffer, format='PNG', optimize=True)
+    else:
+        img.convert('RGB').save(buffer, format='JPEG', quality=92)
+    return LogoAsset(buffer.getvalue(), width, height)
+
+
+def get_logo(path):
+    """LogoAsset for the logo file at path, or None if there is none or it can't be read"""
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _logos.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    try:
+        asset = _prepare(path)
+    except Exception:
+        asset = None  # e.g. an SVG upload; PDFs are rendered without a logo, as before
+    with _lock:
+        _logos[path] = (version, asset)
+    return asset
+
+
+def invalidate_logo(path=None):
+    """Forget the prepared logo for path (or all of them)"""
+    with _lock:
+        if path is None:
+            _logos.clear()
+        else:
+            _logos.pop(path, None)
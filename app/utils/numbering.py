@@ -0,0 +1,95 @@
+"""Invoice and quotation numbers from a counter table.
+
+Numbers used to be derived from the newest row's id, an extra query per
+create that hands the same number to concurrent requests. Now each kind has
+a row in number_sequences, advanced with an atomic UPDATE in its own short
+transaction (not the request's), so the row lock is held for one statement
+rather than the whole request and no two callers ever get the same number.
+
+With NUMBER_BLOCK_SIZE above 1 each worker process reserves that many
+numbers per UPDATE and hands them out from memory. That removes the write
+from most creates at the cost of gaps (a restart drops the rest of the
+block) and numbers that are no longer in creation order across workers;
+the default of 1 keeps numbering gapless except for failed creates.
+"""
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+import os
+import threading
+
+NUMBER_BLOCK_SIZE = max(1, int(os.environ.get('NUMBER_BLOCK_SIZE', 1)))
+
+# kind -> (prefix, model name, number column)
+SEQUENCES = {
+    'invoice': ('INV-', 'Invoice', 'invoice_number'),
+    'quotation': ('QT-', 'Quotation', 'quotation_number'),
+}
+
+_blocks = {}  # kind -> (pid, next, end) of the reserved block
+_lock = threading.Lock()
+
+
+def _highest_existing(kind):
+    """Highest number already used, from the numbers themselves and the ids they used to follow"""
+    from app import db
+    import app.models as models
+
+    prefix, model_name, column_name = SEQUENCES[kind]
+    model = getattr(models, model_name)
+    column = getattr(model, column_name)
+    # Same-length numbers sort numerically, so the longest, then greatest, is the highest
+    last = db.session.query(column).filter(column.like(f'{prefix}%')).order_by(
+        func.length(column).desc(), column.desc()).first()
+    highest = db.session.query(func.max(model.id)).scalar() or 0
+    if last is not None and last[0][len(prefix):].isdigit():
+        highest = max(highest, int(last[0][len(prefix):]))
+    return highest
+
+
+def _reserve(kind, count):
+    """Advance the counter by count in its own transaction. Returns the first reserved value."""
+    from app import db
+    from app.models import NumberSequence
+
+    table = NumberSequence.__table__
+    for _ in range(2):
+        with db.engine.begin() as conn:
+            advanced = conn.execute(
+                table.update().where(table.c.name == kind).values(next_value=table.c.next_value + count)
+            ).rowcount
+            if advanced:
+                # Our UPDATE still holds the row lock, so this reads our own increment
+                end = conn.execute(select(table.c.next_value).where(table.c.name == kind)).scalar()
+                return end - count
+        # First number of this kind: start after whatever is already in the table
+        start = _highest_existing(kind) + 1
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(table.insert().values(name=kind, next_value=start))
+        except IntegrityError:
+            pass  # another worker seeded it first
+    raise RuntimeError(f'Could not reserve a {kind} number')
+
+
+def allocate(kind):
+    """Next number value for kind ('invoice' or 'quotation'), never handed out before"""
+    with _lock:
+        pid, value, end = _blocks.get(kind, (None, 0, 0))
+        if pid != os.getpid() or value >= end:
+            # No block yet, used up, or inherited from a parent process that may hand it out too
+            value = _reserve(kind, NUMBER_BLOCK_SIZE)
+            end = value + NUMBER_BLOCK_SIZE
+        _blocks[kind] = (os.getpid(), value + 1, end)
+        return value
+
+
+def next_number(kind):
+    """Next formatted number, e.g. INV-00042"""
+    prefix = SEQUENCES[kind][0]
+    return f"{prefix}{allocate(kind):05d}"
+
+
+def reset_blocks():
+    """Forget reserved blocks (their unused numbers are skipped)"""
+    with _lock:
+        _blocks.clear()
@@ -0,0 +1,153 @@
+"""Keyset (cursor) pagination helpers.
+
+A cursor is an opaque, URL-safe token holding the sort-key values of the
+last row of a page. The next page is fetched with a WHERE clause on those
+values instead of an OFFSET, so every page costs the same to read.
+"""
+from app.utils.cache import Cache, invalidate_on_change
+from sqlalchemy import and_, or_
+from datetime import datetime
+import base64
+import json
+import os
+
+# Row counts for the list pages, cached so paging doesn't run COUNT(*) on every request.
+# LIST_COUNT_CACHE_TTL=0 counts exactly on every request instead.
+LIST_COUNT_CACHE_TTL = int(os.environ.get('LIST_COUNT_CACHE_TTL', 300))
+count_caches = {
+    name: Cache(f'{name}_counts', ttl=LIST_COUNT_CACHE_TTL)
+    for name in ('clients', 'invoices', 'quotations', 'products')
+}
+
+
+def encode_cursor(values):
+    """Encode a row's sort-key values as an opaque cursor string"""
+    payload = [{'dt': v.isoformat()} if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size=None):
+    """Decode a cursor back into sort-key values. Raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        values = [datetime.fromisoformat(v['dt']) if isinstance(v, dict) else v for v in payload]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(payload, list) or (size is not None and len(values) != size):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def keyset_filter(columns, values, descending=False):
+    """WHERE clause selecting rows strictly after values in (columns) order.
+
+    Expanded to (a > x) OR (a = x AND b > y) rather than a row-value
+    comparison so MySQL can use the index on the sort columns.
+    """
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        after = column < value if descending else column > value
+        equal_prefix = [c == v for c, v in zip(columns[:i], values[:i])]
+        clauses.append(and_(*equal_prefix, after))
+    return or_(*clauses)
+
+
+class KeysetPage:
+    """One page of a cursor-paginated list page"""
+
+    def __init__(self, items, per_page, has_prev, has_next, prev_cursor, next_cursor, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.has_prev = has_prev
+        self.has_next = has_next
+        self.prev_cursor = prev_cursor
+        self.next_cursor = next_cursor
+        self.total = total
+
+
+def keyset_paginate(query, sort_columns, per_page, after=None, before=None, descending=False, total=None):
+    """Fetch the page after (or before) a cursor position.
+
+    Walking backwards reverses the sort order, reads the page and flips it
+    back, so both directions use the same index range scan.
+    """
+    backwards = before is not None
+    if backwards:
+        query = query.filter(keyset_filter(sort_columns, before, descending=not descending))
+    elif after is not None:
+        query = query.filter(keyset_filter(sort_columns, after, descending=descending))
+
+    reverse = descending != backwards
+    rows = query.order_by(*[c.desc() if reverse else c.asc() for c in sort_columns]).limit(per_page + 1).all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = after is not None, more
+
+    def cursor_for(row):
+        return encode_cursor([getattr(row, c.key) for c in sort_columns])
+
+    return KeysetPage(
+        rows,
+        per_page,
+        has_prev=has_prev and bool(rows),
+        has_next=has_next and bool(rows),
+        prev_cursor=cursor_for(rows[0]) if rows else None,
+        next_cursor=cursor_for(rows[-1]) if rows else None,
+        total=total,
+    )
+
+
+def paginate_list(query, sort_columns, args, per_page, descending=False, keyset=False, total=None):
+    """Paginate a list page by page number (OFFSET) or, in keyset mode, by cursor.
+
+    args are the request args; keyset mode reads the 'after'/'before'
+    cursors from them. total, when given, replaces the COUNT(*) query.
+    """
+    if keyset:
+        after, before = args.get('after'), args.get('before')
+        try:
+            after = decode_cursor(after, size=len(sort_columns)) if after else None
+            before = decode_cursor(before, size=len(sort_columns)) if before else None
+        except ValueError:
+            after = before = None  # Stale or hand-edited cursor: start from the first page
+        return keyset_paginate(query, sort_columns, per_page, after=after, before=before,
+                               descending=descending, total=total)
+
+    order = [c.desc() if descending else c.asc() for c in sort_columns]
+    pagination = query.order_by(*order).paginate(
+        page=args.get('page', 1, type=int), per_page=per_page, error_out=False, count=total is None
+    )
+    if total is not None:
+        pagination.total = total
+    return pagination
+
+
+def cached_count(name, query, *key_parts):
+    """Row count of a filtered list query, cached per filter combination.
+
+    Returns None when count caching is disabled so the paginator counts exactly.
+    """
+    cache = count_caches[name]
+    if cache.ttl <= 0:
+        return None
+    return cache.get_or_set(
+        json.dumps(key_parts),
+        lambda: query.enable_eagerloads(False).order_by(None).count()
+    )
+
+
+def register_count_invalidation():
+    """Drop cached list counts when the rows they count change"""
+    from app.models import Client, Invoice, Quotation, Product
+
+    # Invoice and quotation lists can be filtered by client name
+    invalidate_on_change([Client], count_caches['clients'].invalidate)
+    invalidate_on_change([Invoice, Client], count_caches['invoices'].invalidate)
+    invalidate_on_change([Quotation, Client], count_caches['quotations'].invalidate)
+    invalidate_on_change([Product], count_caches['products'].invalidate)
@@ -3,9 +3,14 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image, HRFlowable
 from reportlab.lib import colors
+from reportlab.lib.utils import simpleSplit
 from datetime import datetime
+from collections import OrderedDict
+import copy
+import io
 import os
-from PIL import Image as PILImage
+import threading
+from app.utils.logo import get_logo
 
 # Define custom colors
 PRIMARY_COLOR = colors.HexColor('#3b82f6')
@@ -15,105 +20,323 @@ BORDER_COLOR = colors.HexColor('#e5e7eb')
 TEXT_COLOR = colors.HexColor('#374151')
 SUCCESS_COLOR = colors.HexColor('#10b981')
 
-def generate_invoice_pdf(invoice):
-    """Generate a professional industry-standard PDF for an invoice"""
-    from app.models import CompanySettings
-    
-    # Create data directory path relative to project root
-    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    pdf_dir = os.path.join(base_dir, 'data', 'invoices')
-    os.makedirs(pdf_dir, exist_ok=True)
-    
-    filename = os.path.join(pdf_dir, f"{invoice.invoice_number}.pdf")
-    doc = SimpleDocTemplate(filename, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch, leftMargin=0.5*inch, rightMargin=0.5*inch)
-    
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Define custom styles
-    label_style = ParagraphStyle(
-        'Label',
-        parent=styles['Normal'],
-        fontSize=9,
-        textColor=colors.HexColor('#9ca3af'),
-        fontName='Helvetica',
-        spaceAfter=2
-    )
-    
-    value_style = ParagraphStyle(
-        'Value',
-        parent=styles['Normal'],
-        fontSize=11,
-        textColor=DARK_COLOR,
-        fontName='Helvetica-Bold',
-        spaceAfter=6
-    )
-    
-    section_style = ParagraphStyle(
-        'SectionTitle',
-        parent=styles['Heading3'],
-        fontSize=11,
-        textColor=DARK_COLOR,
-        fontName='Helvetica-Bold',
-        spaceAfter=8,
-        spaceBefore=6
-    )
-    
-    # Get company settings
-    company = CompanySettings.get_settings()
-    
-    # HEADER: Company logo and INVOICE title
-    logo_image = None
-    if company.logo_path and os.path.exists(company.logo_path):
+# Paragraph and table styles are the same for every document; build them once
+STYLES = getSampleStyleSheet()
+
+LABEL_STYLE = ParagraphStyle(
+    'Label',
+    parent=STYLES['Normal'],
+    fontSize=9,
+    textColor=colors.HexColor('#9ca3af'),
+    fontName='Helvetica',
+    spaceAfter=2
+)
+
+VALUE_STYLE = ParagraphStyle(
+    'Value',
+    parent=STYLES['Normal'],
+    fontSize=11,
+    textColor=DARK_COLOR,
+    fontName='Helvetica-Bold',
+    spaceAfter=6
+)
+
+SECTION_STYLE = ParagraphStyle(
+    'SectionTitle',
+    parent=STYLES['Heading3'],
+    fontSize=11,
+    textColor=DARK_COLOR,
+    fontName='Helvetica-Bold',
+    spaceAfter=8,
+    spaceBefore=6
+)
+
+# Layout tables without padding (header, details columns, summary wrapper)
+FLUSH_TABLE_STYLE = TableStyle([
+    ('LEFTPADDING', (0, 0), (-1, -1), 0),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+    ('TOPPADDING', (0, 0), (-1, -1), 0),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
+])
+
+HEADER_TABLE_STYLE = TableStyle([
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+], parent=FLUSH_TABLE_STYLE)
+
+DETAILS_TABLE_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+], parent=FLUSH_TABLE_STYLE)
+
+SUMMARY_WRAPPER_STYLE = TableStyle([
+    ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+    ('VALIGN', (1, 0), (1, 0), 'TOP'),
+], parent=FLUSH_TABLE_STYLE)
+
+ITEMS_TABLE_STYLE = TableStyle([
+    # Header row - blue background
+    ('BACKGROUND', (0, 0), (-1, 0), PRIMARY_COLOR),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+    ('ALIGN', (1, 0), (-1, 0), 'CENTER'),
+    ('PADDING', (0, 0), (-1, 0), 10),
+    
+    # Data rows
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('ALIGN', (0, 1), (0, -1), 'LEFT'),
+    ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
+    ('PADDING', (0, 1), (-1, -1), 8),
+    ('TEXTCOLOR', (0, 1), (-1, -1), DARK_COLOR),
+    
+    ('GRID', (0, 0), (-1, -1), 1, BORDER_COLOR),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, LIGHT_BG]),
+])
+
+# Large documents: plain string cells with row heights worked out up front
+LARGE_ITEMS_TABLE_STYLE = TableStyle([
+    ('VALIGN', (0, 1), (-1, -1), 'TOP'),
+    ('LEADING', (0, 1), (-1, -1), 12),
+], parent=ITEMS_TABLE_STYLE)
+
+SUMMARY_TABLE_STYLE = TableStyle([
+    # Subtotal and Tax rows
+    ('FONTNAME', (0, 0), (-1, 1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, 1), 10),
+    ('ALIGN', (0, 0), (0, 1), 'RIGHT'),
+    ('ALIGN', (1, 0), (1, 1), 'RIGHT'),
+    ('TEXTCOLOR', (0, 0), (-1, 1), DARK_COLOR),
+    ('PADDING', (0, 0), (-1, 1), 8),
+    ('BACKGROUND', (0, 0), (-1, 1), LIGHT_BG),
+    
+    # TOTAL row
+    ('FONTNAME', (0, 2), (-1, 2), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 2), (-1, 2), 11),
+    ('ALIGN', (0, 2), (0, 2), 'RIGHT'),
+    ('ALIGN', (1, 2), (1, 2), 'RIGHT'),
+    ('TEXTCOLOR', (0, 2), (-1, 2), colors.white),
+    ('BACKGROUND', (0, 2), (-1, 2), PRIMARY_COLOR),
+    ('PADDING', (0, 2), (-1, 2), 10),
+    
+    ('GRID', (0, 0), (-1, -1), 1, BORDER_COLOR),
+])
+
+# Invoices add optional paid/balance rows under the total
+INVOICE_SUMMARY_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 3), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 3), (-1, -1), 9),
+    ('ALIGN', (0, 3), (0, -1), 'RIGHT'),
+    ('ALIGN', (1, 3), (1, -1), 'RIGHT'),
+    ('TEXTCOLOR', (0, 3), (-1, -1), DARK_COLOR),
+    ('PADDING', (0, 3), (-1, -1), 6),
+    ('BACKGROUND', (0, 3), (-1, -1), LIGHT_BG),
+], parent=SUMMARY_TABLE_STYLE)
+
+ITEM_COL_WIDTHS = [2.8*inch, 0.7*inch, 1.0*inch, 0.8*inch, 1.2*inch]
+
+# Documents with more lines than this get their items table in page-sized blocks
+LARGE_DOCUMENT_LINES = int(os.environ.get('PDF_LARGE_DOCUMENT_LINES', 100))
+
+# Text area of a letter page with half-inch margins (frames pad 6pt on every side)
+FRAME_WIDTH = letter[0] - 1*inch - 12
+FRAME_HEIGHT = letter[1] - 1*inch - 12
+
+# Row heights in LARGE_ITEMS_TABLE_STYLE: 12pt lines plus ReportLab's default cell padding
+# (3pt top and bottom, 6pt left and right; it has no 'PADDING' command, so those entries do nothing)
+ITEM_LINE_HEIGHT = 12
+ITEM_TOP_BOTTOM_PADDING = 3
+ITEM_SIDE_PADDING = 6
+HEADER_ROW_HEIGHT = ITEM_LINE_HEIGHT + 2*ITEM_TOP_BOTTOM_PADDING
+
+# Company settings the fixed blocks are built from
+COMPANY_FIELDS = (
+    'company_name', 'company_address', 'company_city', 'company_state', 'company_zip',
+    'company_phone', 'company_email', 'bank_name', 'bank_account_number', 'bank_routing_number',
+    'bank_swift_code', 'payment_methods', 'payment_instructions', 'logo_path',
+)
+
+
+class DocumentTemplate:
+    """The parts of a document that depend only on the title and company settings.
+
+    Built once per settings version and shared between renders; each render
+    gets copies of the flowables and a header Table of its own, since
+    ReportLab stores layout state on flowables.
+    """
+
+    def __init__(self, title, company):
+        # HEADER: Company logo (decoded and scaled once, see app/utils/logo.py) and document title
+        logo = get_logo(company.logo_path)
+        logo_image = logo.flowable() if logo else None
+        
+        title_paragraph = Paragraph(f"<font size='24' color='#111827'><b>{title}</b></font>", STYLES['Normal'])
+        self.header_cells = [logo_image or '', title_paragraph]
+        
+        # COMPANY INFO (Left side)
+        company_info = f"<b>{company.company_name or 'Your Company'}</b>"
+        if company.company_address:
+            company_info += f"<br/>{company.company_address}"
+        if company.company_city or company.company_state:
+            company_info += f"<br/>{company.company_city or ''} {company.company_state or ''} {company.company_zip or ''}"
+        if company.company_phone:
+            company_info += f"<br/>{company.company_phone}"
+        if company.company_email:
+            company_info += f"<br/>{company.company_email}"
+        self.company_block = Paragraph(company_info, LABEL_STYLE)
+        
+        # Payment Details - Always show if any bank info exists
+        payment_details = []
+        if company.bank_name:
+            payment_details.append(f"<b>Bank:</b> {company.bank_name}")
+        if company.bank_account_number:
+            payment_details.append(f"<b>Account Number:</b> {company.bank_account_number}")
+        if company.bank_routing_number:
+            payment_details.append(f"<b>Routing Number:</b> {company.bank_routing_number}")
+        if company.bank_swift_code:
+            payment_details.append(f"<b>SWIFT Code:</b> {company.bank_swift_code}")
+        if company.payment_methods:
+            payment_details.append(f"<b>Payment Methods:</b> {company.payment_methods}")
+        if company.payment_instructions:
+            payment_details.append(f"<br/>{company.payment_instructions}")
+        
+        self.payment_block = []
+        if payment_details:
+            self.payment_block = [
+                Paragraph('<b>Payment Instructions</b>', SECTION_STYLE),
+                Paragraph('<br/>'.join(payment_details), LABEL_STYLE),
+            ]
+
+    def build_header(self):
+        # A new Table each time: only its cells' flowables are worth sharing
+        cells = [copy.copy(cell) for cell in self.header_cells]
+        return Table([cells], colWidths=[1.8*inch, 4.7*inch], style=HEADER_TABLE_STYLE)
+
+    def copy_company_block(self):
+        return copy.copy(self.company_block)
+
+    def copy_payment_block(self):
+        return [copy.copy(flowable) for flowable in self.payment_block]
+
+
+_templates = OrderedDict()
+_templates_lock = threading.Lock()
+MAX_TEMPLATES = 8
+
+
+def settings_version(company):
+    """Fingerprint of the company settings the templates depend on, logo file included"""
+    values = tuple(getattr(company, field, None) for field in COMPANY_FIELDS)
+    logo = None
+    if company.logo_path:
         try:
-            img = PILImage.open(company.logo_path)
-            max_height = 0.8 * inch
-            ratio = max_height / img.height
-            new_width = min(img.width * ratio, 1.8 * inch)
-            logo_image = Image(company.logo_path, width=new_width, height=min(max_height, img.height * (new_width / img.width)))
-        except:
+            stat = os.stat(company.logo_path)
+            logo = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
             pass
-    
-    if logo_image:
-        header_data = [[logo_image, Paragraph("<font size='24' color='#111827'><b>INVOICE</b></font>", styles['Normal'])]]
-    else:
-        header_data = [['', Paragraph("<font size='24' color='#111827'><b>INVOICE</b></font>", styles['Normal'])]]
-    
-    header_table = Table(header_data, colWidths=[1.8*inch, 4.7*inch])
-    header_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-    ]))
-    elements.append(header_table)
-    elements.append(Spacer(1, 0.25*inch))
-    
-    # COMPANY INFO (Left side)
-    company_info = f"<b>{company.company_name or 'Your Company'}</b>"
-    if company.company_address:
-        company_info += f"<br/>{company.company_address}"
-    if company.company_city or company.company_state:
-        company_info += f"<br/>{company.company_city or ''} {company.company_state or ''} {company.company_zip or ''}"
-    if company.company_phone:
-        company_info += f"<br/>{company.company_phone}"
-    if company.company_email:
-        company_info += f"<br/>{company.company_email}"
-    
-    elements.append(Paragraph(company_info, label_style))
-    elements.append(Spacer(1, 0.2*inch))
-    
-    # THREE-COLUMN LAYOUT: Invoice Details | Bill To | (Empty)
-    invoice_details_text = f"""<b style="font-size: 11px">Invoice Details</b><br/><br/>
-    <b>Invoice #:</b> {invoice.invoice_number}<br/>
-    <b>Date:</b> {invoice.issue_date.strftime('%b %d, %Y')}<br/>
-    <b>Due Date:</b> {invoice.due_date.strftime('%b %d, %Y') if invoice.due_date else 'Not specified'}
+    return values + (logo,)
+
+
+def get_template(title, company):
+    """Shared DocumentTemplate for a document title and these company settings"""
+    key = (title, settings_version(company))
+    with _templates_lock:
+        template = _templates.get(key)
+        if template is not None:
+            _templates.move_to_end(key)
+            return template
+    template = DocumentTemplate(title, company)
+    with _templates_lock:
+        _templates[key] = template
+        while len(_templates) > MAX_TEMPLATES:
+            _templates.popitem(last=False)
+    return template
+
+
+def clear_templates():
+    with _templates_lock:
+        _templates.clear()
+
+class DocumentType:
+    """What sets an invoice apart from a quotation in print"""
+
+    def __init__(self, kind, title, number_field, date_field, date_label, party_label,
+                 summary_rows, payment_block, footer):
+        self.kind = kind
+        self.title = title
+        self.name = title.title()
+        self.number_field = number_field
+        # The second date printed under the number (due date, valid until)
+        self.date_field = date_field
+        self.date_label = date_label
+        self.party_label = party_label
+        # Names from SUMMARY_ROWS, in order
+        self.summary_rows = summary_rows
+        self.payment_block = payment_block
+        self.footer = footer
+
+    def number(self, document):
+        return getattr(document, self.number_field)
+
+
+def _subtotal_rows(document):
+    return [[Paragraph('<b>Subtotal</b>', VALUE_STYLE), Paragraph(f'${document.subtotal or 0:.2f}', VALUE_STYLE)]]
+
+
+def _tax_rows(document):
+    return [[Paragraph('<b>Tax</b>', VALUE_STYLE), Paragraph(f'${document.tax_total or 0:.2f}', VALUE_STYLE)]]
+
+
+def _total_rows(document):
+    return [[Paragraph('<b style="font-size: 12px">TOTAL</b>', VALUE_STYLE),
+             Paragraph(f'<b style="font-size: 12px">${document.get_total():.2f}</b>', VALUE_STYLE)]]
+
+
+def _balance_rows(document):
+    # Paid and balance only once something has been paid
+    if document.get_paid_amount() <= 0:
+        return []
+    return [
+        [Paragraph('<b>Paid</b>', LABEL_STYLE), Paragraph(f'${document.get_paid_amount():.2f}', LABEL_STYLE)],
+        [Paragraph('<b>Balance Due</b>', LABEL_STYLE),
+         Paragraph(f'<font color="#ef4444"><b>${document.get_balance():.2f}</b></font>', LABEL_STYLE)],
+    ]
+
+
+SUMMARY_ROWS = {
+    'subtotal': _subtotal_rows,
+    'tax': _tax_rows,
+    'total': _total_rows,
+    'balance': _balance_rows,
+}
+
+DOCUMENT_TYPES = {
+    'invoice': DocumentType(
+        'invoice', 'INVOICE', 'invoice_number', 'due_date', 'Due Date', 'Bill To',
+        summary_rows=('subtotal', 'tax', 'total', 'balance'), payment_block=True,
+        footer='Thank you for your business!',
+    ),
+    'quotation': DocumentType(
+        'quotation', 'QUOTATION', 'quotation_number', 'valid_until', 'Valid Until', 'Prepared For',
+        summary_rows=('subtotal', 'tax', 'total'), payment_block=False,
+        footer='Thank you for your interest!',
+    ),
+}
+
+
+def _details_block(doc_type, document):
+    # THREE-COLUMN LAYOUT: Document Details | Bill To / Prepared For | (Empty)
+    end_date = getattr(document, doc_type.date_field)
+    details_text = f"""<b style="font-size: 11px">{doc_type.name} Details</b><br/><br/>
+    <b>{doc_type.name} #:</b> {doc_type.number(document)}<br/>
+    <b>Date:</b> {document.issue_date.strftime('%b %d, %Y')}<br/>
+    <b>{doc_type.date_label}:</b> {end_date.strftime('%b %d, %Y') if end_date else 'Not specified'}
     """
     
-    client = invoice.client
-    bill_to_text = f"""<b style="font-size: 11px">Bill To</b><br/><br/>
+    client = document.client
+    party_text = f"""<b style="font-size: 11px">{doc_type.party_label}</b><br/><br/>
     <b>{client.name}</b><br/>
     {client.address or ''}<br/>
     {client.city or ''}{', ' + client.state if client.state else ''} {client.zip_code or ''}<br/>
@@ -123,382 +346,187 @@ def generate_invoice_pdf(invoice):
     """
     
     details_layout = Table(
-        [[Paragraph(invoice_details_text, label_style), Paragraph(bill_to_text, label_style), '']],
+        [[Paragraph(details_text, LABEL_STYLE), Paragraph(party_text, LABEL_STYLE), '']],
         colWidths=[2.2*inch, 2.2*inch, 1.6*inch]
     )
-    details_layout.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
-    ]))
-    elements.append(details_layout)
-    elements.append(Spacer(1, 0.2*inch))
-    
+    details_layout.setStyle(DETAILS_TABLE_STYLE)
+    return details_layout
+
+
+ITEMS_HEADER = ['Description', 'Qty', 'Unit Price', 'Tax %', 'Amount']
+
+
+def _items_table(document):
     # ITEMS TABLE - Clean design with proper alignment
-    items_data = [['Description', 'Qty', 'Unit Price', 'Tax %', 'Amount']]
+    items_data = [list(ITEMS_HEADER)]
     
-    for item in invoice.items:
+    for item in document.items:
         items_data.append([
-            Paragraph(item.description or '', value_style),
-            Paragraph(f"{item.quantity:g}", value_style),
-            Paragraph(f"${item.unit_price:.2f}", value_style),
-            Paragraph(f"{item.tax_rate:.1f}%", value_style),
-            Paragraph(f"${item.total:.2f}", value_style)
+            Paragraph(item.description or '', VALUE_STYLE),
+            Paragraph(f"{item.quantity:g}", VALUE_STYLE),
+            Paragraph(f"${item.unit_price:.2f}", VALUE_STYLE),
+            Paragraph(f"{item.tax_rate:.1f}%", VALUE_STYLE),
+            Paragraph(f"${item.total:.2f}", VALUE_STYLE)
         ])
     
-    items_table = Table(items_data, colWidths=[2.8*inch, 0.7*inch, 1.0*inch, 0.8*inch, 1.2*inch])
-    items_table.setStyle(TableStyle([
-        # Header row - blue background
-        ('BACKGROUND', (0, 0), (-1, 0), PRIMARY_COLOR),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-        ('ALIGN', (1, 0), (-1, 0), 'CENTER'),
-        ('PADDING', (0, 0), (-1, 0), 10),
-        
-        # Data rows
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('ALIGN', (0, 1), (0, -1), 'LEFT'),
-        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
-        ('PADDING', (0, 1), (-1, -1), 8),
-        ('TEXTCOLOR', (0, 1), (-1, -1), DARK_COLOR),
-        
-        ('GRID', (0, 0), (-1, -1), 1, BORDER_COLOR),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, LIGHT_BG]),
-    ]))
-    
-    elements.append(items_table)
-    elements.append(Spacer(1, 0.2*inch))
-    
+    items_table = Table(items_data, colWidths=ITEM_COL_WIDTHS)
+    items_table.setStyle(ITEMS_TABLE_STYLE)
+    return items_table
+
+
+def _large_items_tables(items, first_page_height):
+    """The items table as one Table per page, each with the header row.
+
+    A single Table of thousands of Paragraph rows is laid out again every time
+    ReportLab splits it at a page end. Here cells are plain strings (the
+    description wrapped up front), every row height is known, and rows are
+    grouped into blocks that fill a page, so nothing is ever split. Should a
+    block still not fit, repeatRows keeps the header on the next page.
+    """
+    description_width = ITEM_COL_WIDTHS[0] - 2*ITEM_SIDE_PADDING
+    tables = []
+    rows, heights = [ITEMS_HEADER], [HEADER_ROW_HEIGHT]
+    # Too little room left on the first page: the first block starts on the next one
+    available = first_page_height if first_page_height > HEADER_ROW_HEIGHT + 3*ITEM_LINE_HEIGHT else FRAME_HEIGHT
+    used = HEADER_ROW_HEIGHT
+
+    def flush():
+        table = Table(rows, colWidths=ITEM_COL_WIDTHS, rowHeights=heights, repeatRows=1)
+        table.setStyle(LARGE_ITEMS_TABLE_STYLE)
+        tables.append(table)
+
+    for item in items:
+        lines = simpleSplit(item.description or '', 'Helvetica', 10, description_width) or ['']
+        height = len(lines)*ITEM_LINE_HEIGHT + 2*ITEM_TOP_BOTTOM_PADDING
+        if used + height > available - 1 and len(rows) > 1:
+            flush()
+            rows, heights = [ITEMS_HEADER], [HEADER_ROW_HEIGHT]
+            available, used = FRAME_HEIGHT, HEADER_ROW_HEIGHT
+        rows.append([
+            '\n'.join(lines),
+            f"{item.quantity:g}",
+            f"${item.unit_price:.2f}",
+            f"{item.tax_rate:.1f}%",
+            f"${item.total:.2f}",
+        ])
+        heights.append(height)
+        used += height
+    flush()
+    return tables
+
+
+def _flowables_height(flowables):
+    height = 0
+    for flowable in flowables:
+        height += flowable.wrap(FRAME_WIDTH, FRAME_HEIGHT)[1] + flowable.getSpaceBefore() + flowable.getSpaceAfter()
+    return height
+
+
+def _summary_block(doc_type, document):
     # SUMMARY SECTION - Right-aligned, separated from items
-    subtotal = sum(item.subtotal for item in invoice.items)
-    tax_total = sum(item.tax for item in invoice.items)
-    total_amount = invoice.get_total()
-    
     summary_data = []
-    summary_data.append([Paragraph('<b>Subtotal</b>', value_style), Paragraph(f'${subtotal:.2f}', value_style)])
-    summary_data.append([Paragraph('<b>Tax</b>', value_style), Paragraph(f'${tax_total:.2f}', value_style)])
-    summary_data.append([Paragraph('<b style="font-size: 12px">TOTAL</b>', value_style), Paragraph(f'<b style="font-size: 12px">${total_amount:.2f}</b>', value_style)])
-    
-    if invoice.get_paid_amount() > 0:
-        summary_data.append([Paragraph('<b>Paid</b>', label_style), Paragraph(f'${invoice.get_paid_amount():.2f}', label_style)])
-        balance = invoice.get_balance()
-        summary_data.append([Paragraph('<b>Balance Due</b>', label_style), Paragraph(f'<font color="#ef4444"><b>${balance:.2f}</b></font>', label_style)])
+    for name in doc_type.summary_rows:
+        summary_data.extend(SUMMARY_ROWS[name](document))
     
     summary_table = Table(summary_data, colWidths=[1.3*inch, 1.3*inch])
-    summary_table.setStyle(TableStyle([
-        # Subtotal and Tax rows
-        ('FONTNAME', (0, 0), (-1, 1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, 1), 10),
-        ('ALIGN', (0, 0), (0, 1), 'RIGHT'),
-        ('ALIGN', (1, 0), (1, 1), 'RIGHT'),
-        ('TEXTCOLOR', (0, 0), (-1, 1), DARK_COLOR),
-        ('PADDING', (0, 0), (-1, 1), 8),
-        ('BACKGROUND', (0, 0), (-1, 1), LIGHT_BG),
-        
-        # TOTAL row
-        ('FONTNAME', (0, 2), (-1, 2), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 2), (-1, 2), 11),
-        ('ALIGN', (0, 2), (0, 2), 'RIGHT'),
-        ('ALIGN', (1, 2), (1, 2), 'RIGHT'),
-        ('TEXTCOLOR', (0, 2), (-1, 2), colors.white),
-        ('BACKGROUND', (0, 2), (-1, 2), PRIMARY_COLOR),
-        ('PADDING', (0, 2), (-1, 2), 10),
-        
-        # Optional paid/balance rows
-        ('FONTNAME', (0, 3), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 3), (-1, -1), 9),
-        ('ALIGN', (0, 3), (0, -1), 'RIGHT'),
-        ('ALIGN', (1, 3), (1, -1), 'RIGHT'),
-        ('TEXTCOLOR', (0, 3), (-1, -1), DARK_COLOR),
-        ('PADDING', (0, 3), (-1, -1), 6),
-        ('BACKGROUND', (0, 3), (-1, -1), LIGHT_BG),
-        
-        ('GRID', (0, 0), (-1, -1), 1, BORDER_COLOR),
-    ]))
+    summary_table.setStyle(INVOICE_SUMMARY_TABLE_STYLE if len(summary_data) > 3 else SUMMARY_TABLE_STYLE)
     
     # Right-align the summary table using a wrapper
     summary_wrapper = Table([['', summary_table]], colWidths=[4.5*inch, 2.6*inch])
-    summary_wrapper.setStyle(TableStyle([
-        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-        ('VALIGN', (1, 0), (1, 0), 'TOP'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
-    ]))
-    
-    elements.append(summary_wrapper)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # NOTES, TERMS, PAYMENT INFO
-    if invoice.notes:
-        elements.append(Paragraph('<b>Notes</b>', section_style))
-        elements.append(Paragraph(invoice.notes, label_style))
-        elements.append(Spacer(1, 0.1*inch))
-    
-    if invoice.terms:
-        elements.append(Paragraph('<b>Terms & Conditions</b>', section_style))
-        elements.append(Paragraph(invoice.terms, label_style))
-        elements.append(Spacer(1, 0.1*inch))
-    
-    # Payment Details - Always show if any bank info exists
-    payment_details = []
-    if company.bank_name:
-        payment_details.append(f"<b>Bank:</b> {company.bank_name}")
-    if company.bank_account_number:
-        payment_details.append(f"<b>Account Number:</b> {company.bank_account_number}")
-    if company.bank_routing_number:
-        payment_details.append(f"<b>Routing Number:</b> {company.bank_routing_number}")
-    if company.bank_swift_code:
-        payment_details.append(f"<b>SWIFT Code:</b> {company.bank_swift_code}")
-    if company.payment_methods:
-        payment_details.append(f"<b>Payment Methods:</b> {company.payment_methods}")
-    if company.payment_instructions:
-        payment_details.append(f"<br/>{company.payment_instructions}")
-    
-    if payment_details:
-        elements.append(Paragraph('<b>Payment Instructions</b>', section_style))
-        elements.append(Paragraph('<br/>'.join(payment_details), label_style))
-    
-    # FOOTER
-    elements.append(Spacer(1, 0.2*inch))
-    footer_text = f"Thank you for your business! | Invoice #: {invoice.invoice_number} | Generated: {datetime.now().strftime('%B %d, %Y')}"
-    elements.append(Paragraph(f"<i><font size='8' color='#9ca3af'>{footer_text}</font></i>", styles['Normal']))
-    
-    # Build PDF
-    doc.build(elements)
-    return filename
+    summary_wrapper.setStyle(SUMMARY_WRAPPER_STYLE)
+    return summary_wrapper
 
 
-def generate_quotation_pdf(quotation):
-    """Generate a professional industry-standard PDF for a quotation"""
-    from app.models import CompanySettings
-    
-    # Create data directory path relative to project root
-    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    pdf_dir = os.path.join(base_dir, 'data', 'quotations')
-    os.makedirs(pdf_dir, exist_ok=True)
-    
-    filename = os.path.join(pdf_dir, f"{quotation.quotation_number}.pdf")
-    doc = SimpleDocTemplate(filename, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch, leftMargin=0.5*inch, rightMargin=0.5*inch)
-    
+def build_elements(doc_type, document, company):
+    """The flowables of a document, top to bottom"""
+    template = get_template(doc_type.title, company)
     elements = []
-    styles = getSampleStyleSheet()
-    
-    # Define custom styles
-    label_style = ParagraphStyle(
-        'Label',
-        parent=styles['Normal'],
-        fontSize=9,
-        textColor=colors.HexColor('#9ca3af'),
-        fontName='Helvetica',
-        spaceAfter=2
-    )
-    
-    value_style = ParagraphStyle(
-        'Value',
-        parent=styles['Normal'],
-        fontSize=11,
-        textColor=DARK_COLOR,
-        fontName='Helvetica-Bold',
-        spaceAfter=6
-    )
-    
-    section_style = ParagraphStyle(
-        'SectionTitle',
-        parent=styles['Heading3'],
-        fontSize=11,
-        textColor=DARK_COLOR,
-        fontName='Helvetica-Bold',
-        spaceAfter=8,
-        spaceBefore=6
-    )
-    
-    # Get company settings
-    company = CompanySettings.get_settings()
-    
-    # HEADER: Company logo and QUOTATION title
-    logo_image = None
-    if company.logo_path and os.path.exists(company.logo_path):
-        try:
-            img = PILImage.open(company.logo_path)
-            max_height = 0.8 * inch
-            ratio = max_height / img.height
-            new_width = min(img.width * ratio, 1.8 * inch)
-            logo_image = Image(company.logo_path, width=new_width, height=min(max_height, img.height * (new_width / img.width)))
-        except:
-            pass
-    
-    if logo_image:
-        header_data = [[logo_image, Paragraph("<font size='24' color='#111827'><b>QUOTATION</b></font>", styles['Normal'])]]
-    else:
-        header_data = [['', Paragraph("<font size='24' color='#111827'><b>QUOTATION</b></font>", styles['Normal'])]]
     
-    header_table = Table(header_data, colWidths=[1.8*inch, 4.7*inch])
-    header_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-    ]))
-    elements.append(header_table)
+    # HEADER: Company logo and document title
+    elements.append(template.build_header())
     elements.append(Spacer(1, 0.25*inch))
     
     # COMPANY INFO (Left side)
-    company_info = f"<b>{company.company_name or 'Your Company'}</b>"
-    if company.company_address:
-        company_info += f"<br/>{company.company_address}"
-    if company.company_city or company.company_state:
-        company_info += f"<br/>{company.company_city or ''} {company.company_state or ''} {company.company_zip or ''}"
-    if company.company_phone:
-        company_info += f"<br/>{company.company_phone}"
-    if company.company_email:
-        company_info += f"<br/>{company.company_email}"
-    
-    elements.append(Paragraph(company_info, label_style))
+    elements.append(template.copy_company_block())
     elements.append(Spacer(1, 0.2*inch))
     
-    # THREE-COLUMN LAYOUT: Quotation Details | Prepared For | (Empty)
-    quotation_details_text = f"""<b style="font-size: 11px">Quotation Details</b><br/><br/>
-    <b>Quotation #:</b> {quotation.quotation_number}<br/>
-    <b>Date:</b> {quotation.issue_date.strftime('%b %d, %Y')}<br/>
-    <b>Valid Until:</b> {quotation.valid_until.strftime('%b %d, %Y') if quotation.valid_until else 'Not specified'}
-    """
-    
-    client = quotation.client
-    prepared_for_text = f"""<b style="font-size: 11px">Prepared For</b><br/><br/>
-    <b>{client.name}</b><br/>
-    {client.address or ''}<br/>
-    {client.city or ''}{', ' + client.state if client.state else ''} {client.zip_code or ''}<br/>
-    {client.country or ''}<br/>
-    {f'Email: {client.email}' if client.email else ''}<br/>
-    {f'Phone: {client.phone}' if client.phone else ''}
-    """
-    
-    details_layout = Table(
-        [[Paragraph(quotation_details_text, label_style), Paragraph(prepared_for_text, label_style), '']],
-        colWidths=[2.2*inch, 2.2*inch, 1.6*inch]
-    )
-    details_layout.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
-    ]))
-    elements.append(details_layout)
+    elements.append(_details_block(doc_type, document))
     elements.append(Spacer(1, 0.2*inch))
     
-    # ITEMS TABLE - Clean design with proper alignment
-    items_data = [['Description', 'Qty', 'Unit Price', 'Tax %', 'Amount']]
-    
-    for item in quotation.items:
-            items_data.append([
-                Paragraph(item.description or '', value_style),
-                Paragraph(f"{item.quantity:g}", value_style),
-                Paragraph(f"${item.unit_price:.2f}", value_style),
-                Paragraph(f"{item.tax_rate:.1f}%", value_style),
-                Paragraph(f"${item.total:.2f}", value_style)
-            ])
-    
-    items_table = Table(items_data, colWidths=[2.8*inch, 0.7*inch, 1.0*inch, 0.8*inch, 1.2*inch])
-    items_table.setStyle(TableStyle([
-        # Header row - blue background
-        ('BACKGROUND', (0, 0), (-1, 0), PRIMARY_COLOR),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-        ('ALIGN', (1, 0), (-1, 0), 'CENTER'),
-        ('PADDING', (0, 0), (-1, 0), 10),
-        
-        # Data rows
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('ALIGN', (0, 1), (0, -1), 'LEFT'),
-        ('ALIGN', (1, 1), (-1, -1), 'RIGHT'),
-        ('PADDING', (0, 1), (-1, -1), 8),
-        ('TEXTCOLOR', (0, 1), (-1, -1), DARK_COLOR),
-        
-        ('GRID', (0, 0), (-1, -1), 1, BORDER_COLOR),
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, LIGHT_BG]),
-    ]))
-    
-    elements.append(items_table)
+    items = document.items
+    if len(items) > LARGE_DOCUMENT_LINES:
+        elements.extend(_large_items_tables(items, FRAME_HEIGHT - _flowables_height(elements)))
+    else:
+        elements.append(_items_table(document))
     elements.append(Spacer(1, 0.2*inch))
     
-    # SUMMARY SECTION - Right-aligned, separated from items
-    subtotal = sum(item.subtotal for item in quotation.items)
-    tax_total = sum(item.tax for item in quotation.items)
-    total_amount = quotation.get_total()
-    
-    summary_data = []
-    summary_data.append([Paragraph('<b>Subtotal</b>', value_style), Paragraph(f'', value_style)])
-    summary_data.append([Paragraph('<b>Tax</b>', value_style), Paragraph(f'', value_style)])
-    summary_data.append([Paragraph('<b style="font-size: 12px">TOTAL</b>', value_style), Paragraph(f'<b style="font-size: 12px"></b>', value_style)])
-    
-    summary_table = Table(summary_data, colWidths=[1.3*inch, 1.3*inch])
-    summary_table.setStyle(TableStyle([
-        # Subtotal and Tax rows
-        ('FONTNAME', (0, 0), (-1, 1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, 1), 10),
-        ('ALIGN', (0, 0), (0, 1), 'RIGHT'),
-        ('ALIGN', (1, 0), (1, 1), 'RIGHT'),
-        ('TEXTCOLOR', (0, 0), (-1, 1), DARK_COLOR),
-        ('PADDING', (0, 0), (-1, 1), 8),
-        ('BACKGROUND', (0, 0), (-1, 1), LIGHT_BG),
-        
-        # TOTAL row
-        ('FONTNAME', (0, 2), (-1, 2), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 2), (-1, 2), 11),
-        ('ALIGN', (0, 2), (0, 2), 'RIGHT'),
-        ('ALIGN', (1, 2), (1, 2), 'RIGHT'),
-        ('TEXTCOLOR', (0, 2), (-1, 2), colors.white),
-        ('BACKGROUND', (0, 2), (-1, 2), PRIMARY_COLOR),
-        ('PADDING', (0, 2), (-1, 2), 10),
-        
-        ('GRID', (0, 0), (-1, -1), 1, BORDER_COLOR),
-    ]))
+    elements.append(_summary_block(doc_type, document))
+    elements.append(Spacer(1, 0.3*inch))
     
-    # Right-align the summary table using a wrapper
-    summary_wrapper = Table([['', summary_table]], colWidths=[4.5*inch, 2.6*inch])
-    summary_wrapper.setStyle(TableStyle([
-        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-        ('VALIGN', (1, 0), (1, 0), 'TOP'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 0),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
-    ]))
+    # NOTES, TERMS, PAYMENT INFO
+    if document.notes:
+        elements.append(Paragraph('<b>Notes</b>', SECTION_STYLE))
+        elements.append(Paragraph(document.notes, LABEL_STYLE))
+        elements.append(Spacer(1, 0.1*inch))
     
-    elements.append(summary_wrapper)
-    elements.append(Spacer(1, 0.3*inch))
+    if document.terms:
+        elements.append(Paragraph('<b>Terms & Conditions</b>', SECTION_STYLE))
+        elements.append(Paragraph(document.terms, LABEL_STYLE))
+        elements.append(Spacer(1, 0.1*inch))
     
-    # NOTES AND TERMS
-    if quotation.notes or quotation.terms:
-        if quotation.notes:
-            elements.append(Paragraph('<b>Notes</b>', section_style))
-            elements.append(Paragraph(quotation.notes, label_style))
-            elements.append(Spacer(1, 0.1*inch))
-        
-        if quotation.terms:
-            elements.append(Paragraph('<b>Terms & Conditions</b>', section_style))
-            elements.append(Paragraph(quotation.terms, label_style))
+    # Payment Details - Always show if any bank info exists
+    if doc_type.payment_block:
+        elements.extend(template.copy_payment_block())
     
     # FOOTER
     elements.append(Spacer(1, 0.2*inch))
-    footer_text = f"Thank you for your interest! | Quotation #: {quotation.quotation_number} | Generated: {datetime.now().strftime('%B %d, %Y')}"
-    elements.append(Paragraph(f"<i><font size='8' color='#9ca3af'>{footer_text}</font></i>", styles['Normal']))
-    
-    # Build PDF
-    doc.build(elements)
-    return filename
+    footer_text = (f"{doc_type.footer} | {doc_type.name} #: {doc_type.number(document)} | "
+                   f"Generated: {datetime.now().strftime('%B %d, %Y')}")
+    elements.append(Paragraph(f"<i><font size='8' color='#9ca3af'>{footer_text}</font></i>", STYLES['Normal']))
+    return elements
+
+
+def render_document(kind, document, output=None, company=None):
+    """Render an invoice or quotation ('invoice' / 'quotation') as a PDF.
+
+    output is where the PDF goes: a path, any binary file object (a
+    BytesIO, an open file, a response stream), or None to get the PDF bytes
+    back. The document and company may be model instances or plain
+    snapshots (see app/utils/pdf_cache.py); without company the cached
+    settings snapshot is used. Returns output, or the bytes when output is None.
+    """
+    doc_type = DOCUMENT_TYPES[kind]
+    if company is None:
+        from app.utils.company import get_company
+        company = get_company()
+    
+    target = io.BytesIO() if output is None else output
+    doc = SimpleDocTemplate(target, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch, leftMargin=0.5*inch, rightMargin=0.5*inch)
+    doc.build(build_elements(doc_type, document, company))
+    return target.getvalue() if output is None else output
+
+
+def _data_path(folder, number):
+    # Create data directory path relative to project root
+    base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    pdf_dir = os.path.join(base_dir, 'data', folder)
+    os.makedirs(pdf_dir, exist_ok=True)
+    return os.path.join(pdf_dir, f"{number}.pdf")
+
+
+def generate_invoice_pdf(invoice, output=None, company=None):
+    """Generate a professional industry-standard PDF for an invoice
+
+    Written to output (a path or file object) when given, else to
+    data/invoices/<number>.pdf. Returns where it was written.
+    """
+    return render_document('invoice', invoice, output or _data_path('invoices', invoice.invoice_number), company)
+
+
+def generate_quotation_pdf(quotation, output=None, company=None):
+    """Generate a professional industry-standard PDF for a quotation
+
+    Written to output (a path or file object) when given, else to
+    data/quotations/<number>.pdf. Returns where it was written.
+    """
+    return render_document('quotation', quotation, output or _data_path('quotations', quotation.quotation_number), company)
@@ -0,0 +1,373 @@
+"""Content-addressed cache for generated invoice and quotation PDFs.
+
+A PDF is stored under the SHA-256 of everything it is rendered from:
+document header and totals, client, line items, payments, company settings,
+the logo file's fingerprint and the generation date printed in the footer.
+PDFs are always rendered into memory and sent from there; any edit changes
+the key and the PDF is rendered again. Where rendered PDFs are kept is
+PDF_CACHE_BACKEND: 'memory' (default, per process), 'disk' (a directory,
+shared by the workers of a machine and kept across restarts) or 'none'.
+Both stores are bounded by PDF_CACHE_MAX_BYTES, evicting the least recently
+used PDFs first. A disk cache that can't be read or written (a read-only
+filesystem) is logged and skipped: the PDF is still rendered and sent.
+"""
+from datetime import date
+from collections import OrderedDict
+from types import SimpleNamespace
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+
+# Bump when the PDF layout changes so stale renders are not served
+RENDER_VERSION = 4
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CACHE_DIR = os.environ.get('PDF_CACHE_DIR', os.path.join(BASE_DIR, 'data', 'pdf_cache'))
+# 'memory', 'disk' or 'none'
+CACHE_BACKEND = os.environ.get('PDF_CACHE_BACKEND', 'memory')
+MAX_BYTES = int(os.environ.get('PDF_CACHE_MAX_BYTES',
+                               (200 if CACHE_BACKEND == 'disk' else 64) * 1024 * 1024))
+
+CLIENT_FIELDS = ('name', 'address', 'city', 'state', 'zip_code', 'country', 'email', 'phone')
+ITEM_FIELDS = ('description', 'quantity', 'unit_price', 'tax_rate', 'total')
+
+logger = logging.getLogger(__name__)
+
+
+def _columns(obj, exclude=()):
+    return {c.key: getattr(obj, c.key) for c in obj.__table__.columns if c.key not in exclude}
+
+
+def logo_fingerprint(path):
+    """(path, mtime, size) of the logo file, or None when there is none"""
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [path, stat.st_mtime_ns, stat.st_size]
+
+
+def document_inputs(kind, document, company):
+    """Plain data covering everything the PDF for document is rendered from"""
+    inputs = {
+        'render_version': RENDER_VERSION,
+        'kind': kind,
+        'generated_on': date.today(),
+        'document': _columns(document, exclude=('created_at', 'updated_at')),
+        'client': {field: getattr(document.client, field) for field in CLIENT_FIELDS},
+        'items': [{field: getattr(item, field) for field in ITEM_FIELDS} for item in document.items],
+        'company': (_columns(company, exclude=('created_at', 'updated_at')) if hasattr(company, '__table__')
+                    else company.columns(exclude=('created_at', 'updated_at'))),
+        'logo': logo_fingerprint(company.logo_path),
+    }
+    if kind == 'invoice':
+        inputs['payments'] = [
+            {'amount': p.amount, 'payment_date': p.payment_date, 'payment_method': p.payment_method}
+            for p in sorted(document.payments, key=lambda p: p.id)
+        ]
+    return inputs
+
+
+def document_key(inputs):
+    raw = json.dumps(inputs, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class PdfStore:
+    """Rendered PDF bytes by key, with hit and miss counts. Keeps nothing itself."""
+
+    backend = 'none'
+
+    def __init__(self, max_bytes=0):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def _read(self, key):
+        return None
+
+    def _write(self, key, data):
+        pass
+
+    def _usage(self):
+        """(entries, bytes) currently stored"""
+        return 0, 0
+
+    def contains(self, key):
+        """Whether key is stored, without counting a lookup"""
+        return False
+
+    def get(self, key):
+        """PDF bytes stored under key, or None. Counts a hit or a miss."""
+        data = self._read(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def put(self, key, data):
+        """Store rendered PDF bytes under key, evicting if over budget"""
+        self._write(key, data)
+        return data
+
+    def get_or_render(self, key, render):
+        """PDF bytes stored under key, calling render(output) into a buffer on a miss"""
+        data = self.get(key)
+        if data is None:
+            buffer = io.BytesIO()
+            render(buffer)
+            data = self.put(key, buffer.getvalue())
+        return data
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        entries, size = self._usage()
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': self.backend,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries': entries,
+                'bytes': size,
+                'max_bytes': self.max_bytes,
+            }
+
+
+class MemoryStore(PdfStore):
+    """PDF bytes held in this process, least recently used evicted first"""
+
+    backend = 'memory'
+
+    def __init__(self, max_bytes):
+        super().__init__(max_bytes)
+        self._entries = OrderedDict()  # key -> bytes, least recently used first
+        self._size = 0
+
+    def _read(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def _write(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            self._size += len(data) - (len(old) if old is not None else 0)
+            self._entries[key] = data
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def _usage(self):
+        with self._lock:
+            return len(self._entries), self._size
+
+    def contains(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class DiskStore(PdfStore):
+    """Directory of rendered PDFs named by content hash, with LRU eviction.
+
+    Survives restarts and is shared by the workers of one machine.
+    """
+
+    backend = 'disk'
+
+    def __init__(self, directory, max_bytes):
+        super().__init__(max_bytes)
+        self.directory = directory
+        self._entries = None  # key -> size, least recently used first
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def _load(self):
+        # Pick up files left by earlier runs (or other workers), oldest access first
+        if self._entries is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        found = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.pdf'):
+                stat = os.stat(os.path.join(self.directory, name))
+                found.append((stat.st_atime, name[:-4], stat.st_size))
+        self._entries = OrderedDict((key, size) for _, key, size in sorted(found))
+
+    def _read(self, key):
+        path = self._path(key)
+        try:
+            with self._lock:
+                self._load()
+        except OSError as e:
+            logger.warning('PDF cache directory %s is unreadable: %s', self.directory, e)
+            return None
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self._entries.pop(key, None)
+            return None
+        with self._lock:
+            # Also adopts files rendered by another worker since we scanned the directory
+            self._entries[key] = len(data)
+            self._entries.move_to_end(key)
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # evicted by another worker since it was read
+        return data
+
+    def _write(self, key, data):
+        try:
+            with self._lock:
+                self._load()
+            # Write to a temporary file and move it into place, so readers never see half a PDF
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, self._path(key))
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        except OSError as e:
+            logger.warning('PDF cache directory %s is not writable, PDF not cached: %s', self.directory, e)
+            return
+        with self._lock:
+            self._entries[key] = len(data)
+            self._entries.move_to_end(key)
+            self._evict(keep=key)
+
+    def _evict(self, keep):
+        total = sum(self._entries.values())
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self._entries.pop(key)
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _usage(self):
+        with self._lock:
+            entries = self._entries or {}
+            return len(entries), sum(entries.values())
+
+    def contains(self, key):
+        return os.path.exists(self._path(key))
+
+    def clear(self):
+        with self._lock:
+            self._load()
+            for key in list(self._entries):
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._entries.clear()
+
+
+def make_store(backend, max_bytes, directory=CACHE_DIR):
+    """PDF store for a PDF_CACHE_BACKEND value; a budget of 0 disables caching"""
+    if max_bytes <= 0 or backend == 'none':
+        return PdfStore()
+    if backend == 'disk':
+        return DiskStore(directory, max_bytes)
+    if backend == 'memory':
+        return MemoryStore(max_bytes)
+    raise ValueError(f'Unknown PDF_CACHE_BACKEND {backend!r}')
+
+
+pdf_cache = make_store(CACHE_BACKEND, MAX_BYTES)
+
+
+class DocumentSnapshot(SimpleNamespace):
+    """Picklable stand-in for an Invoice or Quotation, built from document_inputs()"""
+
+    def get_total(self):
+        return self.total or 0
+
+    def get_paid_amount(self):
+        return self.paid_amount or 0
+
+    def get_balance(self):
+        return self.balance or 0
+
+
+def snapshot(inputs):
+    """(document, company) plain objects the PDF generators can render from"""
+    document = DocumentSnapshot(**inputs['document'])
+    document.client = SimpleNamespace(**inputs['client'])
+    document.items = [SimpleNamespace(**item) for item in inputs['items']]
+    document.payments = [SimpleNamespace(**payment) for payment in inputs.get('payments', [])]
+    return document, SimpleNamespace(**inputs['company'])
+
+
+def render_snapshot(kind, inputs, output):
+    """Render a document snapshot to output. Runs in the render worker processes too."""
+    from app.utils.pdf import render_document
+
+    document, company = snapshot(inputs)
+    return render_document(kind, document, output=output, company=company)
+
+
+def render_bytes(kind, inputs):
+    """Render a document snapshot in memory. Runs in the render worker processes too."""
+    return render_snapshot(kind, inputs, None)
+
+
+def prepare(kind, document, company=None):
+    """(key, inputs) for a document: its cache key and the plain data it renders from"""
+    if company is None:
+        from app.utils.company import get_company
+        company = get_company()
+    inputs = document_inputs(kind, document, company)
+    return document_key(inputs), inputs
+
+
+def cached_pdf(kind, document):
+    """(key, pdf bytes) for the document, rendered only if its inputs changed.
+
+    The key doubles as the response ETag.
+    """
+    key, inputs = prepare(kind, document)
+    return key, pdf_cache.get_or_render(key, lambda output: render_snapshot(kind, inputs, output))
+
+
+def cached_invoice_pdf(invoice):
+    return cached_pdf('invoice', invoice)
+
+
+def cached_quotation_pdf(quotation):
+    return cached_pdf('quotation', quotation)
@@ -0,0 +1,110 @@
+"""Background PDF rendering.
+
+Rendering is CPU-bound in ReportLab, so large documents are rendered in a
+process pool instead of the request thread. The job takes a plain-data
+snapshot of the document (no database access in the worker) and returns the
+PDF bytes, which are kept on the job and put into the PDF cache. The job id
+is the document's cache key, and the job's status is recorded in
+JOB_STATE_DIR, so any gunicorn worker on the machine can report the job. A
+worker that doesn't have the finished PDF (the memory cache is per process)
+renders it again from the database. Documents with at most
+PDF_SYNC_MAX_ITEMS lines are rendered inline when the disk cache can keep
+the result until it is fetched from any worker. job_response() and
+pdf_response() answer for the invoice, quotation and job routes alike.
+"""
+from app.utils.jobs import jobs
+from app.utils.pdf_cache import pdf_cache, prepare, render_bytes
+from flask import Response, jsonify, request, url_for
+import os
+import re
+
+PDF_SYNC_MAX_ITEMS = int(os.environ.get('PDF_SYNC_MAX_ITEMS', 50))
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', 2))
+# 'process' (default) or 'thread'
+PDF_POOL = os.environ.get('PDF_POOL', 'process')
+
+_KEY_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+
+def enqueue_pdf(kind, document):
+    """Start rendering a document's PDF unless it is cached or small. Returns the job id.
+
+    Only the disk cache is seen by every worker, so with any other store the
+    render always goes through a job, whose record any worker can find.
+    """
+    key, inputs = prepare(kind, document)
+    if pdf_cache.backend == 'disk':
+        if pdf_cache.contains(key):
+            return key
+        if len(inputs['items']) <= PDF_SYNC_MAX_ITEMS:
+            pdf_cache.put(key, render_bytes(kind, inputs))
+            return key
+
+    executor = jobs.executor('pdf', kind=PDF_POOL, max_workers=PDF_WORKERS)
+    jobs.submit(executor, 'pdf', render_bytes, kind, inputs, job_id=key,
+                meta={'document': kind, 'document_id': document.id},
+                on_done=lambda job: pdf_cache.put(key, job.result))
+    return key
+
+
+def _render_again(job):
+    """PDF bytes for a job another worker finished, rendered here from the database,
+    or None if the document changed (or was deleted) since"""
+    from app.models import Invoice, Quotation
+    from app.utils.loading import load_profile
+
+    kind = job.meta.get('document')
+    model = {'invoice': Invoice, 'quotation': Quotation}.get(kind)
+    if model is None:
+        return None
+    document = load_profile(model.query, f'{kind}_detail').filter(model.id == job.meta.get('document_id')).first()
+    if document is None:
+        return None
+    key, inputs = prepare(kind, document)
+    if key != job.id:
+        return None
+    return pdf_cache.put(key, render_bytes(kind, inputs))
+
+
+def pdf_result(job_id):
+    """PDF bytes of a finished PDF job, or None"""
+    if not _KEY_PATTERN.fullmatch(job_id):
+        return None
+    job = jobs.get(job_id)
+    if job is not None and job.status == 'done' and job.result is not None:
+        return job.result  # rendered by this worker
+    data = pdf_cache.get(job_id)
+    if data is None and job is not None and job.status == 'done':
+        data = _render_again(job)
+    return data
+
+
+def pdf_job_status(job_id):
+    """Status dict for a PDF job, or None if this id is unknown"""
+    job = jobs.get(job_id)
+    if job is not None:
+        return job.to_dict()
+    if _KEY_PATTERN.fullmatch(job_id) and pdf_cache.contains(job_id):
+        # Rendered inline, by another worker, or before a restart
+        return {'id': job_id, 'kind': 'pdf', 'status': 'done', 'error': None}
+    return None
+
+
+def job_response(status, name=None):
+    """Status JSON for a job with links to poll it and, for PDFs, to fetch the result"""
+    status = dict(status)
+    status['status_url'] = url_for('jobs.job_status', job_id=status['id'], name=name)
+    if status['kind'] == 'pdf':
+        status['result_url'] = url_for('jobs.job_pdf', job_id=status['id'], name=name)
+    return jsonify(status), 200 if status['status'] in ('done', 'failed') else 202
+
+
+def pdf_response(data, filename, etag=None):
+    """Send PDF bytes as a download; with an ETag, unchanged PDFs get a 304"""
+    response = Response(data, mimetype='application/pdf')
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'private, no-cache'
+    if etag is None:
+        return response
+    response.set_etag(etag)
+    return response.make_conditional(request)
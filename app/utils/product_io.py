@@ -0,0 +1,508 @@
+"""Bulk product import and export: products, options and variants as CSV or JSON.
+
+An import is parsed and validated entirely in memory before anything is
+written, and nothing is written unless the whole file is valid. SKUs are
+checked against the product and variant SKUs already in the database,
+fetched once up front, instead of a query per product and variant as the
+product form does. Rows are then written with multi-row INSERTs, up to
+IMPORT_BATCH_SIZE per statement, in a single transaction.
+
+Exports are streamed a batch of products at a time (one query each for the
+batch's products, options, option values and variants), so the whole
+catalogue is never held in memory.
+
+CSV has one row per variant, or a single row for a product without
+variants, with the option values in optionN_name/optionN_value column pairs.
+A product's rows are consecutive; after its first row the product columns
+may be left blank. JSON is a list of products (NDJSON: one per line):
+
+    {"name": "T-shirt", "sku": "TSHIRT", "price": 20, "tax_rate": 9, "category": "Apparel",
+     "options": [{"name": "Size", "values": ["S", "M"]}],
+     "variants": [{"sku": "TSHIRT-S", "price": 20, "options": {"Size": "S"}}, ...]}
+
+Products with options but no variants get one variant per combination at
+the product price, as in the product form, up to MAX_VARIANTS per product. Blank SKUs are generated the way
+the form generates them.
+"""
+from datetime import datetime
+from app.utils.sku import SkuAllocator, sku_base, variant_candidate
+from app.utils.variants import MAX_VARIANTS, variant_count
+from itertools import product as itertools_product
+import codecs
+import csv
+import io
+import json
+import os
+
+IMPORT_BATCH_SIZE = int(os.environ.get('PRODUCT_IMPORT_BATCH_SIZE', 1000))
+EXPORT_BATCH_SIZE = 500
+MAX_ERRORS = 100
+
+FORMATS = ('csv', 'json', 'ndjson')
+PRODUCT_COLUMNS = ['name', 'sku', 'description', 'price', 'tax_rate', 'category', 'is_active']
+VARIANT_COLUMNS = ['variant_sku', 'variant_price', 'variant_tax_rate', 'variant_is_active']
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'off'}
+
+
+def format_for(filename, default='csv'):
+    """Import format from a file name's extension"""
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if extension == 'jsonl':
+        return 'ndjson'
+    return extension if extension in FORMATS else default
+
+
+def _text(stream):
+    # Uploads are binary; a BOM (as Excel writes it) is dropped
+    return io.StringIO(stream.read().decode('utf-8-sig'))
+
+
+def parse_csv(stream):
+    """Products in the JSON shape from a CSV file, each with the line it starts on"""
+    reader = csv.reader(_text(stream))
+    header = {name.strip().lower(): index for index, name in enumerate(next(reader, []))}
+    option_columns = []
+    while f'option{len(option_columns) + 1}_name' in header:
+        n = len(option_columns) + 1
+        option_columns.append((header[f'option{n}_name'], header.get(f'option{n}_value')))
+    product_columns = [(column, header.get(column)) for column in PRODUCT_COLUMNS]
+    variant_columns = [(column, header.get(column)) for column in VARIANT_COLUMNS]
+
+    products = []
+    current = key = None
+    for row in reader:
+        if not any(row):
+            continue
+        row += [''] * (len(header) - len(row))
+        values = {column: row[index].strip() if index is not None else '' for column, index in product_columns}
+        row_key = values['sku'] or values['name']
+        if current is None or (row_key and row_key != key):
+            current = dict(values, where=f'line {reader.line_num}', variants=[])
+            products.append(current)
+            key = row_key
+        options = {row[name].strip(): row[value].strip() if value is not None else ''
+                   for name, value in option_columns if row[name].strip()}
+        variant = {column[len('variant_'):]: row[index].strip() if index is not None else ''
+                   for column, index in variant_columns}
+        if options or any(variant.values()):
+            variant.update(options=options, where=f'line {reader.line_num}')
+            current['variants'].append(variant)
+    return products
+
+
+def parse_json(stream, ndjson=False):
+    """Products from a JSON list (or {"products": [...]}) or from NDJSON"""
+    text = _text(stream).read()
+    if ndjson:
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        items = json.loads(text)
+        if isinstance(items, dict):
+            items = items.get('products')
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ValueError('Expected a list of product objects')
+    for number, item in enumerate(items, 1):
+        item['where'] = f'product {number}'
+        for variant_number, variant in enumerate(item.get('variants') or [], 1):
+            if isinstance(variant, dict):
+                variant['where'] = f'product {number}, variant {variant_number}'
+    return items
+
+
+class _Plan:
+    """Validated rows ready to insert, and what was wrong with the rest"""
+
+    def __init__(self):
+        self.products = []  # (product row, [(option name, [values])], [variant rows])
+        self.errors = []
+        self.skipped = 0
+
+    def error(self, where, message):
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(f'{where}: {message}')
+        return None
+
+
+def _string(plan, where, value, field, limit=None, required=False):
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        return plan.error(where, f'{field} is required')
+    if limit and len(value) > limit:
+        return plan.error(where, f'{field} is longer than {limit} characters')
+    return value or None
+
+
+def _number(plan, where, value, field, default=None):
+    if value is None or value == '':
+        return default
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return plan.error(where, f'{field} {value!r} is not a number')
+    if number < 0 or number != number or number in (float('inf'), float('-inf')):
+        return plan.error(where, f'{field} {value!r} is out of range')
+    return number
+
+
+def _flag(plan, where, value, field, default=True):
+    if isinstance(value, bool):
+        return value
+    text = '' if value is None else str(value).strip().lower()
+    if not text:
+        return default
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    return plan.error(where, f'{field} {value!r} is not yes/no')
+
+
+def _options(plan, item, where):
+    """[(name, [values])] from the product's options and its variants' option values"""
+    options = {}  # name -> {value: None}, an ordered set
+    declared = item.get('options') or []
+    if not isinstance(declared, list):
+        return plan.error(where, 'options must be a list')
+    for option in declared:
+        if not isinstance(option, dict):
+            return plan.error(where, 'each option must have a name and values')
+        name = _string(plan, where, option.get('name'), 'option name', 100, required=True)
+        values = option.get('values') or []
+        if isinstance(values, str):
+            values = values.split(',')  # as typed into the product form
+        if name:
+            known = options.setdefault(name, {})
+            for value in values:
+                value = _string(plan, where, value, f'{name} value', 100)
+                if value:
+                    known[value] = None
+    for variant in item.get('variants') or []:
+        if isinstance(variant, dict) and isinstance(variant.get('options'), dict):
+            for name, value in variant['options'].items():
+                if value in options.get(name, ()):
+                    continue
+                name = _string(plan, variant.get('where', where), name, 'option name', 100, required=True)
+                value = _string(plan, variant.get('where', where), value, f'{name} value', 100, required=True)
+                if name and value:
+                    options.setdefault(name, {})[value] = None
+    return [(name, list(values)) for name, values in options.items()]
+
+
+def _plan_product(plan, item, skus, now, on_existing):
+    where = item.get('where', 'product')
+    errors = len(plan.errors)
+    name = _string(plan, where, item.get('name'), 'name', 200, required=True)
+    sku = _string(plan, where, item.get('sku'), 'sku', 100)
+    if sku and skus['products'].exists(sku):
+        if on_existing == 'skip':
+            plan.skipped += 1
+            return
+        plan.error(where, f'SKU {sku} already exists')
+    elif sku and sku in skus['products'].assigned:
+        plan.error(where, f'SKU {sku} appears more than once')
+
+    variants = item.get('variants') or []
+    if not isinstance(variants, list) or not all(isinstance(v, dict) for v in variants):
+        plan.error(where, 'variants must be a list of objects')
+        return
+    price = _number(plan, where, item.get('price'), 'price')
+    if price is None and variants:
+        price = _number(plan, where, variants[0].get('price'), 'price')
+    if price is None and len(plan.errors) == errors:
+        plan.error(where, 'price is required')
+    tax_rate = _number(plan, where, item.get('tax_rate'), 'tax_rate', default=0)
+    options = _options(plan, item, where) or []
+    count = len(variants) if variants else variant_count(options)
+    if count > MAX_VARIANTS:
+        plan.error(where, f'{count} variants is more than the limit of {MAX_VARIANTS}')
+    if len(plan.errors) > errors:
+        return
+
+    if sku:
+        skus['products'].reserve(sku)
+    else:
+        sku = skus['products'].numbered(sku_base(name))
+
+    names = [option_name for option_name, _ in options]
+    if options and not variants:
+        variants = [{'options': dict(zip(names, combo))}
+                    for combo in itertools_product(*(values for _, values in options))]
+    variant_rows = []
+    combinations = set()
+    for variant in variants:
+        variant_where = variant.get('where', where)
+        chosen = variant.get('options') if isinstance(variant.get('options'), dict) else {}
+        chosen = {str(k).strip(): str(v).strip() for k, v in chosen.items()}
+        combo = tuple(chosen.get(option_name) for option_name in names)
+        missing = [option_name for option_name, value in zip(names, combo) if not value]
+        if missing:
+            plan.error(variant_where, f"no value for option {', '.join(missing)}")
+            continue
+        if combo in combinations:
+            plan.error(variant_where, 'the same option values appear more than once')
+            continue
+        combinations.add(combo)
+        variant_sku = _string(plan, variant_where, variant.get('sku'), 'variant sku', 100)
+        if variant_sku and skus['variants'].exists(variant_sku):
+            plan.error(variant_where, f'variant SKU {variant_sku} already exists')
+        elif variant_sku and variant_sku in skus['variants'].assigned:
+            plan.error(variant_where, f'variant SKU {variant_sku} appears more than once')
+        variant_price = _number(plan, variant_where, variant.get('price'), 'price', default=price)
+        variant_tax = _number(plan, variant_where, variant.get('tax_rate'), 'tax_rate', default=tax_rate)
+        is_active = _flag(plan, variant_where, variant.get('is_active'), 'is_active')
+        if len(plan.errors) > errors:
+            continue
+        if variant_sku:
+            skus['variants'].reserve(variant_sku)
+        else:
+            variant_sku = skus['variants'].suffixed(variant_candidate(sku, combo))
+        variant_rows.append({
+            'sku': variant_sku, 'price': variant_price, 'tax_rate': variant_tax, 'is_active': is_active,
+            'variant_data': json.dumps(dict(zip(names, combo))), 'created_at': now, 'updated_at': now,
+        })
+
+    product_row = {
+        'name': name, 'sku': sku, 'price': price, 'tax_rate': tax_rate,
+        'description': _string(plan, where, item.get('description'), 'description'),
+        'category': _string(plan, where, item.get('category'), 'category', 100),
+        'is_active': _flag(plan, where, item.get('is_active'), 'is_active'),
+        'has_variants': bool(variant_rows), 'created_at': now, 'updated_at': now,
+    }
+    if len(plan.errors) == errors:
+        plan.products.append((product_row, options, variant_rows))
+
+
+def plan_import(items, on_existing='error'):
+    """Validate parsed products against each other and the database, without writing.
+
+    on_existing: 'error' reports products whose SKU is already taken, 'skip' leaves them out.
+    """
+    from app import db
+    from app.models import Product, ProductVariant
+
+    skus = {'products': SkuAllocator(Product), 'variants': SkuAllocator(ProductVariant)}
+    for allocator in skus.values():
+        allocator.load()  # every SKU, one query per table
+    now = datetime.utcnow()
+    plan = _Plan()
+    for item in items:
+        _plan_product(plan, item, skus, now, on_existing)
+    return plan
+
+
+def _chunks(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _insert(model, rows):
+    from sqlalchemy import insert
+    from app import db
+
+    for chunk in _chunks(rows, IMPORT_BATCH_SIZE):
+        db.session.execute(insert(model), chunk)
+
+
+def _write(plan):
+    """Insert a plan's rows, a batch of products at a time. Returns the row counts."""
+    from sqlalchemy import select
+    from app import db
+    from app.models import Product, ProductOption, ProductOptionValue, ProductVariant
+
+    counts = {'products': 0, 'options': 0, 'values': 0, 'variants': 0}
+    for batch in _chunks(plan.products, IMPORT_BATCH_SIZE):
+        _insert(Product, [product for product, _, _ in batch])
+        # Portable across SQLite, MySQL and PostgreSQL, unlike INSERT ... RETURNING
+        product_ids = dict(db.session.execute(select(Product.sku, Product.id).where(
+            Product.sku.in_([product['sku'] for product, _, _ in batch]))).all())
+
+        option_rows, variant_rows = [], []
+        for product, options, variants in batch:
+            product_id = product_ids[product['sku']]
+            option_rows.extend({'product_id': product_id, 'name': name, 'display_order': order,
+                                'created_at': product['created_at']}
+                               for order, (name, _) in enumerate(options))
+            for variant in variants:
+                variant['product_id'] = product_id
+            variant_rows.extend(variants)
+        if option_rows:
+            _insert(ProductOption, option_rows)
+            option_ids = {(product_id, name): option_id for option_id, product_id, name in db.session.execute(
+                select(ProductOption.id, ProductOption.product_id, ProductOption.name).where(
+                    ProductOption.product_id.in_(list(product_ids.values()))))}
+            value_rows = [{'option_id': option_ids[(product_ids[product['sku']], name)], 'value': value,
+                           'display_order': order, 'created_at': product['created_at']}
+                          for product, options, _ in batch
+                          for name, values in options
+                          for order, value in enumerate(values)]
+            _insert(ProductOptionValue, value_rows)
+            counts['values'] += len(value_rows)
+        _insert(ProductVariant, variant_rows)
+        counts['products'] += len(batch)
+        counts['options'] += len(option_rows)
+        counts['variants'] += len(variant_rows)
+    return counts
+
+
+def import_products(stream, fmt='csv', on_existing='error'):
+    """Import a CSV, JSON or NDJSON file of products in one transaction.
+
+    Returns a summary: counts of rows written, products skipped and errors.
+    If there are any errors nothing is written.
+    """
+    from app import db
+
+    result = {'products': 0, 'options': 0, 'values': 0, 'variants': 0, 'skipped': 0, 'errors': []}
+    try:
+        items = parse_csv(stream) if fmt == 'csv' else parse_json(stream, ndjson=fmt == 'ndjson')
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        result['errors'].append(f'Could not read the file: {e}')
+        return result
+
+    plan = plan_import(items, on_existing)
+    result['skipped'] = plan.skipped
+    if plan.errors:
+        result['errors'] = plan.errors
+        return result
+    try:
+        result.update(_write(plan))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result
+
+
+def import_template():
+    """A CSV to fill in: one product without variants and one with two"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(PRODUCT_COLUMNS + VARIANT_COLUMNS + ['option1_name', 'option1_value', 'option2_name', 'option2_value'])
+    writer.writerow(['Mounting bracket', 'BRACKET', 'Stainless steel', '25.00', '9', 'Accessories', 'yes',
+                     '', '', '', '', '', '', '', ''])
+    writer.writerow(['Battery pack', 'BATT', '', '120.00', '9', 'Spare Parts', 'yes',
+                     'BATT-STD', '120.00', '', 'yes', 'Capacity', 'Standard', 'Colour', 'Black'])
+    writer.writerow(['', '', '', '', '', '', '',
+                     'BATT-EXT', '160.00', '', 'yes', 'Capacity', 'Extended', 'Colour', 'Black'])
+    return buffer.getvalue()
+
+
+def _export_batches(batch_size=EXPORT_BATCH_SIZE):
+    """Yield lists of (product, [(option name, [values])], [variants]) rows in id order"""
+    from sqlalchemy import select
+    from app import db
+    from app.models import Product, ProductOption, ProductOptionValue, ProductVariant
+
+    last_id = 0
+    while True:
+        products = db.session.execute(
+            select(Product.id, Product.name, Product.sku, Product.description, Product.price,
+                   Product.tax_rate, Product.category, Product.is_active)
+            .where(Product.id > last_id).order_by(Product.id).limit(batch_size)
+        ).all()
+        if not products:
+            return
+        ids = [product.id for product in products]
+        last_id = ids[-1]
+
+        options = {product_id: [] for product_id in ids}
+        option_values = {}
+        for option_id, product_id, name in db.session.execute(
+                select(ProductOption.id, ProductOption.product_id, ProductOption.name)
+                .where(ProductOption.product_id.in_(ids))
+                .order_by(ProductOption.product_id, ProductOption.display_order, ProductOption.id)):
+            option_values[option_id] = []
+            options[product_id].append((name, option_values[option_id]))
+        if option_values:
+            for option_id, value in db.session.execute(
+                    select(ProductOptionValue.option_id, ProductOptionValue.value)
+                    .where(ProductOptionValue.option_id.in_(list(option_values)))
+                    .order_by(ProductOptionValue.display_order, ProductOptionValue.id)):
+                option_values[option_id].append(value)
+
+        variants = {product_id: [] for product_id in ids}
+        for variant in db.session.execute(
+                select(ProductVariant.product_id, ProductVariant.sku, ProductVariant.price,
+                       ProductVariant.tax_rate, ProductVariant.is_active, ProductVariant.variant_data)
+                .where(ProductVariant.product_id.in_(ids))
+                .order_by(ProductVariant.product_id, ProductVariant.id)):
+            variants[variant.product_id].append(variant)
+
+        yield [(product, options[product.id], variants[product.id]) for product in products]
+
+
+def _variant_options(variant):
+    try:
+        data = json.loads(variant.variant_data) if variant.variant_data else {}
+    except ValueError:
+        data = {}
+    return data if isinstance(data, dict) else {}
+
+
+def _export_json(product, options, variants):
+    return {
+        'name': product.name, 'sku': product.sku, 'description': product.description,
+        'price': product.price, 'tax_rate': product.tax_rate, 'category': product.category,
+        'is_active': product.is_active,
+        'options': [{'name': name, 'values': values} for name, values in options],
+        'variants': [{'sku': v.sku, 'price': v.price, 'tax_rate': v.tax_rate, 'is_active': v.is_active,
+                      'options': _variant_options(v)} for v in variants],
+    }
+
+
+def _csv_rows(product, options, variants, width):
+    def flag(value):
+        return 'no' if value is False else 'yes'
+
+    columns = [product.name, product.sku or '', product.description or '', product.price,
+               product.tax_rate if product.tax_rate is not None else '', product.category or '',
+               flag(product.is_active)]
+    if not variants:
+        yield columns + [''] * (len(VARIANT_COLUMNS) + 2 * width)
+        return
+    for variant in variants:
+        pairs = []
+        for name, value in list(_variant_options(variant).items())[:width]:
+            pairs += [name, value]
+        yield columns + [variant.sku or '', variant.price,
+                         variant.tax_rate if variant.tax_rate is not None else '',
+                         flag(variant.is_active)] + pairs + [''] * (2 * width - len(pairs))
+
+
+def export_products(fmt='csv'):
+    """Every product with its options and variants, as chunks of CSV, JSON or NDJSON text"""
+    from sqlalchemy import func
+    from app import db
+    from app.models import ProductOption
+
+    if fmt == 'csv':
+        width = db.session.query(func.count(ProductOption.id)).group_by(
+            ProductOption.product_id).order_by(func.count(ProductOption.id).desc()).limit(1).scalar() or 1
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(PRODUCT_COLUMNS + VARIANT_COLUMNS +
+                        [f'option{n}_{part}' for n in range(1, width + 1) for part in ('name', 'value')])
+        for batch in _export_batches():
+            for product, options, variants in batch:
+                writer.writerows(_csv_rows(product, options, variants, width))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+        return
+
+    first = True
+    if fmt == 'json':
+        yield '['
+    for batch in _export_batches():
+        if fmt == 'ndjson':
+            yield ''.join(json.dumps(_export_json(*entry)) + '\n' for entry in batch)
+        else:
+            chunk = ','.join(json.dumps(_export_json(*entry)) for entry in batch)
+            yield chunk if first else ',' + chunk
+        first = False
+    if fmt == 'json':
+        yield ']'
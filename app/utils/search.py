@@ -0,0 +1,475 @@
+"""Text search for clients, products, invoices and quotations.
+
+Every search box and autocomplete endpoint goes through this module. The
+work is done by the best mechanism the database offers:
+
+- MySQL: FULLTEXT indexes with the ngram parser (substring-style matching),
+  ranked by MATCH score.
+- PostgreSQL: ILIKE backed by pg_trgm GIN indexes, ranked by match position.
+- SQLite: an in-process trigram index kept up to date on commit, and with
+  other processes' writes when a search finds the table changed.
+
+If the native indexes have not been created (see migrate_search_indexes.py)
+the search falls back to plain ILIKE scans. SEARCH_BACKEND=memory|like
+forces a backend.
+"""
+from app import db
+from app.utils.cache import DatabaseStamp
+from flask import current_app
+from functools import partial
+from sqlalchemy import event, func, or_, case, literal
+from sqlalchemy.orm import Session
+from array import array
+import heapq
+import os
+import threading
+import time
+
+# entity -> scope -> columns searched (earlier columns rank higher)
+SEARCH_SCOPES = {
+    'clients': {
+        'all': ('name', 'email', 'phone'),
+        'name': ('name',),
+        'email': ('email',),
+    },
+    'products': {
+        'all': ('name', 'sku', 'description'),
+        'name': ('name',),
+        'sku': ('sku',),
+    },
+    'invoices': {
+        'number': ('invoice_number',),
+    },
+    'quotations': {
+        'number': ('quotation_number',),
+    },
+}
+
+# Above this many matches the in-memory backend filters with ILIKE instead of a huge IN list
+MAX_ID_FILTER = 5000
+# Rebuild in-memory indexes periodically (in the background) to shed stale postings
+INDEX_TTL = int(os.environ.get('SEARCH_INDEX_TTL', 600))
+# MySQL's default ngram_token_size; shorter terms can't use the FULLTEXT index
+MYSQL_NGRAM_SIZE = 2
+# LIKE escape character; not backslash, which MySQL string literals treat as an escape themselves
+LIKE_ESCAPE = '/'
+
+
+def _model(entity):
+    from app.models import Client, Product, Invoice, Quotation
+    return {'clients': Client, 'products': Product, 'invoices': Invoice, 'quotations': Quotation}[entity]
+
+
+def _columns(entity, scope):
+    model = _model(entity)
+    return [getattr(model, name) for name in SEARCH_SCOPES[entity][scope]]
+
+
+def index_fields(entity):
+    """Every column searched for an entity, in scope order"""
+    fields = []
+    for columns in SEARCH_SCOPES[entity].values():
+        fields.extend(c for c in columns if c not in fields)
+    return tuple(fields)
+
+
+def mysql_index_name(entity, scope):
+    return f'ft_{entity}_{scope}'
+
+
+def pg_index_name(entity, column):
+    return f'trgm_{entity}_{column}'
+
+
+# ---------------------------------------------------------------------------
+# In-process trigram index
+# ---------------------------------------------------------------------------
+
+class NgramIndex:
+    """Trigram index over a few text fields per document.
+
+    Posting lists are compact arrays of document ids. Updates append to the
+    postings and replace the stored text; lookups always verify candidates
+    against the current text, so stale postings only cost a little work
+    until the next rebuild.
+    """
+
+    def __init__(self, fields, n=3):
+        self.fields = tuple(fields)
+        self.n = n
+        self._postings = {}
+        self._docs = {}
+        self.stale_postings = 0
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _grams(self, text):
+        return {text[i:i + self.n] for i in range(len(text) - self.n + 1)}
+
+    def add(self, doc_id, values):
+        """Index (or re-index) a document. values maps field name to text."""
+        if doc_id in self._docs:
+            self.stale_postings += 1
+        texts = tuple((values.get(field) or '').lower() for field in self.fields)
+        self._docs[doc_id] = texts
+        grams = set()
+        for text in texts:
+            grams.update(self._grams(text))
+        for gram in grams:
+            posting = self._postings.get(gram)
+            if posting is None:
+                posting = self._postings[gram] = array('l')
+            posting.append(doc_id)
+
+    def remove(self, doc_id):
+        if self._docs.pop(doc_id, None) is not None:
+            self.stale_postings += 1
+
+    def _candidates(self, term):
+        if len(term) < self.n:
+            return self._docs.keys()
+        postings = []
+        for gram in self._grams(term):
+            posting = self._postings.get(gram)
+            if posting is None:
+                return ()
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                break
+        return candidates
+
+    def search(self, term, fields=None, limit=None, cap=None):
+        """Ids of documents containing term in any of fields, best matches first.
+
+        A match at the start of a field ranks above one at the start of a word,
+        which ranks above one inside a word; earlier fields weigh more, and
+        shorter texts win ties. Returns None as soon as more than cap
+        documents match.
+        """
+        term = term.lower()
+        if not term:
+            return []
+        positions = [self.fields.index(f) for f in (fields or self.fields)]
+        weights = {pos: len(positions) - rank for rank, pos in enumerate(positions)}
+        scored = []
+        for doc_id in self._candidates(term):
+            texts = self._docs.get(doc_id)
+            if texts is None:
+                continue
+            score = 0
+            length = 0
+            for pos in positions:
+                text = texts[pos]
+                at = text.find(term)
+                if at < 0:
+                    continue
+                if at == 0:
+                    quality = 3
+                elif not text[at - 1].isalnum():
+                    quality = 2
+                else:
+                    quality = 1
+                score += quality * weights[pos]
+                length = length or len(text)
+            if score:
+                scored.append((-score, length, doc_id))
+                if cap is not None and len(scored) > cap:
+                    return None
+        if limit is not None and limit < len(scored):
+            scored = heapq.nsmallest(limit, scored)
+        else:
+            scored.sort()
+        return [doc_id for _, _, doc_id in scored]
+
+
+def _table_stamp(entity):
+    """(row count, highest id, newest updated_at) of an entity's table"""
+    model = _model(entity)
+    return tuple(db.session.query(func.count(model.id), func.max(model.id), func.max(model.updated_at)).one())
+
+
+class _MemoryIndexes:
+    """Per-entity indexes, built in a background thread and refreshed on commit.
+
+    Commits in other processes never reach this one's session events, so each
+    search compares a DatabaseStamp of the entity's table with the stamp the
+    index covers and, when it moved, indexes the rows added or updated since
+    (by id and updated_at). Full rebuilds (first use, INDEX_TTL, too many
+    stale postings, rows deleted elsewhere, bulk writes) run in a thread while
+    the old index keeps serving; until the first build is done search()
+    returns None and callers fall back to ILIKE.
+    """
+
+    def __init__(self):
+        self._indexes = {}
+        self._covered = {}  # entity -> table stamp the index is known to include
+        self._built_at = {}
+        self._stale = set()
+        self._building = set()
+        self._stamps = {entity: DatabaseStamp(partial(_table_stamp, entity), local=True) for entity in SEARCH_SCOPES}
+        self._lock = threading.Lock()
+
+    def _get(self, entity):
+        stamp = self._stamps[entity].get()
+        with self._lock:
+            index = self._indexes.get(entity)
+            if index is None:
+                self._start_build(entity)
+                return None
+            if stamp is not None and stamp != self._covered[entity]:
+                self._catch_up(entity, index, self._covered[entity])
+                self._covered[entity] = stamp
+                if len(index) != stamp[0]:
+                    self._stale.add(entity)  # rows deleted by another process
+            expired = INDEX_TTL and time.monotonic() - self._built_at[entity] > INDEX_TTL
+            if expired or entity in self._stale or index.stale_postings > max(1000, len(index) // 5):
+                self._start_build(entity)
+            return index
+
+    def _catch_up(self, entity, index, covered):
+        _, max_id, newest = covered
+        model = _model(entity)
+        fields = index_fields(entity)
+        changed = model.id > (max_id or 0)
+        if newest is not None:
+            changed = or_(changed, model.updated_at >= newest)
+        for row in db.session.query(model.id, *[getattr(model, field) for field in fields]).filter(changed):
+            index.add(row[0], dict(zip(fields, row[1:])))
+
+    def _start_build(self, entity):
+        # Called with the lock held
+        if entity in self._building:
+            return
+        self._building.add(entity)
+        app = current_app._get_current_object()
+        threading.Thread(target=self._build_in_background, args=(app, entity), daemon=True).start()
+
+    def _build_in_background(self, app, entity):
+        with app.app_context():
+            try:
+                self.build(entity)
+            except Exception:
+                app.logger.exception('Building the %s search index failed', entity)
+            finally:
+                with self._lock:
+                    self._building.discard(entity)
+                db.session.remove()
+
+    def build(self, entity):
+        """Build an entity's index in this thread and start serving it (e.g. to warm up)"""
+        model = _model(entity)
+        fields = index_fields(entity)
+        stamp = _table_stamp(entity)  # read first: rows written during the build are caught up later
+        index = NgramIndex(fields)
+        columns = [model.id] + [getattr(model, field) for field in fields]
+        for row in db.session.query(*columns).execution_options(yield_per=5000):
+            index.add(row[0], dict(zip(fields, row[1:])))
+        with self._lock:
+            self._indexes[entity] = index
+            self._covered[entity] = stamp
+            self._built_at[entity] = time.monotonic()
+            self._stale.discard(entity)
+        return index
+
+    def search(self, entity, term, fields=None, limit=None, cap=None):
+        """Ranked ids (see NgramIndex.search), or None if the index isn't built yet"""
+        index = self._get(entity)
+        if index is None:
+            return None
+        with self._lock:
+            return index.search(term, fields, limit, cap)
+
+    def apply(self, changes):
+        with self._lock:
+            for entity, docs in changes.items():
+                index = self._indexes.get(entity)
+                if index is None:
+                    continue
+                for doc_id, values in docs.items():
+                    if values is None:
+                        index.remove(doc_id)
+                    else:
+                        index.add(doc_id, values)
+
+    def invalidate(self, entity=None):
+        """Rebuild an entity's index (or all of them) on next use, serving the old one meanwhile"""
+        with self._lock:
+            self._stale.update(SEARCH_SCOPES if entity is None else [entity])
+
+    def is_built(self, entity):
+        return entity in self._indexes
+
+
+memory_indexes = _MemoryIndexes()
+
+
+def _entity_of(obj):
+    for entity in SEARCH_SCOPES:
+        if isinstance(obj, _model(entity)):
+            return entity
+    return None
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_search_changes(session, flush_context):
+    changes = session.info.setdefault('search_changes', {})
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        entity = _entity_of(obj)
+        if entity is None or obj.id is None:
+            continue
+        docs = changes.setdefault(entity, {})
+        if obj in session.deleted:
+            docs[obj.id] = None
+        else:
+            # Only capture text when this process has an index to update
+            if memory_indexes.is_built(entity):
+                docs[obj.id] = {field: getattr(obj, field) for field in index_fields(entity)}
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _bulk_search_changes(orm_execute_state):
+    # Query.update()/delete() and bulk insert(Model) bypass the flush; rebuild the affected indexes instead
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        for mapper in orm_execute_state.all_mappers:
+            for entity in SEARCH_SCOPES:
+                if mapper.class_ is _model(entity):
+                    orm_execute_state.session.info.setdefault('search_rebuild', set()).add(entity)
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_search_changes(session):
+    changes = session.info.pop('search_changes', None)
+    if changes:
+        memory_indexes.apply(changes)
+    for entity in session.info.pop('search_rebuild', ()):
+        memory_indexes.invalidate(entity)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_search_changes(session):
+    session.info.pop('search_changes', None)
+    session.info.pop('search_rebuild', None)
+
+
+# ---------------------------------------------------------------------------
+# Backend selection
+# ---------------------------------------------------------------------------
+
+_native_available = {}
+
+
+def _has_native_index(entity, scope):
+    dialect = db.engine.dialect.name
+    key = (dialect, entity, scope)
+    if key not in _native_available:
+        from sqlalchemy import inspect
+        table = _model(entity).__tablename__
+        existing = {index['name'] for index in inspect(db.engine).get_indexes(table)}
+        if dialect == 'mysql':
+            wanted = {mysql_index_name(entity, scope)}
+        else:
+            wanted = {pg_index_name(entity, column) for column in SEARCH_SCOPES[entity][scope]}
+        _native_available[key] = wanted <= existing
+    return _native_available[key]
+
+
+def search_backend(entity, scope):
+    """Which backend serves this entity/scope: 'mysql', 'postgresql', 'memory' or 'like'"""
+    forced = os.environ.get('SEARCH_BACKEND')
+    if forced in ('memory', 'like'):
+        return forced
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        return 'memory'
+    if dialect in ('mysql', 'postgresql') and _has_native_index(entity, scope):
+        return dialect
+    return 'like'
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+def _like_pattern(term, prefix='%'):
+    escaped = term.replace('/', '//').replace('%', '/%').replace('_', '/_')
+    return f'{prefix}{escaped}%'
+
+
+def _like_clause(columns, term):
+    pattern = _like_pattern(term)
+    return or_(*[column.ilike(pattern, escape=LIKE_ESCAPE) for column in columns])
+
+
+def _like_rank(columns, term):
+    """Position-based relevance: field start > word start > inside a word"""
+    starts = _like_pattern(term, prefix='')
+    word_starts = _like_pattern(term, prefix='% ')
+    anywhere = _like_pattern(term)
+    score = literal(0)
+    for weight, column in zip(range(len(columns), 0, -1), columns):
+        score = score + case(
+            (column.ilike(starts, escape=LIKE_ESCAPE), 3 * weight),
+            (column.ilike(word_starts, escape=LIKE_ESCAPE), 2 * weight),
+            (column.ilike(anywhere, escape=LIKE_ESCAPE), weight),
+            else_=0,
+        )
+    return score
+
+
+def _mysql_match(columns, term):
+    from sqlalchemy.dialects.mysql import match
+    phrase = '"{}"'.format(term.replace('"', ' '))
+    return match(*columns, against=phrase).in_boolean_mode()
+
+
+def search_filter(entity, term, scope):
+    """WHERE clause restricting an entity query to rows matching term.
+
+    Used by the paginated list pages, which keep their own sort order.
+    """
+    columns = _columns(entity, scope)
+    backend = search_backend(entity, scope)
+    if backend == 'mysql' and len(term) >= MYSQL_NGRAM_SIZE:
+        return _mysql_match(columns, term)
+    if backend == 'memory':
+        ids = memory_indexes.search(entity, term, SEARCH_SCOPES[entity][scope], cap=MAX_ID_FILTER)
+        if ids is not None:
+            return _model(entity).id.in_(ids)
+    return _like_clause(columns, term)
+
+
+def search(entity, term, scope, query, limit):
+    """Up to limit rows of query matching term, most relevant first.
+
+    query is the base ORM query for the entity (with any extra filters, such
+    as only active products, and loading options).
+    """
+    model = _model(entity)
+    columns = _columns(entity, scope)
+    backend = search_backend(entity, scope)
+
+    ranked = memory_indexes.search(entity, term, SEARCH_SCOPES[entity][scope]) if backend == 'memory' else None
+    if ranked is not None:
+        # Fetch in rank order, in batches, until enough rows pass the query's own filters
+        results = []
+        batch = max(limit * 4, 50)
+        for start in range(0, len(ranked), batch):
+            ids = ranked[start:start + batch]
+            rows = {row.id: row for row in query.filter(model.id.in_(ids)).all()}
+            results.extend(rows[doc_id] for doc_id in ids if doc_id in rows)
+            if len(results) >= limit:
+                break
+        return results[:limit]
+
+    if backend == 'mysql' and len(term) >= MYSQL_NGRAM_SIZE:
+        score = _mysql_match(columns, term)
+        return query.filter(score).order_by(score.desc(), model.id).limit(limit).all()
+
+    return query.filter(_like_clause(columns, term)).order_by(
+        _like_rank(columns, term).desc(), model.id
+    ).limit(limit).all()
@@ -0,0 +1,87 @@
+"""SKU generation for products and variants.
+
+Generated SKUs used to be found by probing candidates one query at a time
+(NAME001, NAME002, ... and SKU-S-RED, SKU-S-RED-1, ...), so a product with
+many variants sharing a prefix cost a query per variant and collision. A
+SkuAllocator fetches the existing SKUs under a prefix once, with a range
+scan of the unique sku index, and hands out free candidates from memory,
+remembering what it has handed out so a whole batch stays unique.
+"""
+from sqlalchemy import and_
+
+
+def sku_base(name):
+    """Product SKU stem from its name: uppercase letters and digits, at most 15"""
+    return ''.join(c.upper() if c.isalnum() else '' for c in name)[:15]
+
+
+def variant_candidate(base_sku, combo):
+    """Variant SKU for a combination of option values, e.g. TSHIRT001-M-RED"""
+    return f"{base_sku}-{'-'.join(str(value).upper()[:3] for value in combo)}"
+
+
+def _prefix_filter(column, prefix):
+    # A range rather than LIKE, which SQLite can't answer from the index
+    return and_(column >= prefix, column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+
+
+class SkuAllocator:
+    """Unique SKUs for one model's sku column (Product or ProductVariant)"""
+
+    def __init__(self, model, exclude_id=None):
+        self.model = model
+        self.exclude_id = exclude_id  # a row whose own SKU doesn't count as taken
+        self.existing = set()  # SKUs in the database, under the loaded prefixes
+        self.assigned = set()  # SKUs handed out or reserved by this allocator
+        self._prefixes = []
+        self._counters = {}
+
+    def load(self, prefix=''):
+        """Fetch the existing SKUs starting with prefix ('' for all), unless already loaded"""
+        from app import db
+
+        if any(prefix.startswith(loaded) for loaded in self._prefixes):
+            return
+        column = self.model.sku
+        query = db.session.query(column).filter(column.isnot(None))
+        if prefix:
+            query = query.filter(_prefix_filter(column, prefix))
+        if self.exclude_id is not None:
+            query = query.filter(self.model.id != self.exclude_id)
+        # Case-insensitive collations (MySQL) can return a few extra rows from the range
+        self.existing.update(sku for sku, in query if sku.startswith(prefix))
+        self._prefixes.append(prefix)
+
+    def exists(self, sku):
+        """Whether sku is already in the database"""
+        self.load(sku)
+        return sku in self.existing
+
+    def is_taken(self, sku):
+        return sku in self.assigned or self.exists(sku)
+
+    def reserve(self, sku):
+        """Keep a SKU given explicitly from being generated for anything else"""
+        self.assigned.add(sku)
+
+    def numbered(self, base):
+        """First free base001, base002, ... (products)"""
+        self.load(base)
+        counter = self._counters.get(base, 1)
+        while self.is_taken(f"{base}{counter:03d}"):
+            counter += 1
+        self._counters[base] = counter + 1
+        sku = f"{base}{counter:03d}"
+        self.assigned.add(sku)
+        return sku
+
+    def suffixed(self, candidate):
+        """candidate if free, else the first free candidate-1, candidate-2, ... (variants)"""
+        self.load(candidate)
+        sku = candidate
+        counter = 1
+        while self.is_taken(sku):
+            sku = f"{candidate}-{counter}"
+            counter += 1
+        self.assigned.add(sku)
+        return sku
@@ -0,0 +1,357 @@
+"""Product options and variants, updated in place from the product form.
+
+Saving a product used to delete every option, option value and variant and
+recreate the whole matrix, rewriting thousands of rows for a description
+change and giving every variant a new id. sync_variants() instead matches
+the submitted options to the stored ones by name and value, and variants by
+their combination of option values, then inserts what is new, updates only
+the fields that changed and deactivates variants whose combination is gone
+(they keep their id and SKU, and come back if the combination returns).
+Options renamed in the form are matched by id (see option_renames()), so
+their variants keep their rows and SKUs.
+
+Combinations are generated lazily and written in batches, never built as
+one list, and capped at MAX_VARIANTS per product. Matrices larger than
+VARIANT_SYNC_MAX are written by a background job whose progress is
+reported by /jobs/<id>; the product row carries the job's id while it runs,
+so every worker refuses edits that would race with it.
+"""
+from app.utils.jobs import jobs
+from app.utils.sku import SkuAllocator, variant_candidate
+from datetime import datetime
+from itertools import product as itertools_product
+import json
+import os
+import uuid
+
+# Combinations allowed per product; more is refused rather than built
+MAX_VARIANTS = int(os.environ.get('PRODUCT_MAX_VARIANTS', 10000))
+# Above this many combinations a save returns at once and a background job writes the variants
+VARIANT_SYNC_MAX = int(os.environ.get('PRODUCT_VARIANTS_SYNC_MAX', 1000))
+VARIANT_BATCH_SIZE = int(os.environ.get('PRODUCT_VARIANT_BATCH_SIZE', 500))
+VARIANT_WORKERS = 2
+
+
+def parse_options(names, values_list):
+    """[(name, [values])] from the form's option_name[] and comma-separated option_values[].
+
+    Options without values are left out, as in the form's variant preview.
+    """
+    options = []
+    seen = set()
+    for idx, name in enumerate(names):
+        name = name.strip()
+        values_str = values_list[idx] if idx < len(values_list) else ''
+        values = list(dict.fromkeys(v.strip() for v in values_str.split(',') if v.strip()))
+        if name and values and name not in seen:
+            seen.add(name)
+            options.append((name, values))
+    return options
+
+
+def option_renames(product, names, ids):
+    """{stored name: new name} for product's options renamed in the form, which posts
+    each stored option's id in option_id[] beside its option_name[] (blank for new ones)"""
+    stored = {str(option.id): option.name for option in product.options}
+    renames = {}
+    for option_id, name in zip(ids, names):
+        name = name.strip()
+        old = stored.get(option_id)
+        if old is not None and name and name != old:
+            renames[old] = name
+    return renames
+
+
+def _renamed(variant_data, renames):
+    if not renames:
+        return variant_data
+    if isinstance(variant_data, str):
+        try:
+            variant_data = json.loads(variant_data)
+        except ValueError:
+            return None
+    if not isinstance(variant_data, dict):
+        return None
+    return {renames.get(name, name): value for name, value in variant_data.items()}
+
+
+def combination_key(variant_data):
+    """Identity of a variant: its option values, independent of option order"""
+    if isinstance(variant_data, str):
+        try:
+            variant_data = json.loads(variant_data)
+        except ValueError:
+            return None
+    if not isinstance(variant_data, dict):
+        return None
+    return tuple(sorted((str(name), str(value)) for name, value in variant_data.items()))
+
+
+def _sync_options(product, options, renames=None):
+    from app import db
+    from app.models import ProductOption, ProductOptionValue
+    from sqlalchemy.orm import selectinload
+
+    renames = renames or {}
+    current = {renames.get(option.name, option.name): option for option in ProductOption.query.filter_by(
+        product_id=product.id).options(selectinload(ProductOption.values))}
+    for order, (name, values) in enumerate(options):
+        option = current.pop(name, None)
+        if option is None:
+            option = ProductOption(product_id=product.id, name=name, display_order=order)
+            db.session.add(option)
+        else:
+            if option.name != name:
+                option.name = name
+            if option.display_order != order:
+                option.display_order = order
+        stored = {row.value: row for row in option.values}
+        for value_order, value in enumerate(values):
+            row = stored.pop(value, None)
+            if row is None:
+                option.values.append(ProductOptionValue(value=value, display_order=value_order))
+            elif row.display_order != value_order:
+                row.display_order = value_order
+        for row in stored.values():
+            option.values.remove(row)  # delete-orphan
+    for option in current.values():
+        db.session.delete(option)
+
+
+def variant_count(options):
+    """Number of combinations options ([(name, [values])]) make"""
+    count = 1 if options else 0
+    for _, values in options:
+        count *= len(values)
+    return count
+
+
+def sync_variant_rows(product, options, prices=(), skus=(), base_price=0, tax_rate=0, progress=None,
+                      renames=None):
+    """Bring product's variants in line with the combinations of options ([(name, [values])]).
+
+    prices and skus are per combination, in the order itertools.product
+    yields them (as the form lists them); blank entries mean the base price
+    and, for new variants, a generated SKU. Existing variants keep their SKU
+    unless another is given, and their price past the end of prices. A SKU
+    given to one combination that another variant of the product holds
+    (SKUs swapped, or taken back from a deactivated variant) is cleared on
+    that variant first, which then gets a generated SKU if it stays active.
+    Raises ValueError for a SKU given twice or used by another product.
+    renames ({stored name: new name}) matches variants of renamed options.
+    Combinations are generated lazily and written
+    VARIANT_BATCH_SIZE at a time with multi-row INSERTs and UPDATEs by id;
+    progress(done, total), if given, is called after each batch. Returns
+    counts of variants added, updated, deactivated and unchanged.
+    """
+    from sqlalchemy import insert, select, update
+    from app import db
+    from app.models import ProductVariant
+
+    total = variant_count(options)
+    if total > MAX_VARIANTS:
+        raise ValueError(f'{total} variants is more than the limit of {MAX_VARIANTS}')
+    duplicate = _duplicate_sku(skus)
+    if duplicate is not None:
+        raise ValueError(f'SKU {duplicate} is given to more than one variant')
+    counts = dict.fromkeys(('added', 'updated', 'deactivated', 'unchanged'), 0)
+
+    existing = {}
+    stale = []
+    held = {}  # SKU -> id of the variant of this product holding it
+    for row in db.session.execute(
+            select(ProductVariant.id, ProductVariant.sku, ProductVariant.price, ProductVariant.tax_rate,
+                   ProductVariant.is_active, ProductVariant.variant_data)
+            .where(ProductVariant.product_id == product.id)):
+        key = combination_key(_renamed(row.variant_data, renames))
+        if key is None or key in existing:
+            stale.append(row)
+        else:
+            existing[key] = row
+        if row.sku:
+            held[row.sku] = row.id
+    current_sku = {variant_id: sku for sku, variant_id in held.items()}
+
+    now = datetime.utcnow()
+    inserts, updates = [], []
+
+    def write(done):
+        if inserts:
+            db.session.execute(insert(ProductVariant), inserts)
+            inserts.clear()
+        if updates:
+            db.session.execute(update(ProductVariant), updates)
+            updates.clear()
+        if progress is not None:
+            progress(done, total)
+
+    names = [name for name, _ in options]
+    combinations = itertools_product(*(values for _, values in options)) if options else ()
+    base_sku = product.sku or f"PROD{product.id:05d}"
+    allocator = None
+
+    def skus_in_use():
+        # Every generated SKU shares the base SKU prefix: fetch the taken ones once
+        nonlocal allocator
+        if allocator is None:
+            allocator = SkuAllocator(ProductVariant)
+            allocator.load(f"{base_sku}-")
+            for given in skus:
+                if given:
+                    allocator.reserve(given)
+        return allocator
+
+    def claim(sku, variant_id):
+        # Clear sku on the variant of this product holding it, before anything writes it again
+        holder = held.pop(sku, None)
+        if holder is None:
+            if skus_in_use().exists(sku):
+                raise ValueError(f'SKU {sku} is already used by another product')
+        elif holder != variant_id:
+            db.session.execute(update(ProductVariant).where(ProductVariant.id == holder).values(sku=None))
+            current_sku[holder] = None
+        held[sku] = variant_id
+
+    for idx, combo in enumerate(combinations):
+        data = json.dumps(dict(zip(names, combo)))
+        sku = skus[idx] if idx < len(skus) and skus[idx] else None
+        row = existing.pop(combination_key(dict(zip(names, combo))), None)
+        if idx < len(prices):
+            price = float(prices[idx]) if prices[idx] else base_price
+        else:
+            price = base_price if row is None else row.price  # not in the (truncated) form
+        if row is None:
+            if sku:
+                claim(sku, None)
+            else:
+                sku = skus_in_use().suffixed(variant_candidate(base_sku, combo))
+            inserts.append({'product_id': product.id, 'sku': sku, 'price': price, 'tax_rate': tax_rate,
+                            'is_active': True, 'variant_data': data, 'created_at': now, 'updated_at': now})
+            counts['added'] += 1
+        else:
+            if sku and sku != current_sku.get(row.id):
+                claim(sku, row.id)
+            elif not sku:
+                sku = current_sku.get(row.id)
+                if sku is None and row.sku:  # given to another combination in this save
+                    sku = skus_in_use().suffixed(variant_candidate(base_sku, combo))
+                    held[sku] = row.id
+            if (row.price, row.tax_rate, row.is_active, row.variant_data, row.sku) != (
+                    price, tax_rate, True, data, sku):
+                updates.append({'id': row.id, 'sku': sku, 'price': price, 'tax_rate': tax_rate,
+                                'is_active': True, 'variant_data': data, 'updated_at': now})
+                current_sku[row.id] = sku
+                counts['updated'] += 1
+            else:
+                counts['unchanged'] += 1
+        if len(inserts) + len(updates) >= VARIANT_BATCH_SIZE:
+            write(idx + 1)
+    write(total)
+
+    gone = [row.id for row in list(existing.values()) + stale if row.is_active]
+    for start in range(0, len(gone), VARIANT_BATCH_SIZE):
+        db.session.execute(update(ProductVariant).where(
+            ProductVariant.id.in_(gone[start:start + VARIANT_BATCH_SIZE])).values(is_active=False, updated_at=now))
+    counts['deactivated'] = len(gone)
+    if counts['added'] or counts['updated'] or counts['deactivated']:
+        product.updated_at = now  # bulk writes skip the parent touch in http_cache
+    return counts
+
+
+def _duplicate_sku(skus):
+    """A SKU that appears more than once in skus, or None"""
+    seen = set()
+    for sku in skus:
+        if sku in seen:
+            return sku
+        if sku:
+            seen.add(sku)
+    return None
+
+
+def sync_variants(product, options, prices=(), skus=(), base_price=0, tax_rate=0, renames=None):
+    """Bring product's options and variants in line with options ([(name, [values])]).
+
+    See sync_variant_rows() for prices, skus, renames and the counts returned.
+    """
+    _sync_options(product, options, renames)
+    return sync_variant_rows(product, options, prices, skus, base_price, tax_rate, renames=renames)
+
+
+def _variant_job(app, job_id, product_id, options, prices, skus, renames, meta):
+    from sqlalchemy import update
+    from app import db
+    from app.models import Product
+
+    with app.app_context():
+        try:
+            product = db.session.get(Product, product_id)
+            counts = sync_variant_rows(product, options, prices, skus, product.price, product.tax_rate,
+                                       progress=lambda done, total: jobs.update(job_id, done=done),
+                                       renames=renames)
+            db.session.commit()
+            meta.update(counts)
+            return counts
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.execute(update(Product).where(
+                Product.id == product_id, Product.variants_job_id == job_id).values(
+                variants_job_id=None, updated_at=Product.updated_at))
+            db.session.commit()
+            db.session.remove()
+
+
+def running_variant_job(product):
+    """The background job, in any worker, still generating product's variants, or None"""
+    if not product.variants_job_id:
+        return None
+    job = jobs.get(product.variants_job_id)
+    # A job no worker knows of any more (it expired, or its worker died) isn't running
+    return job if job is not None and not job.done else None
+
+
+def save_variants(product, options, prices=(), skus=(), renames=None):
+    """Sync product's options, then its variants: inline, or above VARIANT_SYNC_MAX
+    combinations in a background thread after committing the rest of the product.
+    renames is option_renames() for the form.
+
+    Returns the background job (its status, with done/total progress, is at
+    /jobs/<id>) or None. Raises ValueError for SKUs that can't be saved.
+    """
+    from flask import current_app
+    from app import db
+
+    _sync_options(product, options, renames)
+    total = variant_count(options)
+    if total <= VARIANT_SYNC_MAX:
+        sync_variant_rows(product, options, prices, skus, product.price, product.tax_rate, renames=renames)
+        return None
+    if total > MAX_VARIANTS:
+        raise ValueError(f'{total} variants is more than the limit of {MAX_VARIANTS}')
+    duplicate = _duplicate_sku(skus)
+    if duplicate is not None:
+        raise ValueError(f'SKU {duplicate} is given to more than one variant')
+
+    job_id = uuid.uuid4().hex
+    product.variants_job_id = job_id
+    db.session.commit()
+    meta = {'product_id': product.id, 'total': total, 'done': 0}
+    executor = jobs.executor('variants', max_workers=VARIANT_WORKERS)
+    return jobs.submit(executor, 'variants', _variant_job, current_app._get_current_object(), job_id,
+                       product.id, options, list(prices), list(skus), renames, meta, job_id=job_id, meta=meta)
+
+
+def variant_prefill(product):
+    """SKU and (where it isn't the base price) price of each stored variant, keyed as the form's
+    script keys combinations, so editing a product shows what is saved"""
+    prefill = {}
+    for variant in product.variants:
+        key = combination_key(variant.variant_data)
+        if key is not None:
+            entry = {'sku': variant.sku or ''}
+            if variant.price != product.price:
+                entry['price'] = variant.price
+            prefill[json.dumps([list(pair) for pair in key], separators=(',', ':'), ensure_ascii=False)] = entry
+    return prefill
@@ -0,0 +1,47 @@
+"""Shared helpers for the benchmark scripts.
+
+Benchmarks run against a scratch database, a temporary SQLite file unless
+--database-url is given, so they never touch real data.
+"""
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def create_scratch_app(database_url=None):
+    """Create the app against a throwaway database"""
+    if not database_url:
+        fd, path = tempfile.mkstemp(prefix='invoice-bench-', suffix='.db')
+        os.close(fd)
+        database_url = f'sqlite:///{path}'
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('SQL_STATS_ENABLED', '0')
+
+    from app import create_app
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+
+def insert_rows(model, rows, batch_size=5000):
+    """Bulk insert plain dict rows into a model's table"""
+    from app import db
+
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(model.__table__.insert(), rows[start:start + batch_size])
+    db.session.commit()
+
+
+def best_of(fn, repeat=5):
+    """Run fn repeat times and return the fastest wall time in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+"""Query plans and timings for the list routes, without and with the model indexes.
+
+Seeds a scratch database, requests each list route with every secondary
+index dropped, then again after creating them, and prints the plan of each
+statement the route issued plus the best-of-N response time.
+
+Usage:
+    python benchmarks/list_query_plans.py [--invoices 50000] [--database-url URL]
+"""
+import argparse
+import os
+import random
+from datetime import datetime, timedelta
+
+from common import create_scratch_app, insert_rows, best_of
+
+# Count queries are part of what the list routes cost; don't hide them behind the cache
+os.environ['LIST_COUNT_CACHE_TTL'] = '0'
+
+ROUTES = [
+    ('Invoices, newest first', '/invoices/?per_page=25'),
+    ('Invoices filtered by status', '/invoices/?status=sent&per_page=25'),
+    ('Invoices, page 400', '/invoices/?page=400&per_page=25'),
+    ('Invoices, keyset mode', '/invoices/?paging=keyset&per_page=25'),
+    ('Invoice detail', '/invoices/{invoice_id}'),
+    ('Invoice API page', '/invoices/api/list?limit=100'),
+    ('Quotations filtered by status', '/quotations/?status=pending&per_page=25'),
+    ('Clients by name', '/clients/?per_page=25'),
+    ('Products by category, active', '/products/?category=Category+3&status=active&per_page=25'),
+]
+
+
+def seed(n_invoices):
+    from app.models import Client, Invoice, InvoiceItem, Payment, Quotation, Product
+
+    rng = random.Random(42)
+    start = datetime(2020, 1, 1)
+    n_clients = max(10, n_invoices // 25)
+    insert_rows(Client, [
+        {'id': i, 'name': f'Client {rng.randint(0, 10 ** 6):07d}', 'email': f'client{i}@example.com',
+         'created_at': start, 'updated_at': start}
+        for i in range(1, n_clients + 1)
+    ])
+    statuses = ['draft', 'sent', 'paid', 'overdue']
+    insert_rows(Invoice, [
+        {'id': i, 'invoice_number': f'INV-{i:07d}', 'client_id': rng.randint(1, n_clients),
+         'status': rng.choice(statuses), 'issue_date': start, 'created_at': start + timedelta(minutes=i),
+         'updated_at': start, 'subtotal': 100, 'tax_total': 10, 'total': 110, 'paid_amount': 0, 'balance': 110}
+        for i in range(1, n_invoices + 1)
+    ])
+    insert_rows(InvoiceItem, [
+        {'invoice_id': i, 'description': 'Service', 'quantity': 1, 'unit_price': 50, 'tax_rate': 10}
+        for i in range(1, n_invoices + 1) for _ in range(2)
+    ])
+    insert_rows(Payment, [
+        {'invoice_id': i, 'amount': 110, 'payment_date': start, 'created_at': start}
+        for i in range(1, n_invoices + 1, 2)
+    ])
+    insert_rows(Quotation, [
+        {'id': i, 'quotation_number': f'QT-{i:07d}', 'client_id': rng.randint(1, n_clients),
+         'status': rng.choice(['pending', 'accepted', 'rejected']), 'issue_date': start,
+         'created_at': start + timedelta(minutes=i), 'updated_at': start}
+        for i in range(1, n_invoices // 2 + 1)
+    ])
+    insert_rows(Product, [
+        {'id': i, 'name': f'Product {rng.randint(0, 10 ** 6):07d}', 'sku': f'SKU{i:07d}', 'price': 10,
+         'category': f'Category {i % 20}', 'is_active': i % 5 != 0, 'has_variants': False,
+         'created_at': start, 'updated_at': start}
+        for i in range(1, n_invoices // 2 + 1)
+    ])
+
+
+def explain(connection, statement, parameters):
+    dialect = connection.dialect.name
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect == 'sqlite' else 'EXPLAIN '
+    rows = connection.exec_driver_sql(prefix + statement, parameters).fetchall()
+    if dialect == 'sqlite':
+        return [row[-1] for row in rows]
+    return [' | '.join(str(value) for value in row) for row in rows]
+
+
+def run_routes(app, label, repeat):
+    from app import db
+    from sqlalchemy import event
+
+    client = app.test_client()
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    results = {}
+    print(f"\n{'=' * 78}\n{label}\n{'=' * 78}")
+    with app.app_context():
+        engine = db.engine
+    for name, url in ROUTES:
+        url = url.format(invoice_id=1)
+        client.get(url)  # Warm up
+
+        captured.clear()
+        event.listen(engine, 'before_cursor_execute', capture)
+        client.get(url)
+        event.remove(engine, 'before_cursor_execute', capture)
+        statements = list(captured)
+
+        results[name] = best_of(lambda: client.get(url), repeat)
+        print(f"\n{name}  [{url}]  {results[name]:.1f} ms, {len(statements)} statements")
+        with engine.connect() as connection:
+            for statement, parameters in statements:
+                print(f"  SQL: {' '.join(statement.split())[:110]}...")
+                for line in explain(connection, statement, parameters):
+                    print(f"       {line}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--invoices', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database-url', help='Scratch database to use (it will be filled with test data)')
+    args = parser.parse_args()
+
+    app = create_scratch_app(args.database_url)
+    from app import db
+
+    with app.app_context():
+        print(f"Seeding {args.invoices} invoices...")
+        seed(args.invoices)
+        indexes = [index for table in db.metadata.sorted_tables for index in table.indexes]
+        for index in indexes:
+            index.drop(db.engine)
+
+    before = run_routes(app, 'WITHOUT secondary indexes', args.repeat)
+
+    with app.app_context():
+        for index in indexes:
+            index.create(db.engine)
+        if db.engine.dialect.name in ('sqlite', 'postgresql'):
+            db.session.execute(db.text('ANALYZE'))
+            db.session.commit()
+
+    after = run_routes(app, 'WITH secondary indexes', args.repeat)
+
+    print(f"\n{'Route':40s} {'before':>10s} {'after':>10s}")
+    for name, _ in ROUTES:
+        print(f"{name:40s} {before[name]:>8.1f}ms {after[name]:>8.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
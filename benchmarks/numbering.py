@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""Invoice numbers under concurrent creates: newest id + 1 versus the counter table.
+
+Creates --invoices invoices from --threads threads at once, each thread
+with its own session, the way concurrent requests do. Every create takes a
+number and inserts the invoice; a unique-constraint failure on
+invoice_number is counted as a collision and retried with a new number.
+Reported per strategy: creates per second, collisions and whether the
+numbers that were stored are all distinct.
+
+    legacy      Invoice.query.order_by(Invoice.id.desc()).first().id + 1
+    sequence    app/utils/numbering.py, one counter UPDATE per number
+    block-N     the same, reserving N numbers per UPDATE
+
+Usage:
+    python benchmarks/numbering.py [--invoices 2000] [--threads 16] [--database-url URL]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from common import create_scratch_app, insert_rows
+
+
+def legacy_number():
+    from app.models import Invoice
+
+    last_invoice = Invoice.query.order_by(Invoice.id.desc()).first()
+    return f"INV-{(last_invoice.id if last_invoice else 0) + 1:05d}"
+
+
+def create_invoices(app, count, number, max_retries=50):
+    """Create count invoices in one thread. Returns the number of collisions."""
+    from sqlalchemy.exc import IntegrityError, OperationalError
+    from app import db
+    from app.models import Invoice
+
+    collisions = 0
+    with app.app_context():
+        for _ in range(count):
+            for _ in range(max_retries):
+                try:
+                    db.session.add(Invoice(invoice_number=number(), client_id=1,
+                                           issue_date=datetime(2024, 1, 1), status='draft'))
+                    db.session.commit()
+                    break
+                except IntegrityError:
+                    db.session.rollback()
+                    collisions += 1
+                except OperationalError:
+                    db.session.rollback()  # SQLite busy; try again
+            else:
+                raise RuntimeError('gave up after repeated collisions')
+        db.session.remove()
+    return collisions
+
+
+def run(app, strategy, invoices, threads):
+    from app import db
+    from app.models import Invoice, NumberSequence
+    from app.utils import numbering
+
+    with app.app_context():
+        Invoice.query.delete()
+        NumberSequence.query.delete()
+        db.session.commit()
+    numbering.reset_blocks()
+    if strategy == 'legacy':
+        number = legacy_number
+    else:
+        numbering.NUMBER_BLOCK_SIZE = int(strategy.split('-')[1]) if strategy.startswith('block-') else 1
+        number = lambda: numbering.next_number('invoice')  # noqa: E731
+
+    per_thread = [invoices // threads + (1 if i < invoices % threads else 0) for i in range(threads)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        collisions = sum(pool.map(lambda n: create_invoices(app, n, number), per_thread))
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        numbers = [n for n, in db.session.query(Invoice.invoice_number)]
+    return elapsed, collisions, len(numbers), len(set(numbers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--invoices', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--database-url', help='defaults to a temporary SQLite file')
+    args = parser.parse_args()
+
+    app = create_scratch_app(args.database_url)
+    from app.models import Client
+    with app.app_context():
+        insert_rows(Client, [{'id': 1, 'name': 'Benchmark client'}])
+
+    print(f"{args.invoices} invoices from {args.threads} threads")
+    print(f"{'strategy':<10} {'creates/s':>10} {'collisions':>11} {'stored':>8} {'distinct':>9}")
+    for strategy in ('legacy', 'sequence', 'block-50'):
+        elapsed, collisions, stored, distinct = run(app, strategy, args.invoices, args.threads)
+        print(f"{strategy:<10} {args.invoices / elapsed:>10.0f} {collisions:>11} {stored:>8} {distinct:>9}")
+
+
+if __name__ == '__main__':
+    main()
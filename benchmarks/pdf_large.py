@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""Render time and memory of very long invoices, one big table versus page-sized blocks.
+
+Each render runs in a fresh process (no database needed) and reports wall
+time, page count and the growth of peak RSS during the render:
+
+    table    one Table of Paragraph cells, as for short documents
+    blocks   the large-document mode: plain string cells in page-sized Tables
+
+Usage:
+    python benchmarks/pdf_large.py [--lines 1000,10000]
+"""
+import argparse
+import multiprocessing
+import resource
+import time
+
+from common import ROOT  # noqa: F401  (puts the project on sys.path)
+from pdf_render import sample_inputs
+
+
+def render(mode, lines):
+    import app.utils.pdf as pdf
+    from app.utils.pdf_cache import render_snapshot
+
+    pdf.LARGE_DOCUMENT_LINES = lines if mode == 'table' else 0
+    render_snapshot('invoice', sample_inputs('invoice', 5, None), None)  # import and font setup
+    inputs = sample_inputs('invoice', lines, None)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    data = render_snapshot('invoice', inputs, None)
+    elapsed = time.perf_counter() - started
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    return elapsed, data.count(b'/Type /Page\n'), peak_kb
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', default='1000,10000', help='comma-separated document sizes')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    print(f"{'lines':>7} {'mode':<8} {'pages':>6} {'time (s)':>9} {'peak RSS (MB)':>14}")
+    for lines in (int(n) for n in args.lines.split(',')):
+        for mode in ('table', 'blocks'):
+            with context.Pool(1) as pool:
+                elapsed, pages, peak_kb = pool.apply(render, (mode, lines))
+            print(f"{lines:>7} {mode:<8} {pages:>6} {elapsed:>9.2f} {peak_kb / 1024:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""Per-PDF render time of the document engine at several document sizes.
+
+Renders invoice and quotation snapshots (no database needed) of 1, 50 and
+1000 lines by default and prints the median time per PDF:
+
+    cold   into memory, template registry cleared first (header, logo and
+           company blocks rebuilt each time, as before the registry)
+    warm   into memory with the shared templates
+    file   warm, written to a file on disk instead of returned as bytes
+
+Usage:
+    python benchmarks/pdf_render.py [--lines 1,50,1000] [--renders 10]
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from common import ROOT  # noqa: F401  (puts the project on sys.path)
+
+
+def sample_inputs(kind, lines, logo_path):
+    from app.utils.pdf import COMPANY_FIELDS
+
+    company = {field: f'{field.replace("_", " ").title()}' for field in COMPANY_FIELDS}
+    company['logo_path'] = logo_path
+    document = {
+        'invoice_number': 'INV-00001', 'quotation_number': 'QUO-00001',
+        'issue_date': datetime(2024, 1, 1), 'due_date': datetime(2024, 1, 31), 'valid_until': datetime(2024, 1, 31),
+        'notes': 'Thank you.', 'terms': 'Net 30',
+        'subtotal': 100.0 * lines, 'tax_total': 10.0 * lines, 'total': 110.0 * lines,
+        'paid_amount': 50.0, 'balance': 110.0 * lines - 50,
+    }
+    client = {field: field.title() for field in ('name', 'address', 'city', 'state', 'zip_code', 'country', 'email', 'phone')}
+    items = [
+        {'description': f'Consulting services, line {i}', 'quantity': 1, 'unit_price': 100.0, 'tax_rate': 10.0, 'total': 110.0}
+        for i in range(lines)
+    ]
+    return {'kind': kind, 'document': document, 'client': client, 'items': items, 'company': company, 'payments': []}
+
+
+def median_ms(fns, renders):
+    """Median time per call of each fn, calling them interleaved so drift hits all equally"""
+    samples = [[] for _ in fns]
+    for _ in range(renders):
+        for fn, times in zip(fns, samples):
+            started = time.perf_counter()
+            fn()
+            times.append((time.perf_counter() - started) * 1000)
+    return [statistics.median(times) for times in samples]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', default='1,50,1000', help='comma-separated document sizes')
+    parser.add_argument('--renders', type=int, default=10)
+    args = parser.parse_args()
+
+    from PIL import Image as PILImage
+    from app.utils.pdf import clear_templates
+    from app.utils.pdf_cache import render_snapshot
+
+    fd, logo_path = tempfile.mkstemp(suffix='.png')
+    os.close(fd)
+    PILImage.new('RGB', (600, 240), '#3b82f6').save(logo_path)
+    fd, pdf_path = tempfile.mkstemp(suffix='.pdf')
+    os.close(fd)
+
+    print(f"{'Document':<12} {'lines':>6} {'pages':>6} {'KB':>8} {'cold (ms)':>10} {'warm (ms)':>10} {'file (ms)':>10}")
+    try:
+        for lines in (int(n) for n in args.lines.split(',')):
+            for kind in ('invoice', 'quotation'):
+                inputs = sample_inputs(kind, lines, logo_path)
+
+                def render():
+                    return render_snapshot(kind, inputs, None)
+
+                def cold():
+                    clear_templates()
+                    render()
+
+                def to_file():
+                    render_snapshot(kind, inputs, pdf_path)
+
+                data = render()  # import and font setup
+                pages = data.count(b'/Type /Page\n')
+                cold_ms, warm_ms, file_ms = median_ms([cold, render, to_file], args.renders)
+                print(f"{kind:<12} {lines:>6} {pages:>6} {len(data) / 1024:>8.1f} "
+                      f"{cold_ms:>10.2f} {warm_ms:>10.2f} {file_ms:>10.2f}")
+    finally:
+        os.remove(logo_path)
+        os.remove(pdf_path)
+
+
+if __name__ == '__main__':
+    main()
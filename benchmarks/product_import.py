@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""Bulk product import and export: the product form's row-at-a-time writes versus app/utils/product_io.py.
+
+Builds a CSV of products with two options (5 sizes x 4 colours, 20 variants
+each) and blank SKUs, then reports time and variants per second for:
+
+    form      what the product form used to do per product: an ORM add per row, a
+              flush per option and a SKU lookup query per product and variant
+    import    import_products(): validated in memory, multi-row INSERTs, one commit
+    export    export_products() of everything imported, as CSV and as JSON
+
+The form path is slow enough that it runs on --form-variants rows only.
+
+Usage:
+    python benchmarks/product_import.py [--variants 100000] [--form-variants 5000] [--database-url URL]
+"""
+import argparse
+import csv
+import io
+import json
+import time
+
+from common import create_scratch_app
+
+SIZES = ['XS', 'S', 'M', 'L', 'XL']
+COLOURS = ['Black', 'White', 'Red', 'Blue']
+
+
+def sample_csv(variants):
+    from app.utils.product_io import PRODUCT_COLUMNS, VARIANT_COLUMNS
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(PRODUCT_COLUMNS + VARIANT_COLUMNS + ['option1_name', 'option1_value', 'option2_name', 'option2_value'])
+    per_product = len(SIZES) * len(COLOURS)
+    for n in range(variants // per_product):
+        name = f'Benchmark product {n}'
+        for size in SIZES:
+            for colour in COLOURS:
+                writer.writerow([name, '', '', '10.00', '9', f'Category {n % 20}', 'yes',
+                                 '', '12.50', '', 'yes', 'Size', size, 'Colour', colour])
+    return buffer.getvalue().encode()
+
+
+def clear():
+    from app import db
+    from app.models import Product, ProductOption, ProductOptionValue, ProductVariant
+
+    for model in (ProductVariant, ProductOptionValue, ProductOption, Product):
+        model.query.delete()
+    db.session.commit()
+
+
+def form_import(data):
+    """The product form's writes, before app/utils/sku.py, for each product in data"""
+    from app import db
+    from app.models import Product, ProductOption, ProductOptionValue, ProductVariant
+    from app.utils.product_io import parse_csv
+
+    for item in parse_csv(io.BytesIO(data)):
+        sku_base = ''.join(c.upper() if c.isalnum() else '' for c in item['name'])[:15]
+        counter = 1
+        sku = f"{sku_base}{counter:03d}"
+        while Product.query.filter_by(sku=sku).first():
+            counter += 1
+            sku = f"{sku_base}{counter:03d}"
+        product = Product(name=item['name'], sku=sku, price=float(item['price']), tax_rate=float(item['tax_rate']),
+                          category=item['category'], is_active=True, has_variants=True)
+        db.session.add(product)
+        db.session.flush()
+        for idx, (name, values) in enumerate((('Size', SIZES), ('Colour', COLOURS))):
+            option = ProductOption(product_id=product.id, name=name, display_order=idx)
+            db.session.add(option)
+            db.session.flush()
+            for val_idx, value in enumerate(values):
+                db.session.add(ProductOptionValue(option_id=option.id, value=value, display_order=val_idx))
+        for variant in item['variants']:
+            combo = list(variant['options'].values())
+            variant_sku = f"{product.sku}-{'-'.join(str(v).upper()[:3] for v in combo)}"
+            counter = 1
+            original_sku = variant_sku
+            while ProductVariant.query.filter_by(sku=variant_sku).first():
+                variant_sku = f"{original_sku}-{counter}"
+                counter += 1
+            db.session.add(ProductVariant(product_id=product.id, sku=variant_sku, price=float(variant['price']),
+                                          tax_rate=float(item['tax_rate']), is_active=True,
+                                          variant_data=json.dumps(variant['options'])))
+    db.session.commit()
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--variants', type=int, default=100000)
+    parser.add_argument('--form-variants', type=int, default=5000)
+    parser.add_argument('--database-url', help='defaults to a temporary SQLite file')
+    args = parser.parse_args()
+
+    app = create_scratch_app(args.database_url)
+    from app.models import ProductVariant
+    from app.utils.product_io import export_products, import_products
+
+    print(f"{'step':<8} {'variants':>9} {'time (s)':>9} {'variants/s':>11}")
+    with app.app_context():
+        clear()
+        data = sample_csv(args.form_variants)
+        elapsed, _ = timed(lambda: form_import(data))
+        print(f"{'form':<8} {ProductVariant.query.count():>9} {elapsed:>9.2f} {args.form_variants / elapsed:>11.0f}")
+
+        clear()
+        data = sample_csv(args.variants)
+        elapsed, result = timed(lambda: import_products(io.BytesIO(data), 'csv'))
+        if result['errors']:
+            raise SystemExit('\n'.join(result['errors']))
+        print(f"{'import':<8} {result['variants']:>9} {elapsed:>9.2f} {result['variants'] / elapsed:>11.0f}")
+
+        for fmt in ('csv', 'json'):
+            elapsed, size = timed(lambda: sum(len(chunk) for chunk in export_products(fmt)))
+            print(f"{'export ' + fmt:<8} {result['variants']:>9} {elapsed:>9.2f} {result['variants'] / elapsed:>11.0f}"
+                  f"  ({size / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""Search latency: ILIKE scans versus the search index.
+
+Seeds a scratch database with synthetic products, then times the product
+autocomplete endpoint and the product list search with the plain ILIKE
+backend and with the database's search backend (the in-process trigram
+index on SQLite, FULLTEXT/pg_trgm when --database-url points at MySQL or
+PostgreSQL with migrate_search_indexes.py applied).
+
+Usage:
+    python benchmarks/search.py [--rows 1000000] [--database-url URL]
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime
+
+from common import create_scratch_app, insert_rows, best_of
+
+os.environ['LIST_COUNT_CACHE_TTL'] = '0'
+
+WORDS = [
+    'steel', 'copper', 'oak', 'walnut', 'glass', 'linen', 'cotton', 'granite', 'marble', 'brass',
+    'bolt', 'hinge', 'panel', 'bracket', 'shelf', 'table', 'lamp', 'frame', 'drawer', 'cabinet',
+    'small', 'large', 'heavy', 'compact', 'outdoor', 'indoor', 'classic', 'modern', 'rustic', 'slim',
+]
+TERMS = ['walnut cab', 'ss-00421', 'lamp', 'xyzzy', 'ra']
+
+
+def seed(n_rows):
+    from app.models import Product
+
+    rng = random.Random(7)
+    now = datetime(2024, 1, 1)
+    rows = []
+    for i in range(1, n_rows + 1):
+        words = rng.sample(WORDS, 5)
+        rows.append({
+            'id': i,
+            'name': f'{words[0].title()} {words[1]} {words[2]}',
+            'description': f'{words[3]} {words[4]} item {i}',
+            'sku': f'{words[0][:2].upper()}-{i:07d}',
+            'price': 10, 'tax_rate': 0, 'is_active': True, 'has_variants': False,
+            'created_at': now, 'updated_at': now,
+        })
+        if len(rows) == 50000:
+            insert_rows(Product, rows)
+            rows = []
+    if rows:
+        insert_rows(Product, rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    app = create_scratch_app(args.database_url)
+    client = app.test_client()
+    with app.app_context():
+        from app.utils.search import memory_indexes, search_backend
+
+        print(f"Seeding {args.rows} products...")
+        seed(args.rows)
+
+        os.environ.pop('SEARCH_BACKEND', None)
+        native = search_backend('products', 'all')
+        if native == 'memory':
+            started = time.perf_counter()
+            memory_indexes.build('products')
+            print(f"In-process index built in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        urls = []
+        for term in TERMS:
+            urls.append((f"autocomplete '{term}'", f'/products/api/search?q={term}'))
+        urls.append(("list by name 'walnut'", '/products/?search=walnut&search_by=name&per_page=25'))
+        urls.append(("list by sku '0042'", '/products/?search=0042&search_by=sku&per_page=25'))
+
+        print(f"\n{'Request':<28} {'like (ms)':>10} {native + ' (ms)':>14} {'speedup':>8}")
+        for label, url in urls:
+            timings = []
+            for backend in ('like', native):
+                os.environ['SEARCH_BACKEND'] = backend
+                assert client.get(url).status_code == 200
+                timings.append(best_of(lambda: client.get(url), args.repeat))
+            print(f"{label:<28} {timings[0]:>10.1f} {timings[1]:>14.1f} {timings[0] / timings[1]:>7.1f}x")
+        os.environ.pop('SEARCH_BACKEND', None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""Saving a product with a 5x5x5x5 option matrix (625 variants): recreate versus diff.
+
+Each scenario starts from a freshly created product and applies one edit,
+the way the product form submits it:
+
+    unchanged     saved as is (e.g. only the description changed)
+    add value     a sixth value on one option: 125 more variants
+    remove value  one value dropped from one option: 125 variants go
+    one price     one variant's price changed
+
+Strategies:
+
+    recreate  delete every option, value and variant and insert the full
+              matrix again (the product form before app/utils/variants.py)
+    diff      sync_variants(): write only what changed
+
+Then a product is created at the variant cap (10x10x10x10, PRODUCT_MAX_VARIANTS)
+with both strategies, reporting time and peak Python memory (tracemalloc).
+
+Reported: best time of --repeat runs, SQL statements executed, and how many
+of the original variant rows survive the save rather than being deleted
+and inserted again.
+
+Usage:
+    python benchmarks/variants.py [--values 5] [--options 4] [--repeat 5] [--database-url URL]
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from itertools import product as itertools_product
+
+from common import create_scratch_app
+
+statements = {'n': 0}
+
+
+def recreate(product, options, prices, skus, base_price, tax_rate):
+    """The product form's edit path before variants were diffed"""
+    from app import db
+    from app.models import ProductOption, ProductOptionValue, ProductVariant
+    from app.utils.sku import SkuAllocator, variant_candidate
+
+    for option in ProductOption.query.filter_by(product_id=product.id).all():
+        ProductOptionValue.query.filter_by(option_id=option.id).delete()
+    ProductOption.query.filter_by(product_id=product.id).delete()
+    ProductVariant.query.filter_by(product_id=product.id).delete()
+
+    created = []
+    for idx, (name, values) in enumerate(options):
+        option = ProductOption(product_id=product.id, name=name, display_order=idx)
+        db.session.add(option)
+        db.session.flush()
+        for val_idx, value in enumerate(values):
+            db.session.add(ProductOptionValue(option_id=option.id, value=value, display_order=val_idx))
+        created.append(option)
+
+    base_sku = product.sku
+    allocator = SkuAllocator(ProductVariant)
+    allocator.load(f"{base_sku}-")
+    combinations = list(itertools_product(*[[v.value for v in option.values] for option in created]))
+    for idx, combo in enumerate(combinations):
+        price = float(prices[idx]) if idx < len(prices) and prices[idx] else base_price
+        sku = skus[idx] if idx < len(skus) and skus[idx] else allocator.suffixed(variant_candidate(base_sku, combo))
+        db.session.add(ProductVariant(product_id=product.id, sku=sku, price=price, tax_rate=tax_rate,
+                                      variant_data=json.dumps(dict(zip([o.name for o in created], combo))),
+                                      is_active=True))
+
+
+def scenarios(options):
+    count = 1
+    for _, values in options:
+        count *= len(values)
+    first_name, first_values = options[0]
+    return {
+        'unchanged': (options, []),
+        'add value': ([(first_name, first_values + ['NEW'])] + options[1:], []),
+        'remove value': ([(first_name, first_values[:-1])] + options[1:], []),
+        'one price': (options, ['99'] + [''] * (count - 1)),
+    }
+
+
+def run(app, strategy, options, edit, prices):
+    from app import db
+    from app.models import Product, ProductOption, ProductOptionValue, ProductVariant
+    from app.utils.variants import sync_variants
+
+    with app.app_context():
+        for model in (ProductVariant, ProductOptionValue, ProductOption, Product):
+            model.query.delete()
+        product = Product(name='Matrix', sku='MATRIX001', price=10.0, tax_rate=0, has_variants=True)
+        db.session.add(product)
+        db.session.flush()
+        sync_variants(product, options, base_price=10.0)
+        db.session.commit()
+        # SQLite hands deleted ids out again, so a row is the same row only if created_at matches too
+        before = set(db.session.query(ProductVariant.id, ProductVariant.created_at))
+
+        save = recreate if strategy == 'recreate' else sync_variants
+        statements['n'] = 0
+        started = time.perf_counter()
+        product = db.session.get(Product, product.id)
+        save(product, edit, prices, [], 10.0, 0)
+        db.session.commit()
+        elapsed = (time.perf_counter() - started) * 1000
+        after = set(db.session.query(ProductVariant.id, ProductVariant.created_at))
+        return elapsed, statements['n'], len(before & after), len(before)
+
+
+def create_at_cap(app, strategy, options):
+    from app import db
+    from app.models import Product, ProductOption, ProductOptionValue, ProductVariant
+    from app.utils.variants import sync_variants
+
+    with app.app_context():
+        for model in (ProductVariant, ProductOptionValue, ProductOption, Product):
+            model.query.delete()
+        product = Product(name='Matrix', sku='MATRIX001', price=10.0, tax_rate=0, has_variants=True)
+        db.session.add(product)
+        db.session.commit()
+
+        save = recreate if strategy == 'recreate' else sync_variants
+        tracemalloc.start()
+        started = time.perf_counter()
+        save(product, options, [], [], 10.0, 0)
+        db.session.commit()
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--values', type=int, default=5, help='values per option')
+    parser.add_argument('--options', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database-url', help='defaults to a temporary SQLite file')
+    args = parser.parse_args()
+
+    app = create_scratch_app(args.database_url)
+    from sqlalchemy import event
+    from app import db
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: statements.__setitem__('n', statements['n'] + 1))
+
+    options = [(f'Option {n}', [f'V{n}{m}' for m in range(args.values)]) for n in range(args.options)]
+    print(f"{args.values ** args.options} variants ({'x'.join([str(args.values)] * args.options)})")
+    print(f"{'edit':<13} {'strategy':<9} {'time (ms)':>10} {'statements':>11} {'rows kept':>10}")
+    for name, (edit, prices) in scenarios(options).items():
+        for strategy in ('recreate', 'diff'):
+            runs = [run(app, strategy, options, edit, prices) for _ in range(args.repeat)]
+            best = min(elapsed for elapsed, _, _, _ in runs)
+            _, count, kept, total = runs[0]
+            print(f"{name:<13} {strategy:<9} {best:>10.1f} {count:>11} {kept:>5}/{total}")
+
+    from app.utils.variants import MAX_VARIANTS
+    side = round(MAX_VARIANTS ** 0.25)
+    options = [(f'Option {n}', [f'V{n}{m}' for m in range(side)]) for n in range(4)]
+    print(f"\ncreating {side ** 4} variants ({'x'.join([str(side)] * 4)})")
+    print(f"{'strategy':<9} {'time (s)':>9} {'peak MB':>8}")
+    for strategy in ('recreate', 'diff'):
+        elapsed, peak = create_at_cap(app, strategy, options)
+        print(f"{strategy:<9} {elapsed:>9.2f} {peak / 1024 / 1024:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""Export the PDFs of many invoices into one ZIP file
+
+Takes the same filters as the invoice list and renders the PDFs in
+parallel across all cores, e.g. for month-end:
+
+    python export_invoices.py --from 2024-05-01 --to 2024-05-31 -o may-2024.zip
+    python export_invoices.py --status paid --client-id 12 -o client-12-paid.zip
+"""
+
+import argparse
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+
+# Try to load dotenv if available
+try:
+    from dotenv import load_dotenv
+    load_dotenv('.env.local')
+except ImportError:
+    pass
+
+
+def export(output, workers=None, **args):
+    """Write the ZIP for the filter args to output. Returns the number of invoices exported."""
+    from app.models import Invoice
+    from app.utils.export import invoice_filters, filter_invoices, iter_invoice_pdfs, stream_zip
+
+    query = filter_invoices(Invoice.query, **invoice_filters(args))
+    count = 0
+
+    def entries():
+        nonlocal count
+        for filename, data in iter_invoice_pdfs(query, workers=workers):
+            count += 1
+            print(f"  {filename}")
+            yield filename, data
+
+    with open(output, 'wb') as f:
+        for chunk in stream_zip(entries()):
+            f.write(chunk)
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-o', '--output', default='invoices.zip', help='ZIP file to write (default: invoices.zip)')
+    parser.add_argument('--status', default='all', help='draft, sent, paid or overdue (default: all)')
+    parser.add_argument('--client-id', help='only invoices of this client')
+    parser.add_argument('--from', dest='date_from', help='issue date from, YYYY-MM-DD')
+    parser.add_argument('--to', dest='date_to', help='issue date to (inclusive), YYYY-MM-DD')
+    parser.add_argument('--search', default='', help='search term, as in the invoice list')
+    parser.add_argument('--search-by', default='invoice_number', help='invoice_number, client_name or invoice_id')
+    parser.add_argument('--workers', type=int, help='render processes (default: one per core)')
+    args = parser.parse_args()
+
+    app = create_app()
+
+    with app.app_context():
+        print(f"Exporting invoices to {args.output}...")
+        count = export(args.output, workers=args.workers, status=args.status, client_id=args.client_id,
+                       date_from=args.date_from, date_to=args.date_to, search=args.search,
+                       search_by=args.search_by)
+        print(f"\n✓ Exported {count} invoice(s) to {args.output}")
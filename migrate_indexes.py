@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""Migration script to create the secondary indexes declared on the models
+
+New databases get them from db.create_all(); run this once against existing
+databases. Indexes that already exist are skipped.
+
+The single-column indexes on foreign keys (client_id, invoice_id,
+quotation_id, product_id, option_id) matter on PostgreSQL and SQLite, which
+don't index foreign keys themselves. MySQL/InnoDB does: a table created by
+db.create_all() uses the declared index for its foreign key, and on a table
+that already exists the index InnoDB made for the key covers the column, so
+an index whose columns lead an existing index is skipped rather than
+duplicated on the write path.
+
+It also fills in invoices and quotations without a created_at, the list
+sort key, and makes the column NOT NULL: keyset pages and the cursor API
+compare on it, and a NULL never matches a comparison.
+"""
+
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from sqlalchemy import text
+
+# Try to load dotenv if available
+try:
+    from dotenv import load_dotenv
+    load_dotenv('.env.local')
+except ImportError:
+    pass
+
+
+def create_indexes():
+    """Create every model index missing from the database. Returns the names created."""
+    from sqlalchemy import inspect
+
+    inspector = inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        indexes = inspector.get_indexes(table.name)
+        existing = {index['name'] for index in indexes}
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            if index.name in existing:
+                print(f"  '{index.name}' already exists, skipping...")
+                continue
+            columns = [c.name for c in index.columns]
+            covering = next((other['name'] for other in indexes
+                             if other['column_names'][:len(columns)] == columns), None)
+            if covering and not index.unique:
+                print(f"  '{index.name}' is covered by '{covering}', skipping...")
+                continue
+            index.create(db.engine)
+            created.append(index.name)
+            print(f"✓ Created '{index.name}' on {table.name}({', '.join(c.name for c in index.columns)})")
+    return created
+
+
+SORT_KEY_TABLES = ['invoices', 'quotations']
+
+
+def fill_sort_keys():
+    """Give rows without a created_at one (their issue date, else now) and make it NOT NULL"""
+    dialect = db.engine.dialect.name
+    for table in SORT_KEY_TABLES:
+        filled = db.session.execute(text(
+            f"UPDATE {table} SET created_at = COALESCE(issue_date, updated_at, CURRENT_TIMESTAMP) "
+            f"WHERE created_at IS NULL"
+        )).rowcount
+        db.session.commit()
+        if filled:
+            print(f"✓ Filled in created_at on {filled} {table}")
+        if dialect == 'mysql':
+            db.session.execute(text(f"ALTER TABLE {table} MODIFY created_at DATETIME NOT NULL"))
+        elif dialect == 'postgresql':
+            db.session.execute(text(f"ALTER TABLE {table} ALTER COLUMN created_at SET NOT NULL"))
+        else:
+            continue  # SQLite can't alter a column; the model default keeps new rows filled
+        db.session.commit()
+        print(f"✓ {table}.created_at is NOT NULL")
+
+
+if __name__ == '__main__':
+    app = create_app()
+    
+    with app.app_context():
+        print("Starting migration...")
+        try:
+            fill_sort_keys()
+            create_indexes()
+            print("\n✓ Migration completed successfully!")
+        except Exception as e:
+            print(f"\n✗ Migration failed: {e}")
+            raise
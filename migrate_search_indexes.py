@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""Migration script to create the native full-text search indexes
+
+MySQL gets FULLTEXT indexes using the ngram parser (one per search scope);
+PostgreSQL gets pg_trgm GIN indexes on each searched column. Other databases
+(SQLite) use the in-process index in app/utils/search.py and need nothing.
+Indexes that already exist are skipped.
+"""
+
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+
+# Try to load dotenv if available
+try:
+    from dotenv import load_dotenv
+    load_dotenv('.env.local')
+except ImportError:
+    pass
+
+
+def create_search_indexes():
+    """Create the search indexes for the current database. Returns the names created."""
+    from sqlalchemy import inspect, text
+    from app.utils.search import SEARCH_SCOPES, mysql_index_name, pg_index_name
+
+    dialect = db.engine.dialect.name
+    if dialect not in ('mysql', 'postgresql'):
+        print(f"  {dialect} has no native search indexes; the in-process index is used instead")
+        return []
+
+    inspector = inspect(db.engine)
+    created = []
+    with db.engine.begin() as conn:
+        if dialect == 'postgresql':
+            conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+
+        for entity, scopes in SEARCH_SCOPES.items():
+            existing = {index['name'] for index in inspector.get_indexes(entity)}
+            if dialect == 'mysql':
+                wanted = [(mysql_index_name(entity, scope), columns) for scope, columns in scopes.items()]
+            else:
+                columns = sorted({c for cols in scopes.values() for c in cols})
+                wanted = [(pg_index_name(entity, column), (column,)) for column in columns]
+
+            for name, columns in wanted:
+                if name in existing:
+                    print(f"  '{name}' already exists, skipping...")
+                    continue
+                if dialect == 'mysql':
+                    conn.execute(text(
+                        f"ALTER TABLE {entity} ADD FULLTEXT INDEX {name} ({', '.join(columns)}) WITH PARSER ngram"
+                    ))
+                else:
+                    conn.execute(text(f"CREATE INDEX {name} ON {entity} USING gin ({columns[0]} gin_trgm_ops)"))
+                created.append(name)
+                print(f"✓ Created '{name}' on {entity}({', '.join(columns)})")
+    return created
+
+
+if __name__ == '__main__':
+    app = create_app()
+
+    with app.app_context():
+        print("Starting migration...")
+        try:
+            create_search_indexes()
+            print("\n✓ Migration completed successfully!")
+        except Exception as e:
+            print(f"\n✗ Migration failed: {e}")
+            raise
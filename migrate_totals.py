@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""Migration script to add materialized totals to invoices and quotations
+
+Usage:
+    python migrate_totals.py            # add the columns (if missing) and backfill
+    python migrate_totals.py --backfill # recalculate every stored total
+    python migrate_totals.py --verify   # report documents whose stored totals drifted
+"""
+
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app, db
+from sqlalchemy import text
+
+# Try to load dotenv if available
+try:
+    from dotenv import load_dotenv
+    load_dotenv('.env.local')
+except ImportError:
+    pass
+
+TOTAL_COLUMNS = {
+    'invoices': ['subtotal', 'tax_total', 'total', 'paid_amount', 'balance'],
+    'quotations': ['subtotal', 'tax_total', 'total'],
+}
+
+
+def add_total_columns():
+    """Add any missing total columns. Returns True if a column was added."""
+    added = False
+    for table, columns in TOTAL_COLUMNS.items():
+        for column in columns:
+            try:
+                db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} FLOAT NOT NULL DEFAULT 0"))
+                db.session.commit()
+                print(f"✓ Added '{table}.{column}' column")
+                added = True
+            except Exception as e:
+                db.session.rollback()
+                if "duplicate column" in str(e).lower() or "already exists" in str(e).lower():
+                    print(f"  '{table}.{column}' column already exists, skipping...")
+                else:
+                    raise
+    return added
+
+
+def backfill():
+    from app.models.totals import backfill_totals
+    print("Backfilling invoice and quotation totals...")
+    backfill_totals(db.session)
+    db.session.commit()
+    print("✓ Totals backfilled")
+
+
+def verify():
+    from app.models.totals import verify_totals
+    print("Verifying stored totals...")
+    mismatches = verify_totals(db.session)
+    for number, field, stored, expected in mismatches:
+        print(f"  ✗ {number}: {field} stored={stored:.2f} expected={expected:.2f}")
+    if mismatches:
+        print(f"\n✗ {len(mismatches)} stored totals are out of sync (run with --backfill to repair)")
+        return False
+    print("✓ All stored totals match their items and payments")
+    return True
+
+
+if __name__ == '__main__':
+    app = create_app()
+
+    with app.app_context():
+        try:
+            if '--verify' in sys.argv:
+                sys.exit(0 if verify() else 1)
+            elif '--backfill' in sys.argv:
+                backfill()
+            else:
+                print("Starting migration...")
+                add_total_columns()
+                backfill()
+                print("\n✓ Migration completed successfully!")
+        except Exception as e:
+            print(f"\n✗ Migration failed: {e}")
+            db.session.rollback()
+            raise
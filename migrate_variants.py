@@ -17,6 +17,21 @@ try:
 except ImportError:
     pass
 
+def add_variant_job_column():
+    """Add products.variants_job_id, the marker of a background variant job. Returns True if added."""
+    try:
+        db.session.execute(text("ALTER TABLE products ADD COLUMN variants_job_id VARCHAR(32)"))
+        db.session.commit()
+        print("✓ Added 'variants_job_id' column")
+        return True
+    except Exception as e:
+        db.session.rollback()
+        if "duplicate column" in str(e).lower() or "already exists" in str(e).lower():
+            print("  'variants_job_id' column already exists, skipping...")
+            return False
+        raise
+
+
 if __name__ == '__main__':
     app = create_app()
     
@@ -103,6 +118,10 @@ if __name__ == '__main__':
                 else:
                     raise
             
+            # Marker of a background job generating a product's variants
+            print("Adding 'variants_job_id' column to products table...")
+            add_variant_job_column()
+            
             # Update existing products to have has_variants = False
             print("Updating existing products...")
             try:
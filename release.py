@@ -15,6 +15,24 @@ with app.app_context():
         db.create_all()
         print("✓ Database tables created/verified")
         
+        # Materialized invoice/quotation totals
+        from migrate_totals import add_total_columns, backfill
+        if add_total_columns():
+            backfill()
+        
+        # Marker of background variant jobs, read by every product query
+        from migrate_variants import add_variant_job_column
+        add_variant_job_column()
+        
+        # Secondary indexes for the list views
+        from migrate_indexes import create_indexes, fill_sort_keys
+        fill_sort_keys()
+        create_indexes()
+
+        # Full-text / trigram indexes for search
+        from migrate_search_indexes import create_search_indexes
+        create_search_indexes()
+
         # Ensure company settings exist
         if CompanySettings.query.first() is None:
             default_settings = CompanySettings(company_name="Your Company Name")
@@ -0,0 +1,40 @@
+"""Test fixtures: the app against a throwaway SQLite database.
+
+Run from the repository root with ``python -m pytest tests``.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+# Keep the PDF cache and job status files out of data/
+SCRATCH_DIR = tempfile.mkdtemp(prefix='invoice-test-')
+os.environ['PDF_CACHE_DIR'] = os.path.join(SCRATCH_DIR, 'pdf_cache')
+os.environ['JOB_STATE_DIR'] = os.path.join(SCRATCH_DIR, 'jobs')
+
+
+@pytest.fixture(scope='session')
+def app():
+    path = os.path.join(SCRATCH_DIR, 'invoice.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    os.environ['SQL_STATS_ENABLED'] = '1'
+
+    from app import create_app, db
+    app = create_app()
+    app.config['TESTING'] = True
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+    shutil.rmtree(SCRATCH_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
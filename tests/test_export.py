@@ -0,0 +1,50 @@
+"""The bulk PDF export must stay a valid ZIP when a render fails partway through."""
+import io
+import zipfile
+
+
+def test_failed_render_becomes_an_error_entry(app, client, monkeypatch):
+    from datetime import datetime
+    from app import db
+    from app.models import Client, Invoice, InvoiceItem
+    from app.utils import export
+
+    render_bytes = export.render_bytes
+
+    def failing_render(kind, inputs):
+        if inputs['document']['invoice_number'] == 'T-EXPORT-00002':
+            raise RuntimeError('renderer crashed')
+        return render_bytes(kind, inputs)
+
+    monkeypatch.setattr(export, 'EXPORT_POOL', 'thread')
+    monkeypatch.setattr(export, 'EXPORT_WORKERS', 3)
+    monkeypatch.setattr(export, 'render_bytes', failing_render)
+    with app.app_context():
+        owner = Client(name='Export client')
+        for n in range(1, 4):
+            invoice = Invoice(invoice_number=f'T-EXPORT-{n:05d}', client=owner, status='sent',
+                              issue_date=datetime(2024, 3, 1))
+            invoice.items = [InvoiceItem(description='Line', quantity=1, unit_price=10 * n)]
+            db.session.add(invoice)
+        db.session.commit()
+        client_id = owner.id
+
+    response = client.get(f'/invoices/export.zip?client_id={client_id}')
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    assert archive.testzip() is None
+    assert archive.namelist() == ['T-EXPORT-00001.pdf', 'T-EXPORT-00002.error.txt', 'T-EXPORT-00003.pdf']
+    assert b'renderer crashed' in archive.read('T-EXPORT-00002.error.txt')
+    assert archive.read('T-EXPORT-00003.pdf').startswith(b'%PDF')
+
+
+def test_export_that_breaks_off_is_still_a_readable_zip():
+    from app.utils.export import stream_zip
+
+    def entries():
+        yield 'first.pdf', b'%PDF-1.4'
+        raise RuntimeError('database went away')
+
+    archive = zipfile.ZipFile(io.BytesIO(b''.join(stream_zip(entries()))))
+    assert archive.namelist() == ['first.pdf', 'EXPORT-INCOMPLETE.txt']
+    assert b'database went away' in archive.read('EXPORT-INCOMPLETE.txt')
@@ -0,0 +1,36 @@
+"""Conditional GETs must not answer 304 for a document that changed.
+
+MySQL DATETIME columns keep whole seconds, so two edits within one second
+leave updated_at as it was. That is simulated by writing the old
+updated_at back after an edit.
+"""
+from sqlalchemy import text
+
+
+def test_edit_within_the_same_second_changes_the_etag(app, client):
+    from app import db
+    from app.models import Client, Invoice, InvoiceItem
+
+    with app.app_context():
+        invoice = Invoice(invoice_number='T-ETAG-00001', client=Client(name='ETag client'), status='draft')
+        invoice.items = [InvoiceItem(description='Line', quantity=1, unit_price=10)]
+        db.session.add(invoice)
+        db.session.commit()
+        invoice_id, client_id = invoice.id, invoice.client_id
+        stamps = {'invoice': invoice.updated_at, 'client': invoice.client.updated_at}
+
+    first = client.get(f'/invoices/{invoice_id}')
+    client.post(f'/invoices/{invoice_id}/edit', data={
+        'client_id': client_id, 'issue_date': '2024-01-01', 'status': 'draft',
+        'items[0][description]': 'Line', 'items[0][quantity]': '1', 'items[0][unit_price]': '25',
+        'items[0][tax_rate]': '0'})
+    with app.app_context():
+        db.session.execute(text('UPDATE invoices SET updated_at = :stamp WHERE id = :id'),
+                           {'stamp': stamps['invoice'], 'id': invoice_id})
+        db.session.execute(text('UPDATE clients SET updated_at = :stamp WHERE id = :id'),
+                           {'stamp': stamps['client'], 'id': client_id})
+        db.session.commit()
+
+    again = client.get(f'/invoices/{invoice_id}', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 200
+    assert again.headers['ETag'] != first.headers['ETag']
@@ -0,0 +1,68 @@
+"""Background jobs must be reachable from every gunicorn worker.
+
+Another worker is simulated by a JobRegistry of its own over the same
+JOB_STATE_DIR, or by dropping the jobs this process keeps in memory.
+"""
+import threading
+import time
+
+from app.utils.jobs import JobRegistry, jobs
+
+
+def wait_for(job_id, registry=jobs, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = registry.get(job_id)
+        if job is not None and job.done:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'job {job_id} did not finish')
+
+
+def test_status_and_progress_visible_to_other_workers():
+    worker, other = JobRegistry(jobs.state_dir), JobRegistry(jobs.state_dir)
+    release = threading.Event()
+
+    def work():
+        worker.update('progress-test', done=5)
+        release.wait(10)
+        return 'ok'
+
+    job = worker.submit(worker.executor('test'), 'test', work, job_id='progress-test', meta={'total': 10})
+    deadline = time.time() + 10
+    while other.get(job.id).meta.get('done') != 5 and time.time() < deadline:
+        time.sleep(0.01)
+    seen = other.get(job.id).to_dict()
+    assert (seen['status'], seen['done'], seen['total']) == ('running', 5, 10)
+
+    release.set()
+    assert wait_for(job.id, worker).result == 'ok'
+    assert other.get(job.id).status == 'done'
+    assert other.get('0' * 32) is None
+
+
+def test_pdf_job_fetched_from_other_worker(app, client, monkeypatch):
+    from app import db
+    from app.models import Client, Invoice, InvoiceItem
+    from app.utils import pdf_jobs
+    from app.utils.pdf_cache import pdf_cache
+
+    monkeypatch.setattr(pdf_jobs, 'PDF_SYNC_MAX_ITEMS', 0)
+    monkeypatch.setattr(pdf_jobs, 'PDF_POOL', 'thread')
+    with app.app_context():
+        invoice = Invoice(invoice_number='T-JOB-00001', client=Client(name='Jobs client'), status='sent')
+        invoice.items = [InvoiceItem(description='Line', quantity=1, unit_price=10)]
+        db.session.add(invoice)
+        db.session.commit()
+        invoice_id = invoice.id
+
+    job_id = client.post(f'/invoices/{invoice_id}/pdf/jobs').get_json()['id']
+    wait_for(job_id)
+    # As if the request reached another worker, which has neither the job nor its PDF in memory
+    monkeypatch.setattr(jobs, '_jobs', {})
+    pdf_cache.clear()
+
+    status = client.get(f'/jobs/{job_id}')
+    assert status.status_code == 200 and status.get_json()['status'] == 'done'
+    pdf = client.get(f'/jobs/{job_id}/pdf')
+    assert pdf.mimetype == 'application/pdf' and pdf.data.startswith(b'%PDF')
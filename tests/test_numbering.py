@@ -0,0 +1,75 @@
+"""Concurrent creates must never be handed the same invoice number.
+
+Thousands of invoices are created from parallel threads, each with its own
+session as concurrent requests have. A unique-constraint failure on
+invoice_number fails the test: nothing retries a collision. Only SQLite's
+"database is locked" is retried, keeping the number already taken.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+INVOICES = 2000
+THREADS = 16
+
+
+def retry_locked(fn):
+    for _ in range(100):
+        try:
+            return fn()
+        except OperationalError:
+            time.sleep(0.01)  # SQLite allows one writer at a time
+    raise AssertionError('database stayed locked')
+
+
+def create_invoices(app, count, client_id):
+    from app import db
+    from app.models import Invoice
+    from app.utils.numbering import next_number
+
+    numbers = []
+    with app.app_context():
+        for _ in range(count):
+            number = retry_locked(lambda: next_number('invoice'))
+
+            def insert():
+                try:
+                    db.session.add(Invoice(invoice_number=number, client_id=client_id,
+                                           issue_date=datetime(2024, 1, 1), status='draft'))
+                    db.session.commit()
+                except OperationalError:
+                    db.session.rollback()
+                    raise
+
+            retry_locked(insert)  # an IntegrityError is a collision and fails the test
+            numbers.append(number)
+        db.session.remove()
+    return numbers
+
+
+@pytest.mark.parametrize('block_size', [1, 50])
+def test_parallel_creates_get_distinct_numbers(app, monkeypatch, block_size):
+    from app import db
+    from app.models import Client, Invoice
+    from app.utils import numbering
+
+    monkeypatch.setattr(numbering, 'NUMBER_BLOCK_SIZE', block_size)
+    numbering.reset_blocks()
+    with app.app_context():
+        client = Client(name=f'Numbering client {block_size}')
+        db.session.add(client)
+        db.session.commit()
+        client_id = client.id
+
+    per_thread = [INVOICES // THREADS + (1 if i < INVOICES % THREADS else 0) for i in range(THREADS)]
+    with ThreadPoolExecutor(THREADS) as pool:
+        handed_out = [n for numbers in pool.map(
+            lambda count: create_invoices(app, count, client_id), per_thread) for n in numbers]
+
+    with app.app_context():
+        stored = [n for n, in db.session.query(Invoice.invoice_number).filter(Invoice.client_id == client_id)]
+    assert len(handed_out) == len(set(handed_out)) == INVOICES
+    assert len(stored) == len(set(stored)) == INVOICES
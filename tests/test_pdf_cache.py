@@ -0,0 +1,23 @@
+"""A disk PDF cache that can't be written must not keep PDFs from being sent."""
+
+
+def test_pdf_sent_when_the_cache_directory_is_not_writable(app, client, monkeypatch, tmp_path):
+    from app import db
+    from app.models import Client, Invoice, InvoiceItem
+    from app.utils import pdf_cache
+
+    blocker = tmp_path / 'not-a-directory'
+    blocker.write_text('')
+    store = pdf_cache.DiskStore(str(blocker / 'pdf_cache'), 1024 * 1024)
+    monkeypatch.setattr(pdf_cache, 'pdf_cache', store)
+    with app.app_context():
+        invoice = Invoice(invoice_number='T-PDFC-00001', client=Client(name='Read-only client'), status='sent')
+        invoice.items = [InvoiceItem(description='Line', quantity=1, unit_price=10)]
+        db.session.add(invoice)
+        db.session.commit()
+        invoice_id = invoice.id
+
+    for _ in range(2):
+        response = client.get(f'/invoices/{invoice_id}/pdf')
+        assert response.status_code == 200 and response.data.startswith(b'%PDF')
+    assert store.stats()['misses'] == 2
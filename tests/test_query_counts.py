@@ -0,0 +1,97 @@
+"""Statements per request must not grow with the page size or the number of rows.
+
+Each route is requested against a small data set at per_page=5 (or limit=5,
+or a document with 5 lines) and again after the data set has grown, at
+per_page=100 (limit=100, a document with 100 lines). The statement count,
+from the Server-Timing header added by app/utils/instrumentation.py, has to
+be the same both times and within the route's bound. A relationship that
+lost its loading profile shows up here as one extra statement per row.
+"""
+import json
+import re
+
+import pytest
+
+# Statements per request, whatever the page size
+BOUNDS = {
+    'list_invoices': 1,  # list counts come from the count cache once warm
+    'list_quotations': 1,
+    'list_products': 2,  # + the category filter
+    'view_invoice': 4,  # validators, invoice with client, items, payments
+    'view_quotation': 2,
+    'product_details': 4,
+    'api_list_invoices': 1,
+    'api_list_quotations': 1,
+    'api_list_products': 3,  # validators, products, variants
+    'api_variants': 2,
+}
+
+
+def urls(ids, per_page):
+    return {
+        'list_invoices': f'/invoices/?per_page={per_page}',
+        'list_quotations': f'/quotations/?per_page={per_page}',
+        'list_products': f'/products/?per_page={per_page}',
+        'view_invoice': f"/invoices/{ids['invoice']}",
+        'view_quotation': f"/quotations/{ids['quotation']}",
+        'product_details': f"/products/{ids['product']}/details",
+        'api_list_invoices': f'/invoices/api/list?limit={per_page}',
+        'api_list_quotations': '/quotations/api/list',
+        'api_list_products': '/products/api/list',
+        'api_variants': f"/products/api/variants/{ids['product']}",
+    }
+
+
+def seed(count, lines):
+    """count more clients, invoices, quotations and products; the last of each has lines
+    items, payments or variants. Returns the ids of those last ones."""
+    from app import db
+    from app.models import (Client, Invoice, InvoiceItem, Payment, Product, ProductOption,
+                            ProductOptionValue, ProductVariant, Quotation, QuotationItem)
+
+    start = Client.query.count()
+    for n in range(start, start + count):
+        size = lines if n == start + count - 1 else 1
+        client = Client(name=f'Client {n}', email=f'client{n}@example.com')
+        invoice = Invoice(invoice_number=f'T-INV-{n:05d}', client=client, status='sent')
+        invoice.items = [InvoiceItem(description=f'Line {i}', quantity=1, unit_price=10) for i in range(size)]
+        invoice.payments = [Payment(amount=1) for _ in range(size)]
+        quotation = Quotation(quotation_number=f'T-QT-{n:05d}', client=client)
+        quotation.items = [QuotationItem(description=f'Line {i}', quantity=1, unit_price=10) for i in range(size)]
+        product = Product(name=f'Product {n}', sku=f'TP{n:05d}', price=10, is_active=True, has_variants=True)
+        product.options = [ProductOption(name='Size', values=[ProductOptionValue(value=str(i)) for i in range(size)])]
+        product.variants = [ProductVariant(sku=f'TP{n:05d}-{i}', price=10, is_active=True,
+                                           variant_data=json.dumps({'Size': str(i)})) for i in range(size)]
+        db.session.add_all([invoice, quotation, product])
+    db.session.commit()
+    return {'invoice': invoice.id, 'quotation': quotation.id, 'product': product.id}
+
+
+def statement_counts(client, routes):
+    counts = {}
+    for _ in range(2):  # the first pass fills the caches that later requests share
+        for name, url in routes.items():
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+            timing = response.headers['Server-Timing']
+            counts[name] = int(re.search(r'desc="(\d+) queries"', timing).group(1))
+    return counts
+
+
+@pytest.fixture(scope='module')
+def counts(app):
+    with app.app_context():
+        small_ids = seed(5, lines=5)
+    client = app.test_client()
+    small = statement_counts(client, urls(small_ids, 5))
+    with app.app_context():
+        large_ids = seed(100, lines=100)
+    large = statement_counts(client, urls(large_ids, 100))
+    return small, large
+
+
+@pytest.mark.parametrize('route', sorted(BOUNDS))
+def test_statement_count_is_bounded(counts, route):
+    small, large = counts
+    assert small[route] == large[route], f'{route}: {small[route]} statements at 5 rows, {large[route]} at 100'
+    assert large[route] <= BOUNDS[route]
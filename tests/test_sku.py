@@ -0,0 +1,66 @@
+"""Generated SKUs come from one prefix query per batch and never collide."""
+from contextlib import contextmanager
+
+
+@contextmanager
+def counted(app):
+    from sqlalchemy import event
+    from app import db
+
+    seen = []
+    listener = lambda conn, cursor, statement, *args: seen.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        yield seen
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+
+
+def test_numbered_and_suffixed_skip_taken_skus(app):
+    from app import db
+    from app.models import Product, ProductVariant
+    from app.utils.sku import SkuAllocator
+
+    with app.app_context():
+        product = Product(name='Lantern', sku='LANTERN001', price=5)
+        db.session.add_all([product, Product(name='Lantern', sku='LANTERN002', price=5),
+                            Product(name='Lanterns', sku='LANTERNS001', price=5)])
+        db.session.flush()
+        db.session.add_all([ProductVariant(product_id=product.id, sku='LANTERN001-RED', price=5),
+                            ProductVariant(product_id=product.id, sku='LANTERN001-RED-1', price=5)])
+        db.session.commit()
+
+        products = SkuAllocator(Product)
+        assert [products.numbered('LANTERN') for _ in range(2)] == ['LANTERN003', 'LANTERN004']
+        assert products.numbered('LANTERNS') == 'LANTERNS002'
+
+        variants = SkuAllocator(ProductVariant)
+        variants.load('LANTERN001-')
+        variants.reserve('LANTERN001-RED-2')
+        with counted(app) as statements:
+            generated = [variants.suffixed('LANTERN001-RED') for _ in range(2)] + [variants.suffixed('LANTERN001-BLU')]
+        assert generated == ['LANTERN001-RED-3', 'LANTERN001-RED-4', 'LANTERN001-BLU']
+        assert statements == []  # answered from the loaded prefix
+
+        # A product's own SKU isn't taken when it is renumbered
+        assert SkuAllocator(Product, exclude_id=product.id).numbered('LANTERN') == 'LANTERN001'
+
+
+def test_variant_skus_of_a_large_matrix_take_one_lookup(app):
+    from app import db
+    from app.models import Product
+    from app.utils.variants import sync_variants
+
+    with app.app_context():
+        product = Product(name='Matrix lamp', sku='MLAMP001', price=5, has_variants=True)
+        db.session.add(product)
+        db.session.commit()
+        options = [('Size', [f'S{n}' for n in range(10)]), ('Colour', [f'C{n}' for n in range(10)])]
+        with counted(app) as statements:
+            assert sync_variants(product, options, base_price=5)['added'] == 100
+            db.session.commit()
+        # One range scan of the sku index for all 100 generated SKUs
+        lookups = [s for s in statements if s.startswith('SELECT product_variants.sku')]
+        assert len(lookups) == 1
+        skus = [variant.sku for variant in product.variants]
+        assert len(set(skus)) == 100 and 'MLAMP001-S0-C0' in skus
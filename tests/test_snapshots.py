@@ -0,0 +1,61 @@
+"""Per-worker snapshots must pick up writes made by other workers.
+
+With the in-process cache backend an invalidation only reaches the worker
+that committed. A write by another worker is simulated with a statement on
+a separate connection, which this process's session events never see.
+"""
+import pytest
+
+from app.utils import cache
+
+
+@pytest.fixture
+def recheck_every_read(monkeypatch):
+    monkeypatch.setattr(cache, 'SNAPSHOT_RECHECK_SECONDS', 0)
+
+
+def other_worker(app, statement, **params):
+    from sqlalchemy import text
+    from app import db
+
+    with app.app_context(), db.engine.begin() as conn:
+        conn.execute(text(statement), params)
+
+
+def test_catalog_sees_products_created_elsewhere(app, recheck_every_read):
+    from app.utils.catalog import search_catalog
+
+    with app.app_context():
+        assert search_catalog('Zanzibar') == []
+    other_worker(app, "INSERT INTO products (name, sku, price, tax_rate, is_active, has_variants, "
+                      "created_at, updated_at) VALUES ('Zanzibar lamp', 'ZANZ001', 5, 0, 1, 0, "
+                      "CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)")
+    with app.app_context():
+        assert [result['name'] for result in search_catalog('Zanzibar')] == ['Zanzibar lamp']
+
+
+def test_company_sees_settings_saved_elsewhere(app, recheck_every_read):
+    from app.models import CompanySettings
+    from app.utils.company import get_company
+
+    with app.app_context():
+        settings_id = CompanySettings.get_settings().id
+        get_company()
+    other_worker(app, "UPDATE company_settings SET company_name = :name WHERE id = :id",
+                 name='Renamed Ltd', id=settings_id)
+    with app.app_context():
+        assert get_company().company_name == 'Renamed Ltd'
+
+
+def test_search_index_sees_clients_created_elsewhere(app, client, recheck_every_read):
+    from app.utils.search import memory_indexes
+
+    with app.app_context():
+        memory_indexes.build('clients')
+        assert memory_indexes.search('clients', 'Quillfeather') == []
+    other_worker(app, "INSERT INTO clients (name, email, created_at, updated_at) "
+                      "VALUES ('Quillfeather Ltd', 'quill@example.com', CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)")
+
+    found = client.get('/clients/api/search?q=Quillfeather').get_json()
+    assert [row['name'] for row in found] == ['Quillfeather Ltd']
+    assert b'Quillfeather Ltd' in client.get('/clients/?search=Quillfeather&search_by=name').data
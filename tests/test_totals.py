@@ -0,0 +1,68 @@
+"""Stored document totals must match the items and payments after every edit."""
+
+
+def stored_and_expected(document):
+    from app.models.totals import INVOICE_TOTAL_FIELDS, QUOTATION_TOTAL_FIELDS
+
+    fields = INVOICE_TOTAL_FIELDS if hasattr(document, 'paid_amount') else QUOTATION_TOTAL_FIELDS
+    expected = document.calculate_totals()
+    return ({field: round(getattr(document, field) or 0, 2) for field in fields},
+            {field: round(expected[field], 2) for field in fields})
+
+
+def document_form(client_id, item=None):
+    data = {'client_id': client_id, 'issue_date': '2024-01-01', 'status': 'sent'}
+    if item is not None:
+        description, unit_price = item
+        data.update({'items[0][description]': description, 'items[0][quantity]': '1',
+                     'items[0][unit_price]': unit_price, 'items[0][tax_rate]': '0'})
+    return data
+
+
+def test_invoice_totals_follow_edits_and_payments(app, client):
+    from app import db
+    from app.models import Client, Invoice, InvoiceItem, Payment
+
+    with app.app_context():
+        invoice = Invoice(invoice_number='T-TOTALS-00001', client=Client(name='Totals client'), status='sent')
+        invoice.items = [InvoiceItem(description='Line', quantity=1, unit_price=100)]
+        invoice.payments = [Payment(amount=10)]
+        db.session.add(invoice)
+        db.session.commit()
+        invoice_id, client_id = invoice.id, invoice.client_id
+        payment_id = invoice.payments[0].id
+
+    def check(total, paid, balance):
+        with app.app_context():
+            invoice = db.session.get(Invoice, invoice_id)
+            stored, expected = stored_and_expected(invoice)
+            assert stored == expected
+            assert (stored['total'], stored['paid_amount'], stored['balance']) == (total, paid, balance)
+
+    # Same header, no items: only the bulk delete of the items changes anything
+    client.post(f'/invoices/{invoice_id}/edit', data=document_form(client_id))
+    check(0, 10, 0)
+    client.post(f'/invoices/{invoice_id}/edit', data=document_form(client_id, ('One', '50')))
+    check(50, 10, 40)
+    client.post(f'/invoices/{invoice_id}/edit', data=document_form(client_id, ('Two', '20')))
+    check(20, 10, 10)
+    client.post(f'/payments/{payment_id}/delete')
+    check(20, 0, 20)
+
+
+def test_quotation_totals_follow_item_removal(app, client):
+    from app import db
+    from app.models import Client, Quotation, QuotationItem
+
+    with app.app_context():
+        quotation = Quotation(quotation_number='T-TOTALS-Q0001', client=Client(name='Quote client'),
+                              status='pending')
+        quotation.items = [QuotationItem(description='Line', quantity=2, unit_price=40)]
+        db.session.add(quotation)
+        db.session.commit()
+        quotation_id, client_id = quotation.id, quotation.client_id
+
+    client.post(f'/quotations/{quotation_id}/edit', data=document_form(client_id))
+    with app.app_context():
+        stored, expected = stored_and_expected(db.session.get(Quotation, quotation_id))
+        assert stored == expected == {'subtotal': 0, 'tax_total': 0, 'total': 0}
@@ -0,0 +1,131 @@
+"""Deactivated variants (combinations removed from a product) must not show as current ones."""
+import json
+
+
+def test_removed_combinations_are_not_listed(app, client):
+    from app import db
+    from app.models import Product
+    from app.utils.variants import sync_variants
+
+    with app.app_context():
+        product = Product(name='Variant shirt', sku='VSHIRT001', price=10, is_active=True, has_variants=True)
+        db.session.add(product)
+        db.session.flush()
+        sync_variants(product, [('Size', ['S', 'M', 'L'])], prices=['11', '12', '13'], base_price=10)
+        db.session.commit()
+        # S goes; its row stays, deactivated, and is still the first variant by id
+        sync_variants(product, [('Size', ['M', 'L'])], prices=['12', '13'], base_price=10)
+        db.session.commit()
+        product_id = product.id
+        assert len(product.variants) == 3
+        summary = product.to_dict()
+
+    assert (summary['price'], summary['sku'], summary['variants_count']) == (12, 'VSHIRT001-M', 2)
+    details = client.get(f'/products/{product_id}/details').get_json()
+    assert [json.dumps(v['variant_data']) for v in details['variants']] == ['{"Size": "M"}', '{"Size": "L"}']
+    variants = client.get(f'/products/api/variants/{product_id}').get_json()
+    assert [v['sku'] for v in variants] == ['VSHIRT001-M', 'VSHIRT001-L']
+
+
+def test_edit_refused_while_another_worker_generates_variants(app, client, monkeypatch):
+    import threading
+    from app import db
+    from app.models import Product
+    from app.utils import variants
+    from app.utils.jobs import jobs
+
+    release = threading.Event()
+    sync_variant_rows = variants.sync_variant_rows
+
+    def held_sync(*args, **kwargs):
+        release.wait(10)
+        return sync_variant_rows(*args, **kwargs)
+
+    monkeypatch.setattr(variants, 'VARIANT_SYNC_MAX', 2)
+    monkeypatch.setattr(variants, 'sync_variant_rows', held_sync)
+    form = {'name': 'Background lamp', 'sku': 'BGLAMP001', 'price': '10', 'tax_rate': '0', 'is_active': 'on',
+            'has_variants': 'on', 'option_name[]': ['Colour'], 'option_values[]': ['Red, Green, Blue']}
+    client.post('/products/new', data=form)
+    with app.app_context():
+        product = Product.query.filter_by(sku='BGLAMP001').one()
+        product_id, job_id = product.id, product.variants_job_id
+    assert job_id
+
+    # The edit reaches a worker that knows of the job only through the product row and its status file
+    local = dict(jobs._jobs)
+    monkeypatch.setattr(jobs, '_jobs', {})
+    response = client.post(f'/products/{product_id}/edit', data={**form, 'price': '99'}, follow_redirects=True)
+    assert b'still being generated' in response.data
+    with app.app_context():
+        assert db.session.get(Product, product_id).price == 10
+
+    monkeypatch.setattr(jobs, '_jobs', local)
+    release.set()
+    job = local[job_id]
+    job.future.result(10)
+    with app.app_context():
+        product = db.session.get(Product, product_id)
+        assert product.variants_job_id is None and len(product.active_variants) == 3
+
+
+def variant_skus(app, product_id):
+    from app import db
+    from app.models import Product
+
+    with app.app_context():
+        product = db.session.get(Product, product_id)
+        return {json.loads(v.variant_data)['Size']: (v.sku, v.is_active) for v in product.variants}
+
+
+def test_edit_swaps_and_takes_back_variant_skus(app, client):
+    form = {'name': 'Swap shirt', 'sku': 'SWAP001', 'price': '10', 'tax_rate': '0', 'is_active': 'on',
+            'has_variants': 'on', 'option_name[]': ['Size'], 'option_values[]': ['S, M, L']}
+    client.post('/products/new', data=form)
+    from app.models import Product
+    with app.app_context():
+        product_id = Product.query.filter_by(sku='SWAP001').one().id
+    assert variant_skus(app, product_id) == {
+        'S': ('SWAP001-S', True), 'M': ('SWAP001-M', True), 'L': ('SWAP001-L', True)}
+
+    response = client.post(f'/products/{product_id}/edit', data={
+        **form, 'variant_sku[]': ['SWAP001-M', 'SWAP001-S', 'SWAP001-L']})
+    assert response.status_code == 302
+    assert variant_skus(app, product_id) == {
+        'S': ('SWAP001-M', True), 'M': ('SWAP001-S', True), 'L': ('SWAP001-L', True)}
+
+    # L is deactivated, keeping its SKU, until S takes it
+    client.post(f'/products/{product_id}/edit', data={
+        **form, 'option_values[]': ['S, M'], 'variant_sku[]': ['SWAP001-M', 'SWAP001-S']})
+    response = client.post(f'/products/{product_id}/edit', data={
+        **form, 'option_values[]': ['S, M'], 'variant_sku[]': ['SWAP001-L', 'SWAP001-S']})
+    assert response.status_code == 302
+    assert variant_skus(app, product_id) == {
+        'S': ('SWAP001-L', True), 'M': ('SWAP001-S', True), 'L': (None, False)}
+
+    response = client.post(f'/products/{product_id}/edit', data={
+        **form, 'option_values[]': ['S, M'], 'variant_sku[]': ['SWAP001-S', 'SWAP001-S']}, follow_redirects=True)
+    assert b'SKU SWAP001-S is given to more than one variant' in response.data
+
+
+def test_renaming_an_option_keeps_its_variants(app, client):
+    from app import db
+    from app.models import Product
+
+    form = {'name': 'Rename shirt', 'sku': 'RENAME001', 'price': '10', 'tax_rate': '0', 'is_active': 'on',
+            'has_variants': 'on', 'option_name[]': ['Color', 'Size'], 'option_values[]': ['Red, Blue', 'S, M']}
+    client.post('/products/new', data=form)
+    with app.app_context():
+        product = Product.query.filter_by(sku='RENAME001').one()
+        product_id = product.id
+        option_ids = [str(option.id) for option in sorted(product.options, key=lambda o: o.display_order)]
+        before = {v.id: v.sku for v in product.variants}
+    assert len(before) == 4
+
+    response = client.post(f'/products/{product_id}/edit', data={
+        **form, 'option_name[]': ['Colour', 'Size'], 'option_id[]': option_ids})
+    assert response.status_code == 302
+    with app.app_context():
+        product = db.session.get(Product, product_id)
+        assert sorted(option.name for option in product.options) == ['Colour', 'Size']
+        assert {v.id: v.sku for v in product.variants} == before
+        assert all(v.is_active and 'Colour' in json.loads(v.variant_data) for v in product.variants)